@@ -1,11 +1,14 @@
 import numpy as np 
-import matplotlib.pyplot as plt 
 from openmdao.api import ExplicitComponent, Problem
+from input_cache import InputCache
+from reentry_physics import PARAMETERS
+from node_chunks import NodeChunks
 
 class Aerodynamics(ExplicitComponent):
 
     def initialize(self):
         self.options.declare("num_nodes", types=int)
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
 
     def setup(self):
 
@@ -14,6 +17,12 @@ class Aerodynamics(ExplicitComponent):
         self.add_input("alpha", val=np.ones(nn), desc="angle of attack", units="deg")
         self.add_input("v", val=np.ones(nn), desc="velocity of shuttle", units="ft/s")
         self.add_input("rho", val=np.ones(nn), desc="local atmospheric density", units="slug/ft**3")
+        self.add_input("S", val=PARAMETERS["S"][0]*np.ones(nn), desc="reference area", units=PARAMETERS["S"][1])
+        self.add_input("a_0", val=PARAMETERS["a_0"][0]*np.ones(nn), desc="lift coefficient at zero angle of attack", units=PARAMETERS["a_0"][1])
+        self.add_input("a_1", val=PARAMETERS["a_1"][0]*np.ones(nn), desc="lift curve slope", units=PARAMETERS["a_1"][1])
+        self.add_input("b_0", val=PARAMETERS["b_0"][0]*np.ones(nn), desc="drag coefficient at zero angle of attack", units=PARAMETERS["b_0"][1])
+        self.add_input("b_1", val=PARAMETERS["b_1"][0]*np.ones(nn), desc="linear drag coefficient", units=PARAMETERS["b_1"][1])
+        self.add_input("b_2", val=PARAMETERS["b_2"][0]*np.ones(nn), desc="quadratic drag coefficient", units=PARAMETERS["b_2"][1])
 
         self.add_output("drag", val=np.ones(nn), desc="drag on shuttle", units="lb")
         self.add_output("lift", val=np.ones(nn), desc="lift on shuttle", units="lb")
@@ -26,49 +35,125 @@ class Aerodynamics(ExplicitComponent):
         self.declare_partials("lift", "alpha", rows=partial_range, cols=partial_range)
         self.declare_partials("lift", "v", rows=partial_range, cols=partial_range)
         self.declare_partials("lift", "rho", rows=partial_range, cols=partial_range)
+        self.declare_partials("drag", ["S", "b_0", "b_1", "b_2"], rows=partial_range, cols=partial_range)
+        self.declare_partials("lift", ["S", "a_0", "a_1"], rows=partial_range, cols=partial_range)
+
+        self._cache = InputCache(["alpha", "v", "a_0", "a_1", "b_0", "b_1", "b_2"], ["c_L", "c_D", "v_sq"], nn)
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        a_0 = inputs["a_0"][s]
+        a_1 = inputs["a_1"][s]
+        b_0 = inputs["b_0"][s]
+        b_1 = inputs["b_1"][s]
+        b_2 = inputs["b_2"][s]
+        alpha = inputs["alpha"][s]
+        v = inputs["v"][s]
+        c_L = buf["c_L"][s]
+        c_D = buf["c_D"][s]
+
+        # c_L holds b_2*alpha**2 until c_D is assembled
+        np.multiply(b_1, alpha, out=c_D)
+        np.add(b_0, c_D, out=c_D)
+        np.square(alpha, out=c_L)
+        np.multiply(b_2, c_L, out=c_L)
+        np.add(c_D, c_L, out=c_D)
+
+        np.multiply(a_1, alpha, out=c_L)
+        np.add(a_0, c_L, out=c_L)
+
+        np.square(v, out=buf["v_sq"][s])
 
     def compute(self, inputs, outputs):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, inputs, buf, outputs)
 
-        a_0 = -.20704
-        a_1 = .029244
-        b_0 = .07854
-        b_1 = -.61592e-2
-        b_2 = .621408e-3
-        S = 2690
-        alpha = inputs["alpha"]
-        v = inputs["v"]
-        rho = inputs["rho"]
-        c_L = a_0 + a_1*alpha
-        c_D = b_0 + b_1*alpha + b_2*alpha**2
+    def _compute(self, inputs, buf, outputs, s):
 
-        outputs["drag"] = .5*c_D*S*rho*v**2
-        outputs["lift"] = .5*c_L*S*rho*v**2
+        S = inputs["S"][s]
+        rho = inputs["rho"][s]
+        c_L = buf["c_L"][s]
+        c_D = buf["c_D"][s]
+        v_sq = buf["v_sq"][s]
+
+        outputs["drag"][s] = .5*c_D*S*rho*v_sq
+        outputs["lift"][s] = .5*c_L*S*rho*v_sq
 
     def compute_partials(self, inputs, J):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, inputs, buf, J)
+
+    def _compute_partials(self, inputs, buf, J, s):
+
+        alpha = inputs["alpha"][s]
+        v = inputs["v"][s]
+        rho = inputs["rho"][s]
+        a_1 = inputs["a_1"][s]
+        b_1 = inputs["b_1"][s]
+        b_2 = inputs["b_2"][s]
+        S = inputs["S"][s]
+        c_L = buf["c_L"][s]
+        c_D = buf["c_D"][s]
+        v_sq = buf["v_sq"][s]
+
+        dD_dCD = .5*S*rho*v_sq
+        dCD_dalpha = b_1 + 2*alpha*b_2
+        dL_dCL = dD_dCD
+        dCL_dalpha = a_1
+
+        J["drag", "alpha"][s] = dD_dCD*dCD_dalpha
+        J["drag", "v"][s] = c_D*S*rho*v
+        J["drag", "rho"][s] = .5*c_D*S*v_sq
+        J["lift", "alpha"][s] = dL_dCL*dCL_dalpha
+        J["lift", "v"][s] = c_L*S*rho*v
+        J["lift", "rho"][s] = .5*c_L*S*v_sq
+
+        J["drag", "S"][s] = .5*c_D*rho*v_sq
+        J["drag", "b_0"][s] = dD_dCD
+        J["drag", "b_1"][s] = dD_dCD*alpha
+        J["drag", "b_2"][s] = dD_dCD*alpha**2
+        J["lift", "S"][s] = .5*c_L*rho*v_sq
+        J["lift", "a_0"][s] = dL_dCL
+        J["lift", "a_1"][s] = dL_dCL*alpha
+
+    def compute_second_partials(self, inputs, H):
+        # H[of, wrt_1, wrt_2] per node for the nonzero second partials with respect to alpha, v and
+        # rho, with wrt_1 declared before wrt_2 (see hessian.py)
+        buf = self._intermediates(inputs)
 
         alpha = inputs["alpha"]
         v = inputs["v"]
         rho = inputs["rho"]
-        a_0 = -.20704
-        a_1 = .029244
-        b_0 = .07854
-        b_1 = -.61592e-2
-        b_2 = .621408e-3
-        S = 2690
-        c_L = a_0 + a_1*alpha
-        c_D = b_0 + b_1*alpha + b_2*alpha**2
-
-        dD_dCD = .5*S*rho*v**2
+        a_1 = inputs["a_1"]
+        b_1 = inputs["b_1"]
+        b_2 = inputs["b_2"]
+        S = inputs["S"]
+        c_L = buf["c_L"]
+        c_D = buf["c_D"]
+        v_sq = buf["v_sq"]
+
         dCD_dalpha = b_1 + 2*alpha*b_2
-        dL_dCL = dD_dCD
-        dCL_dalpha = a_1
 
-        J["drag", "alpha"] = dD_dCD*dCD_dalpha
-        J["drag", "v"] = c_D*S*rho*v
-        J["drag", "rho"] = .5*c_D*S*v**2
-        J["lift", "alpha"] = dL_dCL*dCL_dalpha
-        J["lift", "v"] = c_L*S*rho*v
-        J["lift", "rho"] = .5*c_L*S*v**2
+        H["drag", "alpha", "alpha"] = .5*S*rho*v_sq*2*b_2
+        H["drag", "alpha", "v"] = S*rho*v*dCD_dalpha
+        H["drag", "alpha", "rho"] = .5*S*v_sq*dCD_dalpha
+        H["drag", "v", "v"] = c_D*S*rho
+        H["drag", "v", "rho"] = c_D*S*v
+
+        H["lift", "alpha", "v"] = S*rho*v*a_1
+        H["lift", "alpha", "rho"] = .5*S*v_sq*a_1
+        H["lift", "v", "v"] = c_L*S*rho
+        H["lift", "v", "rho"] = c_L*S*v
 
 def test_aerodynamics():
     prob = Problem()
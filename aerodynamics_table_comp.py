@@ -0,0 +1,184 @@
+import os
+import numpy as np
+from openmdao.api import ExplicitComponent, Problem
+from input_cache import InputCache
+from reentry_physics import A, B, PARAMETERS, aero_coefficients
+from node_chunks import NodeChunks
+
+class AeroTable(object):
+
+    # Lift and drag coefficient tables over (alpha, Mach). On disk a table is a directory of
+    # plain .npy files, one per array, so load() can memory map them: large tables then cost
+    # nothing at startup and the pages are shared by every worker process of a parallel sweep.
+
+    FILES = ("alpha", "mach", "c_L", "c_D")
+
+    def __init__(self, alpha, mach, c_L, c_D):
+        self.alpha = alpha
+        self.mach = mach
+        self.c_L = c_L
+        self.c_D = c_D
+
+        if c_L.shape != (len(alpha), len(mach)) or c_D.shape != (len(alpha), len(mach)):
+            raise ValueError("c_L and c_D must have shape (len(alpha), len(mach)) = (%d, %d)" % (len(alpha), len(mach)))
+        if np.any(np.diff(alpha) <= 0) or np.any(np.diff(mach) <= 0):
+            raise ValueError("alpha and mach breakpoints must be strictly increasing")
+
+    @classmethod
+    def from_polynomial(cls, alpha, mach, a=A, b=B):
+        # Tabulates the Mach independent polynomial fits used by the Aerodynamics component, with
+        # a = (a_0, a_1) and b = (b_0, b_1, b_2) as in reentry_physics.aero_coefficients
+        alpha = np.asarray(alpha, dtype=float)
+        mach = np.asarray(mach, dtype=float)
+        c_L, c_D = aero_coefficients(alpha, a, b)
+        c_L = np.outer(c_L, np.ones(len(mach)))
+        c_D = np.outer(c_D, np.ones(len(mach)))
+        return(cls(alpha, mach, c_L, c_D))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FILES:
+            np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(getattr(self, name), dtype=float))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mmap_mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode) for name in cls.FILES]
+        return(cls(*arrays))
+
+class AerodynamicsTable(ExplicitComponent):
+
+    def initialize(self):
+        self.options.declare("num_nodes", types=int)
+        self.options.declare("table", types=(str, AeroTable), desc="AeroTable or the directory it was saved to")
+        self.options.declare("speed_of_sound", default=1000., desc="constant speed of sound used to form the Mach number (ft/s); an approximation, "
+                             "as the atmosphere models give no temperature the table's Mach axis is a fixed rescaling of v")
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
+
+    def setup(self):
+
+        nn = self.options["num_nodes"]
+
+        self.add_input("alpha", val=np.ones(nn), desc="angle of attack", units="deg")
+        self.add_input("v", val=np.ones(nn), desc="velocity of shuttle", units="ft/s")
+        self.add_input("rho", val=np.ones(nn), desc="local atmospheric density", units="slug/ft**3")
+        self.add_input("S", val=PARAMETERS["S"][0]*np.ones(nn), desc="reference area", units=PARAMETERS["S"][1])
+
+        self.add_output("drag", val=np.ones(nn), desc="drag on shuttle", units="lb")
+        self.add_output("lift", val=np.ones(nn), desc="lift on shuttle", units="lb")
+
+        partial_range = np.arange(nn, dtype=int)
+
+        self.declare_partials("drag", "alpha", rows=partial_range, cols=partial_range)
+        self.declare_partials("drag", "v", rows=partial_range, cols=partial_range)
+        self.declare_partials("drag", "rho", rows=partial_range, cols=partial_range)
+        self.declare_partials("lift", "alpha", rows=partial_range, cols=partial_range)
+        self.declare_partials("lift", "v", rows=partial_range, cols=partial_range)
+        self.declare_partials("lift", "rho", rows=partial_range, cols=partial_range)
+        self.declare_partials("drag", "S", rows=partial_range, cols=partial_range)
+        self.declare_partials("lift", "S", rows=partial_range, cols=partial_range)
+
+        table = self.options["table"]
+        self._table = AeroTable.load(table) if isinstance(table, str) else table
+
+        # The stencil (cell indices and bilinear weights) depends only on alpha and v, so it is
+        # cached together with the interpolated coefficients and their slopes
+        self._cache = InputCache(["alpha", "v"], ["w_a", "w_m", "c_L", "c_D", "dL_dalpha", "dD_dalpha", "dL_dmach", "dD_dmach", "v_sq"],
+                                 nn, index_names=["i_a", "i_m"])
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        table = self._table
+        alpha = inputs["alpha"][s]
+        v = inputs["v"][s]
+        mach = v/self.options["speed_of_sound"]
+        i_a = buf["i_a"][s]
+        i_m = buf["i_m"][s]
+        w_a = buf["w_a"][s]
+        w_m = buf["w_m"][s]
+
+        # cell lower corners; points outside the table extrapolate linearly from the edge cells
+        i_a[:] = np.clip(np.searchsorted(table.alpha, alpha.real, side="right") - 1, 0, len(table.alpha) - 2)
+        i_m[:] = np.clip(np.searchsorted(table.mach, mach.real, side="right") - 1, 0, len(table.mach) - 2)
+        a_lo = table.alpha[i_a]
+        da = table.alpha[i_a + 1] - a_lo
+        m_lo = table.mach[i_m]
+        dm = table.mach[i_m + 1] - m_lo
+        w_a[:] = (alpha - a_lo)/da
+        w_m[:] = (mach - m_lo)/dm
+
+        for name, c in (("c_L", table.c_L), ("c_D", table.c_D)):
+            c_00 = c[i_a, i_m]
+            c_10 = c[i_a + 1, i_m]
+            c_01 = c[i_a, i_m + 1]
+            c_11 = c[i_a + 1, i_m + 1]
+            dc_da = (1 - w_m)*(c_10 - c_00) + w_m*(c_11 - c_01)
+            buf[name][s] = c_00 + w_m*(c_01 - c_00) + w_a*dc_da
+            buf["d" + name[2:] + "_dalpha"][s] = dc_da/da
+            buf["d" + name[2:] + "_dmach"][s] = ((1 - w_a)*(c_01 - c_00) + w_a*(c_11 - c_10))/dm
+
+        np.square(v, out=buf["v_sq"][s])
+
+    def compute(self, inputs, outputs):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, inputs, buf, outputs)
+
+    def _compute(self, inputs, buf, outputs, s):
+
+        S = inputs["S"][s]
+        rho = inputs["rho"][s]
+        v_sq = buf["v_sq"][s]
+
+        outputs["drag"][s] = .5*buf["c_D"][s]*S*rho*v_sq
+        outputs["lift"][s] = .5*buf["c_L"][s]*S*rho*v_sq
+
+    def compute_partials(self, inputs, J):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, inputs, buf, J)
+
+    def _compute_partials(self, inputs, buf, J, s):
+
+        S = inputs["S"][s]
+        v = inputs["v"][s]
+        rho = inputs["rho"][s]
+        v_sq = buf["v_sq"][s]
+        c_L = buf["c_L"][s]
+        c_D = buf["c_D"][s]
+        dmach_dv = 1/self.options["speed_of_sound"]
+
+        dF_dC = .5*S*rho*v_sq
+
+        J["drag", "alpha"][s] = dF_dC*buf["dD_dalpha"][s]
+        J["drag", "v"][s] = c_D*S*rho*v + dF_dC*buf["dD_dmach"][s]*dmach_dv
+        J["drag", "rho"][s] = .5*c_D*S*v_sq
+        J["lift", "alpha"][s] = dF_dC*buf["dL_dalpha"][s]
+        J["lift", "v"][s] = c_L*S*rho*v + dF_dC*buf["dL_dmach"][s]*dmach_dv
+        J["lift", "rho"][s] = .5*c_L*S*v_sq
+        J["drag", "S"][s] = .5*c_D*rho*v_sq
+        J["lift", "S"][s] = .5*c_L*rho*v_sq
+
+def test_aerodynamics_table():
+    prob = Problem()
+    prob.model = AerodynamicsTable(num_nodes=5, table=AeroTable.from_polynomial(np.linspace(-10, 50, 61), np.linspace(0, 30, 7)))
+
+    prob.setup(check=False, force_alloc_complex=True)
+
+    prob.run_model()
+
+    return(prob)
+
+if __name__ == "__main__":
+
+    prob = test_aerodynamics_table()
+    prob.check_partials(compact_print=True, method="cs")
+    print(prob["lift"])
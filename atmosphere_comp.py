@@ -1,39 +1,82 @@
 import numpy as np 
-import matplotlib.pyplot as plt 
 from openmdao.api import ExplicitComponent, Problem
+from input_cache import InputCache
+from reentry_physics import PARAMETERS
+from node_chunks import NodeChunks
 
 class Atmosphere(ExplicitComponent):
 
     def initialize(self):
         self.options.declare("num_nodes", types=int)
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
 
     def setup(self):
 
         nn = self.options["num_nodes"]
 
         self.add_input("h", val=np.ones(nn), desc="altitude", units="ft")
+        self.add_input("rho_0", val=PARAMETERS["rho_0"][0]*np.ones(nn), desc="sea level density", units=PARAMETERS["rho_0"][1])
+        self.add_input("h_r", val=PARAMETERS["h_r"][0]*np.ones(nn), desc="density scale height", units=PARAMETERS["h_r"][1])
 
         self.add_output("rho", val=np.ones(nn), desc="local density", units="slug/ft**3")
 
         partial_range = np.arange(nn, dtype=int)
 
-        self.declare_partials("rho", "h", rows=partial_range, cols=partial_range)
+        self.declare_partials("rho", ["h", "rho_0", "h_r"], rows=partial_range, cols=partial_range)
+
+        self._cache = InputCache(["h", "h_r"], ["exp_h"], nn)
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        h = inputs["h"][s]
+        exp_h = buf["exp_h"][s]
+        h_r = inputs["h_r"][s]
+
+        np.negative(h, out=exp_h)
+        np.divide(exp_h, h_r, out=exp_h)
+        np.exp(exp_h, out=exp_h)
 
     def compute(self, inputs, outputs):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, inputs, buf, outputs)
 
-        h = inputs["h"]
-        h_r = 23800
-        rho_0 = .002378
+    def _compute(self, inputs, buf, outputs, s):
 
-        outputs["rho"] = rho_0*np.exp(-h/h_r)
+        rho_0 = inputs["rho_0"][s]
+
+        np.multiply(rho_0, buf["exp_h"][s], out=outputs["rho"][s])
 
     def compute_partials(self, inputs, J):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, inputs, buf, J)
+
+    def _compute_partials(self, inputs, buf, J, s):
+
+        h = inputs["h"][s]
+        h_r = inputs["h_r"][s]
+        rho_0 = inputs["rho_0"][s]
+        exp_h = buf["exp_h"][s]
+
+        np.multiply(-1/(h_r)*rho_0, exp_h, out=J["rho", "h"][s])
+        J["rho", "rho_0"][s] = exp_h
+        J["rho", "h_r"][s] = rho_0*exp_h*h/h_r**2
 
-        h = inputs["h"]
-        h_r = 23800
-        rho_0 = .002378
+    def compute_second_partials(self, inputs, H):
+        # H[of, wrt, wrt] per node for the nonzero second partials with respect to the
+        # non-parameter inputs (see hessian.py)
+        buf = self._intermediates(inputs)
 
-        J["rho", "h"] = -1/(h_r)*rho_0*np.exp(-h/h_r)
+        H["rho", "h", "h"] = inputs["rho_0"]*buf["exp_h"]/inputs["h_r"]**2
 
 
 def test_atmosphere():
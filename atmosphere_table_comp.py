@@ -0,0 +1,146 @@
+import numpy as np
+from scipy.interpolate import CubicSpline
+from openmdao.api import ExplicitComponent, Problem
+from input_cache import InputCache
+from node_chunks import NodeChunks
+
+# 1976 U.S. Standard Atmosphere layers: base geopotential altitude (m), base temperature (K) and
+# lapse rate (K/m). The last layer is the isothermal region above the mesopause, which the
+# standard keeps at 186.87 K up to 91 km geometric, i.e. just past the 300k ft table ceiling.
+US76_LAYERS = [(0., 288.15, -.0065),
+               (11000., 216.65, 0.),
+               (20000., 216.65, .001),
+               (32000., 228.65, .0028),
+               (47000., 270.65, 0.),
+               (51000., 270.65, -.0028),
+               (71000., 214.65, -.002),
+               (84852., 186.946, 0.)]
+
+def us76_density(h):
+    # Density (slug/ft**3) at geometric altitude h (ft) from the hydrostatic layer equations
+    g_0 = 9.80665
+    R = 287.0531
+    r_0 = 6356766.
+    z = np.asarray(h, dtype=float)*.3048
+    H = r_0*z/(r_0 + z)
+
+    P_b = 101325.
+    rho = np.empty_like(H)
+    for i, (H_b, T_b, L) in enumerate(US76_LAYERS):
+        H_top = US76_LAYERS[i + 1][0] if i + 1 < len(US76_LAYERS) else np.inf
+        mask = (H >= H_b) & (H < H_top) if i > 0 else H < H_top
+        dH = H[mask] - H_b
+        if L == 0.:
+            T = T_b*np.ones_like(dH)
+            P = P_b*np.exp(-g_0*dH/(R*T_b))
+        else:
+            T = T_b + L*dH
+            P = P_b*(T/T_b)**(-g_0/(R*L))
+        rho[mask] = P/(R*T)
+
+        # pressure at the top of the layer becomes the base of the next one
+        dH_top = H_top - H_b
+        if np.isfinite(dH_top):
+            if L == 0.:
+                P_b = P_b*np.exp(-g_0*dH_top/(R*T_b))
+            else:
+                P_b = P_b*((T_b + L*dH_top)/T_b)**(-g_0/(R*L))
+
+    return(rho*.00194032)
+
+_SPLINES = {}
+
+def us76_spline(h_max=300000., dh=500.):
+    # Cubic spline of log(rho) on a uniform altitude grid, returned as (h_0, dh, coefficients) with
+    # coefficients[i] the cubic, highest power first, in (h - h_i) on interval i. Cached so every
+    # component instance and node count shares the same arrays.
+    key = (h_max, dh)
+    if key not in _SPLINES:
+        h = np.arange(0., h_max + dh/2, dh)
+        spline = CubicSpline(h, np.log(us76_density(h)))
+        _SPLINES[key] = (h[0], dh, np.ascontiguousarray(spline.c.T))
+    return(_SPLINES[key])
+
+class AtmosphereTable(ExplicitComponent):
+
+    def initialize(self):
+        self.options.declare("num_nodes", types=int)
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
+        self.options.declare("h_max", default=300000., desc="top of the density table (ft)")
+        self.options.declare("table_spacing", default=500., desc="altitude spacing of the density table (ft)")
+
+    def setup(self):
+
+        nn = self.options["num_nodes"]
+
+        self.add_input("h", val=np.ones(nn), desc="altitude", units="ft")
+
+        self.add_output("rho", val=np.ones(nn), desc="local density", units="slug/ft**3")
+
+        partial_range = np.arange(nn, dtype=int)
+
+        self.declare_partials("rho", "h", rows=partial_range, cols=partial_range)
+
+        self._h_0, self._dh, self._coeffs = us76_spline(self.options["h_max"], self.options["table_spacing"])
+        self._cache = InputCache(["h"], ["t", "rho", "dlogrho_dh"], nn, index_names=["idx"])
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        h = inputs["h"][s]
+        c = self._coeffs
+        idx = buf["idx"][s]
+        t = buf["t"][s]
+
+        # the grid is uniform, so the bracketing interval follows from arithmetic instead of a search;
+        # points outside the table extrapolate with the end polynomials
+        idx[:] = np.clip((h.real - self._h_0)//self._dh, 0, c.shape[0] - 1)
+        np.subtract(h - self._h_0, idx*self._dh, out=t)
+
+        c_i = c.take(idx, axis=0)
+        c_0 = c_i[:, 0]
+        c_1 = c_i[:, 1]
+        c_2 = c_i[:, 2]
+        np.exp(((c_0*t + c_1)*t + c_2)*t + c_i[:, 3], out=buf["rho"][s])
+        buf["dlogrho_dh"][s] = (3*c_0*t + 2*c_1)*t + c_2
+
+    def compute(self, inputs, outputs):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, buf, outputs)
+
+    def _compute(self, buf, outputs, s):
+
+        outputs["rho"][s] = buf["rho"][s]
+
+    def compute_partials(self, inputs, J):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, buf, J)
+
+    def _compute_partials(self, buf, J, s):
+
+        np.multiply(buf["rho"][s], buf["dlogrho_dh"][s], out=J["rho", "h"][s])
+
+
+def test_atmosphere_table():
+    prob = Problem()
+    prob.model = AtmosphereTable(num_nodes=5)
+
+    prob.setup(check=False, force_alloc_complex=True)
+
+    prob.run_model()
+
+    return(prob)
+
+if __name__ == "__main__":
+
+    prob = test_atmosphere_table()
+    prob.check_partials(compact_print=True, method="cs")
@@ -0,0 +1,197 @@
+import argparse
+import copy
+import sys
+import numpy as np
+from warm_start import STATES, CONTROLS
+
+# Relative range below which a guessed profile counts as constant; its scale then comes from
+# its magnitude instead of its range
+FLAT_RTOL = 1e-8
+
+def _short_name(name):
+    # "traj.phases.phase0.collocation_constraint.defects:h" -> "defects:h"
+    return(name.rsplit(".", 1)[-1])
+
+def _scaler(meta):
+    # newer OpenMDAO versions keep the ref/ref0 and unit scaling combined in total_scaler
+    scaler = meta["total_scaler"] if "total_scaler" in meta else meta["scaler"]
+    return(1. if scaler is None else np.asarray(scaler, dtype=float))
+
+def _unscaled_bounds(driver):
+    # Older OpenMDAO versions store the driver bounds scaled already; newer ones keep them in model
+    # units and scale them in the driver autoscaler. total_scaler exists in both, so it does not
+    # tell the two apart.
+    return(hasattr(driver, "_autoscaler"))
+
+def set_bound(driver, name, key, value):
+    # Changes the "lower", "upper" or "equals" bound of a constraint or design variable of a set-up
+    # driver, e.g. the heating limit of a reused problem; the next run_driver uses it. value is in
+    # the units the variable was added with, which must be the model units on newer versions (as
+    # for the q path constraint).
+    voi_type = "constraint" if name in driver._cons else "design_var"
+    meta = driver._cons[name] if voi_type == "constraint" else driver._designvars[name]
+    value = np.asarray(value, dtype=float)
+    if meta.get("size") is not None:
+        # one entry per entry of the variable, as older versions index the bounds
+        value = np.broadcast_to(value, (meta["size"],)).copy()
+    if _unscaled_bounds(driver):
+        # the autoscaler caches the scaled bounds, but recomputes them from meta in the
+        # final_setup of every run_driver (test_autoscaling checks it on the installed version)
+        meta[key] = value
+    else:
+        if meta.get("adder") is not None:
+            value = value + meta["adder"]
+        if meta.get("scaler") is not None:
+            value = value*meta["scaler"]
+        meta[key] = value
+
+def total_jacobian(prob, driver_scaling=True):
+    # {response: {design var: array}} of the driver at the current point, with or without the
+    # driver scaling; the unscaled blocks are recovered from the scaled ones so that one
+    # derivative evaluation serves both
+    driver = prob.driver
+    totals = driver._compute_totals(return_format="dict")
+    if driver_scaling:
+        return(totals)
+
+    responses = driver._responses
+    designvars = driver._designvars
+    unscaled = {}
+    for of, blocks in totals.items():
+        row_scaler = np.atleast_1d(_scaler(responses[of]))[:, None]
+        unscaled[of] = dict((wrt, J/row_scaler*np.atleast_1d(_scaler(designvars[wrt]))[None, :]) for wrt, J in blocks.items())
+    return(unscaled)
+
+def condition_number(prob):
+    # 2-norm condition number of the scaled Jacobian of the equality constraints (collocation
+    # defects and continuity), the system every Newton step of the optimizer solves; the path
+    # constraints are left out since only their active rows enter it
+    driver = prob.driver
+    totals = total_jacobian(prob)
+    wrt = list(driver._designvars)
+    rows = [np.hstack([np.atleast_2d(totals[of][name]) for name in wrt]) for of, meta in driver._cons.items() if meta.get("equals") is not None]
+    return(float(np.linalg.cond(np.vstack(rows))))
+
+def guess_range(values):
+    # (ref0, ref) mapping a guessed profile onto [0, 1]; a constant profile is scaled by its
+    # magnitude with ref0=0
+    lower = float(np.min(values))
+    upper = float(np.max(values))
+    magnitude = max(abs(lower), abs(upper))
+    if upper - lower <= FLAT_RTOL*max(magnitude, 1.):
+        return(0., magnitude if magnitude > 0 else 1.)
+    return(lower, upper)
+
+def compute_scaling(prob, base=None):
+    # Scaling of the phase in the format of reentry_dymos.MANUAL_SCALING, derived at the current
+    # point of a set-up problem (normally the initial guess):
+    #   states and controls    ref0/ref map the guessed profile onto [0, 1]
+    #   duration               duration_ref is the guessed duration
+    #   defects, q, objective  ref is the median over the rows of the largest Jacobian entry with
+    #   and rate continuity    respect to the rescaled design variables, so the rows are equilibrated
+    #                          and every scaled Jacobian block has unit size entries
+    # Control value continuity keeps the scaling dymos gives it. base supplies the structure and
+    # the sign of the objective ref (maximization).
+    from reentry_dymos import MANUAL_SCALING
+
+    base = base if base is not None else MANUAL_SCALING
+    scaling = copy.deepcopy(base)
+    driver = prob.driver
+
+    ranges = {}
+    for name, meta in driver._designvars.items():
+        value = prob.get_val(meta.get("source") or name)
+        short = _short_name(name)
+        if short == "t_duration":
+            duration = float(np.atleast_1d(value)[0])
+            scaling["time"] = {"duration_ref": duration}
+            ranges[name] = duration
+            continue
+        kind, var = short.split(":", 1)
+        ref0, ref = guess_range(value)
+        ranges[name] = ref - ref0
+        if kind == "states" and var in scaling["states"]:
+            scaling["states"][var] = {"ref0": ref0, "ref": ref}
+        elif kind == "controls" and var in scaling["controls"]:
+            scaling["controls"][var] = {"ref0": ref0, "ref": ref}
+
+    # largest entry of every row once the columns are scaled by the new design variable ranges
+    totals = total_jacobian(prob, driver_scaling=False)
+    for of, blocks in totals.items():
+        row_max = np.zeros(np.atleast_2d(next(iter(blocks.values()))).shape[0])
+        for wrt, J in blocks.items():
+            if J.size:
+                row_max = np.maximum(row_max, np.abs(np.atleast_2d(J)*ranges[wrt]).max(axis=1))
+        nonzero = row_max[row_max > 0]
+        if nonzero.size == 0:
+            continue
+        ref = float(np.median(nonzero))
+
+        short = _short_name(of)
+        if of in driver._objs:
+            sign = np.sign(base["objective"].get("ref", 1.)) or 1.
+            scaling["objective"] = {"ref": sign*ref}
+        elif short.startswith("defects:") and short[8:] in scaling["states"]:
+            scaling["states"][short[8:]]["defect_ref"] = ref
+        elif short.startswith("defect_control_rates:") and short.endswith("_rate") and short[21:-5] in scaling["controls"]:
+            scaling["controls"][short[21:-5]]["rate_continuity_scaler"] = 1/ref
+        elif short == "path:q":
+            scaling["q"] = {"ref": ref}
+
+    return(scaling)
+
+def autoscale(initial_guess=None, base=None, **options):
+    # Builds the problem with the base scaling (MANUAL_SCALING by default), computes the scaling
+    # at the initial guess, and rebuilds the problem with it. options go to build_problem and
+    # initial_guess(prob, phase0) sets the guess (set_initial_guess by default). Returns the
+    # scaled problem with the guess applied, its phase, the scaling and the condition numbers
+    # before and after.
+    from reentry_dymos import build_problem, set_initial_guess
+
+    initial_guess = initial_guess if initial_guess is not None else set_initial_guess
+    options.setdefault("check", False)
+
+    prob, phase0 = build_problem(scaling=base, **options)
+    initial_guess(prob, phase0)
+    prob.run_model()
+    before = condition_number(prob)
+    scaling = compute_scaling(prob, base)
+
+    prob, phase0 = build_problem(scaling=scaling, **options)
+    initial_guess(prob, phase0)
+    prob.run_model()
+    after = condition_number(prob)
+
+    return(prob, phase0, scaling, {"before": before, "after": after})
+
+def format_scaling(scaling, conditions=None):
+    lines = ["%-18s %14s %14s %14s" % ("variable", "ref0", "ref", "defect_ref")]
+    for name in STATES:
+        options = scaling["states"][name]
+        lines.append("%-18s %14s %14s %14s" % tuple(["state " + name] + ["%.6g" % options[key] if key in options else "-" for key in ("ref0", "ref", "defect_ref")]))
+    for name in CONTROLS:
+        options = scaling["controls"][name]
+        lines.append("%-18s %14s %14s %14s" % tuple(["control " + name] + ["%.6g" % options[key] if key in options else "-" for key in ("ref0", "ref")] + ["-"]))
+    lines.append("%-18s %14s %14.6g" % ("duration", "-", scaling["time"]["duration_ref"]))
+    if "ref" in scaling["q"]:
+        lines.append("%-18s %14s %14.6g" % ("path q", "-", scaling["q"]["ref"]))
+    lines.append("%-18s %14s %14.6g" % ("objective", "-", scaling["objective"]["ref"]))
+    if conditions is not None:
+        lines.append("Condition number of the scaled equality constraint Jacobian: %.3e before, %.3e after" % (conditions["before"], conditions["after"]))
+    return("\n".join(lines))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Derive the phase scaling from the initial guess and compare the conditioning with the hand-tuned scaling.")
+    parser.add_argument("--heating-limit", type=float, default=70.)
+    parser.add_argument("--segments", type=int, default=50)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--transcription", choices=["radau", "gauss-lobatto"], default="radau")
+    args = parser.parse_args(argv)
+
+    prob, phase0, scaling, conditions = autoscale(heating_limit=args.heating_limit, transcription=args.transcription,
+                                                  num_segments=args.segments, order=args.order)
+    print(format_scaling(scaling, conditions))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import argparse
+import csv
+import itertools
+import sys
+import time
+import traceback
+import numpy as np
+from driver_recorder import count_totals
+from sweep import run_tasks
+
+# The SNOPT solutions checked by test_reentry_dymos.py; a case reaches the reference when both
+# agree within REFERENCE_RTOL
+REFERENCE = {"final_time": 2181.9, "final_theta": .5344}
+REFERENCE_RTOL = 1e-3
+
+# Optimizers tried through pyoptsparse, then the ones ScipyOptimizeDriver provides without it
+PYOPTSPARSE_OPTIMIZERS = ["SNOPT", "IPOPT", "SLSQP"]
+SCIPY_OPTIMIZERS = ["SLSQP"]
+
+PARAMETERS = ["optimizer", "backend", "transcription", "num_segments", "order"]
+RESULTS = ["status", "reference", "final_time", "final_theta", "function_evaluations", "gradient_evaluations",
+           "ode_evaluations", "ode_jacobian_evaluations", "wall_time", "cpu_time", "error"]
+
+def available_optimizers():
+    # Maps every usable optimizer to its backend, preferring pyoptsparse; a pyoptsparse optimizer
+    # counts as available when its module imports (SNOPT needs the licensed source)
+    optimizers = {}
+    try:
+        from pyoptsparse import OPT
+    except ImportError:
+        OPT = None
+    if OPT is not None:
+        for optimizer in PYOPTSPARSE_OPTIMIZERS:
+            try:
+                OPT(optimizer)
+            except Exception:
+                continue
+            optimizers[optimizer] = "pyoptsparse"
+    for optimizer in SCIPY_OPTIMIZERS:
+        optimizers.setdefault(optimizer, "scipy")
+    return(optimizers)
+
+def make_driver(optimizer, backend="pyoptsparse", maxiter=500, tol=1e-6):
+    # A quiet driver for one cell of the matrix
+    from openmdao.api import pyOptSparseDriver, ScipyOptimizeDriver
+
+    if backend == "scipy":
+        return(ScipyOptimizeDriver(optimizer=optimizer, maxiter=maxiter, tol=tol, disp=False))
+
+    driver = pyOptSparseDriver(optimizer=optimizer, print_results=False)
+    if optimizer == "SNOPT":
+        driver.opt_settings["iSumm"] = 0
+        driver.opt_settings["Major iterations limit"] = maxiter
+    elif optimizer == "IPOPT":
+        driver.opt_settings["print_level"] = 0
+        driver.opt_settings["max_iter"] = maxiter
+    elif optimizer == "SLSQP":
+        driver.opt_settings["IPRINT"] = -1
+        driver.opt_settings["MAXIT"] = maxiter
+    return(driver)
+
+def count_gradients(driver):
+    # Counts the total derivative evaluations of the optimizer (one per major iteration of the SQP
+    # and interior point methods, without the ones the dynamic coloring takes) in driver.num_gradients
+    driver.num_gradients = 0
+
+    def counted():
+        driver.num_gradients += 1
+
+    return(count_totals(driver, counted))
+
+def ode_evaluations(profiler):
+    # (compute, compute_partials) calls of the ODE: every ShuttleODE evaluation runs FlightDynamics
+    # once and every fused ODE evaluation ShuttleODEFused once
+    calls = {"compute": 0, "compute_partials": 0}
+    for row in profiler.rows():
+        if row["class"] in ("FlightDynamics", "ShuttleODEFused"):
+            calls[row["method"]] += row["calls"]
+    return(calls["compute"], calls["compute_partials"])
+
+def reaches_reference(final_time, final_theta, rtol=REFERENCE_RTOL):
+    return(bool(abs(final_time - REFERENCE["final_time"]) <= rtol*REFERENCE["final_time"]
+                and abs(final_theta - REFERENCE["final_theta"]) <= rtol*REFERENCE["final_theta"]))
+
+def expand_matrix(optimizers, transcriptions=("radau", "gauss-lobatto"), num_segments=(50,), orders=(3,)):
+    # optimizers maps names to backends, as available_optimizers() returns
+    cases = []
+    for (optimizer, backend), transcription, segments, order in itertools.product(sorted(optimizers.items()), transcriptions, num_segments, orders):
+        cases.append({"optimizer": optimizer, "backend": backend, "transcription": transcription, "num_segments": int(segments), "order": int(order)})
+    return(cases)
+
+def run_case(case, maxiter=500, coloring_dir=None):
+    # Solves the reference problem (heating limit 70, default initial guess) in one configuration;
+    # errors are reported in the row so that one bad cell cannot end the matrix
+    row = dict(case)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        from reentry_dymos import build_problem, driver_failed, set_initial_guess
+        from profiling import ComponentProfiler
+
+        driver = make_driver(case["optimizer"], case["backend"], maxiter=maxiter)
+        prob, phase0 = build_problem(heating_limit=70, transcription=case["transcription"], num_segments=case["num_segments"],
+                                     order=case["order"], driver=driver, check=False, coloring_dir=coloring_dir)
+        set_initial_guess(prob, phase0)
+        count_gradients(prob.driver)
+
+        with ComponentProfiler() as profiler:
+            failed = driver_failed(prob.run_driver())
+
+        final_time = float(prob.get_val("traj.phase0.timeseries.time", units="s")[-1])
+        final_theta = float(prob.get_val("traj.phase0.timeseries.states:theta", units="rad")[-1])
+        evaluations, jacobians = ode_evaluations(profiler)
+        row.update(status="failed" if failed else "converged",
+                   reference=not failed and reaches_reference(final_time, final_theta),
+                   final_time=final_time,
+                   final_theta=final_theta,
+                   function_evaluations=prob.driver.iter_count,
+                   gradient_evaluations=prob.driver.num_gradients,
+                   ode_evaluations=evaluations,
+                   ode_jacobian_evaluations=jacobians,
+                   error="")
+    except Exception:
+        row.update(status="error", reference=False, final_time=np.nan, final_theta=np.nan, function_evaluations=0, gradient_evaluations=0,
+                   ode_evaluations=0, ode_jacobian_evaluations=0, error=traceback.format_exc(limit=1).strip().splitlines()[-1])
+
+    row["wall_time"] = time.perf_counter() - wall_start
+    row["cpu_time"] = time.process_time() - cpu_start
+    return(row)
+
+def run_matrix(cases, filename, max_workers=1, maxiter=500, coloring_dir=None, out_stream=sys.stdout):
+    # Every case runs in a worker process, one at a time by default so that the timings do not
+    # compete for cores; rows are appended to the CSV file as the cases finish. A case that kills its
+    # worker is reported as an error without losing the others (see sweep.run_tasks).
+    rows = []
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PARAMETERS + RESULTS, extrasaction="ignore")
+        writer.writeheader()
+        f.flush()
+
+        tasks = [(case, maxiter, coloring_dir) for case in cases]
+        for index, row, err in run_tasks(run_case, tasks, max_workers):
+            if err is not None:
+                # the worker process itself died, e.g. a crash inside the optimizer
+                row = dict(cases[index], status="error", reference=False, final_time=np.nan, final_theta=np.nan, function_evaluations=0,
+                           gradient_evaluations=0, ode_evaluations=0, ode_jacobian_evaluations=0, wall_time=np.nan, cpu_time=np.nan,
+                           error=repr(err))
+            writer.writerow(row)
+            f.flush()
+            rows.append(row)
+            if out_stream is not None:
+                out_stream.write(format_row(row) + "\n")
+                out_stream.flush()
+
+    return(rows)
+
+def format_row(row):
+    return("%-6s %-11s %-13s %4d %2d %-9s %-5s %10.3f %9.6f %6d %7d %8d %9.1f %9.1f" % (row["optimizer"], row["backend"], row["transcription"],
+                                                                                         row["num_segments"], row["order"], row["status"], row["reference"],
+                                                                                         row["final_time"], row["final_theta"], row["gradient_evaluations"],
+                                                                                         row["function_evaluations"], row["ode_evaluations"],
+                                                                                         row["wall_time"], row["cpu_time"]))
+
+def fastest(rows):
+    # The quickest case that reaches the reference solution, or None
+    reached = [row for row in rows if row["reference"]]
+    if not reached:
+        return(None)
+    return(min(reached, key=lambda row: row["wall_time"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reentry problem across optimizers, transcriptions and meshes.")
+    parser.add_argument("--optimizers", nargs="+", default=None, help="optimizers to run (default: every installed one)")
+    parser.add_argument("--transcription", nargs="+", choices=["radau", "gauss-lobatto"], default=["radau", "gauss-lobatto"])
+    parser.add_argument("--segments", nargs="+", type=int, default=[50])
+    parser.add_argument("--order", nargs="+", type=int, default=[3])
+    parser.add_argument("--maxiter", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--coloring-dir", default=None, help="total coloring cache shared by the cases")
+    parser.add_argument("--out", default="benchmark_matrix.csv")
+    args = parser.parse_args(argv)
+
+    optimizers = available_optimizers()
+    if args.optimizers is not None:
+        missing = [optimizer for optimizer in args.optimizers if optimizer not in optimizers]
+        if missing:
+            print("Not installed: %s" % ", ".join(missing))
+        optimizers = dict((optimizer, backend) for optimizer, backend in optimizers.items() if optimizer in args.optimizers)
+    if not optimizers:
+        print("No optimizer to run")
+        return(1)
+
+    cases = expand_matrix(optimizers, args.transcription, args.segments, args.order)
+    print("Running %d cases with %s" % (len(cases), ", ".join("%s (%s)" % item for item in sorted(optimizers.items()))))
+    print("%-6s %-11s %-13s %4s %2s %-9s %-5s %10s %9s %6s %7s %8s %9s %9s" % ("opt", "backend", "transcription", "segs", "k", "status", "ref",
+                                                                             "t_f (s)", "theta_f", "grads", "f evals", "ODE evals", "wall (s)", "cpu (s)"))
+    rows = run_matrix(cases, args.out, max_workers=args.workers, maxiter=args.maxiter, coloring_dir=args.coloring_dir)
+
+    best = fastest(rows)
+    if best is None:
+        print("No case reached the reference solution (%.1f s, %.4f rad); results in %s" % (REFERENCE["final_time"], REFERENCE["final_theta"], args.out))
+    else:
+        print("Fastest to the reference: %s (%s), %s, %d segments of order %d in %.1f s; results in %s"
+              % (best["optimizer"], best["backend"], best["transcription"], best["num_segments"], best["order"], best["wall_time"], args.out))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
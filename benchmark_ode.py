@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from openmdao.api import Problem, Group
+from atmosphere_comp import Atmosphere
+from atmosphere_table_comp import AtmosphereTable
+from aerodynamics_comp import Aerodynamics
+from heating_comp import AerodynamicHeating
+from flight_dynamics_comp import FlightDynamics
+from shuttle_ode import ShuttleODE
+from shuttle_ode_fused_comp import ShuttleODEFused
+from physics_kernels import ENGINES
+
+SYSTEMS = {"Atmosphere": Atmosphere,
+           "AtmosphereTable": AtmosphereTable,
+           "Aerodynamics": Aerodynamics,
+           "AerodynamicHeating": AerodynamicHeating,
+           "FlightDynamics": FlightDynamics,
+           "ShuttleODE": ShuttleODE,
+           "ShuttleODEFused": ShuttleODEFused}
+
+# Systems with an engine option; the others always run their NumPy implementation
+ENGINE_SYSTEMS = ["AerodynamicHeating", "FlightDynamics", "ShuttleODE"]
+
+DEFAULT_NODES = [1, 10, 100, 1000, 10000, 100000]
+
+# Representative values along the reference trajectory, in the units each component declares
+INPUT_RANGES = {"h": ([260000, 80000], "ft"),
+                "alpha": ([40, 15], "deg"),
+                "beta": ([-75*np.pi/180, 0], "rad"),
+                "gamma": ([-1*np.pi/180, -5*np.pi/180], "rad"),
+                "psi": ([90*np.pi/180, 10*np.pi/180], "rad"),
+                "theta": ([0, 25*np.pi/180], "rad"),
+                "v": ([25600, 2500], "ft/s"),
+                "rho": ([1.e-7, 1.e-4], "slug/ft**3"),
+                "lift": ([1.e4, 2.e5], "lb"),
+                "drag": ([1.e4, 1.e5], "lb")}
+
+def build_problem(system_class, num_nodes, options=None):
+    prob = Problem(model=Group())
+    prob.model.add_subsystem("ode", system_class(num_nodes=num_nodes, **(options or {})), promotes_inputs=["*"])
+    prob.setup(check=False)
+
+    for name, (ys, units) in INPUT_RANGES.items():
+        try:
+            prob.set_val(name, np.linspace(ys[0], ys[1], num_nodes), units=units)
+        except KeyError:
+            pass
+
+    prob.final_setup()
+    return(prob)
+
+def _time_call(func, min_time=.2, min_repeats=3, max_repeats=10000):
+    func()
+    repeats = 0
+    start = time.perf_counter()
+    elapsed = 0.
+    while repeats < min_repeats or (elapsed < min_time and repeats < max_repeats):
+        func()
+        repeats += 1
+        elapsed = time.perf_counter() - start
+    return(elapsed/repeats)
+
+def _trace_call(func):
+    # Peak traced memory during one call, net of what was already allocated; numpy reports
+    # its array buffers to tracemalloc, so this captures the temporaries a call creates.
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+    return(peak)
+
+def invalidate_caches(prob):
+    for system in prob.model.system_iter(include_self=True, recurse=True):
+        for name in ("_cache", "_kernel"):
+            cache = getattr(system, name, None)
+            if cache is not None:
+                cache.invalidate()
+
+def benchmark_system(system_class, num_nodes, options=None):
+    # compute is timed from a cold intermediate cache, compute_partials right after a compute at
+    # the same point, which is the order a driver evaluates them in
+    prob = build_problem(system_class, num_nodes, options)
+
+    def run_compute():
+        invalidate_caches(prob)
+        prob.run_model()
+
+    run_partials = prob.model.run_linearize
+
+    run_compute()
+    compute_time = _time_call(run_compute)
+    partials_time = _time_call(run_partials)
+    compute_peak = _trace_call(run_compute)
+    partials_peak = _trace_call(run_partials)
+
+    # Temporary allocations expressed as the number of num_nodes-long float arrays alive at the peak
+    return({"compute_ns_per_node": compute_time*1e9/num_nodes,
+            "partials_ns_per_node": partials_time*1e9/num_nodes,
+            "compute_peak_bytes": compute_peak,
+            "partials_peak_bytes": partials_peak,
+            "compute_peak_arrays": compute_peak/(8.*num_nodes),
+            "partials_peak_arrays": partials_peak/(8.*num_nodes)})
+
+def run_benchmarks(systems=None, node_counts=DEFAULT_NODES, out_stream=sys.stdout, engine="numpy", num_threads=1):
+    # Results of a non-default engine or thread count are keyed "<system>[<engine>,<n>t]" so they
+    # have their own baseline
+    if systems is None:
+        systems = list(SYSTEMS)
+
+    results = {}
+    for name in systems:
+        options = {"num_threads": num_threads}
+        tags = []
+        if engine != "numpy" and name in ENGINE_SYSTEMS:
+            options["engine"] = engine
+            tags.append(engine)
+        if num_threads > 1:
+            tags.append("%dt" % num_threads)
+        key = "%s[%s]" % (name, ",".join(tags)) if tags else name
+        results[key] = {}
+        for nn in node_counts:
+            results[key][str(nn)] = stats = benchmark_system(SYSTEMS[name], nn, options)
+            if out_stream is not None:
+                out_stream.write("%-28s %8d %12.1f %12.1f %12d %12d %8.1f %8.1f\n" % (key, nn, stats["compute_ns_per_node"], stats["partials_ns_per_node"],
+                                                                                      stats["compute_peak_bytes"], stats["partials_peak_bytes"],
+                                                                                      stats["compute_peak_arrays"], stats["partials_peak_arrays"]))
+                out_stream.flush()
+
+    return(results)
+
+def thread_speedups(results_by_threads):
+    # Speedup of every thread count over the smallest one per system and mesh size, from the
+    # run_benchmarks results of each num_threads (same systems and node counts)
+    counts = sorted(results_by_threads)
+    base = results_by_threads[counts[0]]
+    rows = []
+    for index, name in enumerate(base):
+        for nn, reference in base[name].items():
+            row = {"system": name, "nodes": int(nn)}
+            for num_threads in counts[1:]:
+                stats = list(results_by_threads[num_threads].values())[index][nn]
+                row[num_threads] = (reference["compute_ns_per_node"]/stats["compute_ns_per_node"],
+                                    reference["partials_ns_per_node"]/stats["partials_ns_per_node"])
+            rows.append(row)
+    return(rows)
+
+def find_regressions(results, baseline, threshold=.25):
+    # A case regresses when its time per node grows by more than threshold relative to the baseline
+    regressions = []
+    for name, cases in results.items():
+        for nn, stats in cases.items():
+            try:
+                reference = baseline["results"][name][nn]
+            except KeyError:
+                continue
+            for key in ("compute_ns_per_node", "partials_ns_per_node"):
+                if stats[key] > reference[key]*(1 + threshold):
+                    regressions.append((name, int(nn), key, reference[key], stats[key]))
+
+    return(regressions)
+
+def save_baseline(results, filename):
+    data = {"python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "results": results}
+    with open(filename, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def load_baseline(filename):
+    with open(filename) as f:
+        return(json.load(f))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time compute and compute_partials of the ShuttleODE components over a range of num_nodes.")
+    parser.add_argument("--systems", nargs="+", choices=list(SYSTEMS), default=list(SYSTEMS))
+    parser.add_argument("--nodes", nargs="+", type=int, default=DEFAULT_NODES)
+    parser.add_argument("--save", metavar="FILE", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a JSON baseline and fail on regressions")
+    parser.add_argument("--engine", choices=ENGINES, default="numpy", help="engine of the systems that have one")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1], help="num_threads of the systems; several values measure the scaling")
+    parser.add_argument("--threshold", type=float, default=.25, help="allowed fractional slowdown per node before flagging a regression")
+    args = parser.parse_args(argv)
+
+    print("%-28s %8s %12s %12s %12s %12s %8s %8s" % ("system", "nodes", "compute ns/n", "partial ns/n", "c peak B", "p peak B", "c arrays", "p arrays"))
+    results = {}
+    results_by_threads = {}
+    for num_threads in args.threads:
+        results_by_threads[num_threads] = run_benchmarks(args.systems, args.nodes, engine=args.engine, num_threads=num_threads)
+        results.update(results_by_threads[num_threads])
+
+    if len(results_by_threads) > 1:
+        counts = sorted(results_by_threads)
+        print("\nSpeedup over %d thread(s) on %d cores, compute / partials" % (counts[0], os.cpu_count()))
+        print("%-28s %8s" % ("system", "nodes") + "".join(" %13s" % ("%d threads" % num_threads) for num_threads in counts[1:]))
+        for row in thread_speedups(results_by_threads):
+            print("%-28s %8d" % (row["system"], row["nodes"]) + "".join(" %6.2f/%-6.2f" % row[num_threads] for num_threads in counts[1:]))
+
+    if args.save:
+        save_baseline(results, args.save)
+
+    if args.compare:
+        regressions = find_regressions(results, load_baseline(args.compare), args.threshold)
+        for name, nn, key, reference, value in regressions:
+            print("REGRESSION %s nodes=%d %s: %.1f -> %.1f ns/node" % (name, nn, key, reference, value))
+        if regressions:
+            return(1)
+
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
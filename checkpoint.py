@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from driver_recorder import DriverRecorder, count_totals
+from warm_start import STATES, CONTROLS
+
+def phase_variables(phase_path="traj.phase0"):
+    # The design vector of the phase: every state and control at its input nodes and the time extents
+    names = [phase_path + ".t_initial", phase_path + ".t_duration"]
+    names += [phase_path + ".states:" + name for name in STATES]
+    names += [phase_path + ".controls:" + name for name in CONTROLS]
+    return(names)
+
+def write_checkpoint(filename, values, metadata):
+    # One uncompressed npz with the arrays and the metadata as a JSON string, written to a
+    # temporary file in the same directory and renamed over the old checkpoint, so a kill at any
+    # moment leaves either the previous or the new checkpoint
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, _metadata=np.array(json.dumps(metadata, default=float)), **values)
+        os.replace(tmp, filename)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def read_checkpoint(filename):
+    with np.load(filename) as data:
+        values = dict((name, data[name]) for name in data.files if name != "_metadata")
+        metadata = json.loads(str(data["_metadata"]))
+    return(values, metadata)
+
+def restore(prob, filename):
+    # Sets the variables of a checkpoint on a set-up problem with the same mesh and returns the
+    # checkpoint metadata; the optimizer then starts from the checkpointed iterate (its Hessian
+    # approximation is not part of the checkpoint)
+    values, metadata = read_checkpoint(filename)
+    for name, value in values.items():
+        current = prob.get_val(name)
+        if np.size(current) != np.size(value):
+            raise ValueError("checkpoint %s has %d values for %s, the problem %d" % (filename, np.size(value), name, np.size(current)))
+    for name, value in values.items():
+        prob.set_val(name, value)
+    return(metadata)
+
+class Checkpointer(DriverRecorder):
+
+    # Driver recorder that writes the design vector (states, controls and time extents of the
+    # phase) to a checkpoint file every `every` major iterations. A major iteration is counted at
+    # every total derivative evaluation of the optimizer (see driver_recorder.count_totals), which
+    # the SQP and interior point optimizers do once per accepted iterate; the variables are written
+    # right after it, so the checkpoint holds a major iterate rather than a line search trial point.
+    #
+    #     prob.driver.add_recorder(Checkpointer("reentry.ckpt.npz", every=10))
+    #     prob.setup()
+    #     ...
+    #     restore(prob, "reentry.ckpt.npz")   # in a later process, after set_initial_guess
+
+    def __init__(self, filename, every=10, variables=None, metadata=None):
+        super(Checkpointer, self).__init__()
+        self.filename = filename
+        self.every = every
+        self.variables = variables if variables is not None else phase_variables()
+        self.metadata = dict(metadata) if metadata is not None else {}
+        self.num_majors = 0
+        self.num_evaluations = 0
+        self.num_checkpoints = 0
+        self.write_time = 0.
+        self._driver = None
+        self._start = time.perf_counter()
+
+    def startup(self, recording_requester, *args, **kwargs):
+        super(Checkpointer, self).startup(recording_requester, *args, **kwargs)
+        driver = recording_requester
+        if self._driver is driver:
+            return
+        self._driver = driver
+        self._start = time.perf_counter()
+
+        count_totals(driver, self._major)
+
+    def _major(self):
+        self.num_majors += 1
+        if self.every and self.num_majors % self.every == 0:
+            self.save()
+
+    def save(self, **metadata):
+        start = time.perf_counter()
+        driver = self._driver
+        prob = driver._problem()
+        values = dict((name, prob.get_val(name)) for name in self.variables)
+        meta = dict(self.metadata)
+        meta.update(major_iterations=self.num_majors,
+                    evaluations=self.num_evaluations,
+                    driver_iterations=driver.iter_count,
+                    optimizer=driver.options["optimizer"] if "optimizer" in driver.options else type(driver).__name__,
+                    elapsed=time.perf_counter() - self._start,
+                    time=time.time())
+        meta.update(metadata)
+        write_checkpoint(self.filename, values, meta)
+        self.num_checkpoints += 1
+        self.write_time += time.perf_counter() - start
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        self.num_evaluations += 1
@@ -0,0 +1,77 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import openmdao
+import dymos
+from openmdao.utils.coloring import compute_total_coloring
+
+def source_digest(*objects):
+    # sha1 over the source files of the modules defining the given classes or functions and of
+    # every module from the same directory they reference, e.g. ShuttleODE and its components
+    digest = hashlib.sha1()
+    seen = set()
+    pending = [sys.modules[obj.__module__] for obj in objects]
+    while pending:
+        module = pending.pop()
+        filename = getattr(module, "__file__", None)
+        if filename is None or filename in seen:
+            continue
+        seen.add(filename)
+        directory = os.path.dirname(os.path.abspath(filename))
+        for value in vars(module).values():
+            other = inspect.getmodule(value)
+            other_file = getattr(other, "__file__", None)
+            if other_file is not None and other_file not in seen and os.path.dirname(os.path.abspath(other_file)) == directory:
+                pending.append(other)
+
+    for filename in sorted(seen):
+        with open(filename, "rb") as f:
+            digest.update(f.read())
+    return(digest.hexdigest())
+
+def coloring_key(config, *objects):
+    # config holds the structural options of the phase (transcription, segments, order, which
+    # constraints are present); the source digest covers states, controls and ODE partials
+    text = json.dumps({"config": config,
+                       "source": source_digest(*objects),
+                       "openmdao": openmdao.__version__,
+                       "dymos": dymos.__version__}, sort_keys=True, default=str)
+    return(hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+class ColoringCache(object):
+
+    # Directory of total derivative colorings, one <key>.pkl per problem structure. A miss computes
+    # the coloring once (the same work declare_coloring does on every run) and stores it atomically
+    # so parallel sweep workers can share the directory; both cases then hand the file to the
+    # driver with use_fixed_coloring.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return(os.path.join(self.directory, key + ".pkl"))
+
+    def apply(self, prob, key, num_full_jacs=3):
+        # Must be called after setup; returns True when the coloring came from the cache
+        path = self.path(key)
+        if os.path.exists(path):
+            prob.driver.use_fixed_coloring(path)
+            return(True)
+
+        prob.final_setup()
+        coloring = compute_total_coloring(prob, num_full_jacs=num_full_jacs)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            coloring.save(tmp)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        prob.driver.use_fixed_coloring(path)
+        return(False)
@@ -0,0 +1,135 @@
+import argparse
+import sys
+import time
+from warm_start import extract_solution, apply_solution
+
+def peak_heating(prob, phase_path="traj.phase0"):
+    return(float(prob.get_val(phase_path + ".timeseries.q", units="Btu/ft**2/s").max()))
+
+# Upper bound on q that stands for no heating limit: OpenMDAO's infinite bound, which no
+# trajectory reaches
+NO_LIMIT = 1e30
+
+def build_step_problem(heating_limit=70., optimizer="SNOPT", **options):
+    # The q constrained problem that every step of the schedule solves; a step only moves the
+    # bound and the initial values (see solve_step), so the setup and the total coloring are paid
+    # once rather than once per step
+    from reentry_dymos import build_problem
+
+    prob, phase0 = build_problem(heating_limit=heating_limit, optimizer=optimizer, check=False, **options)
+    if optimizer == "SNOPT":
+        prob.driver.opt_settings["iSumm"] = 0
+    prob.final_setup()
+    return(prob, phase0)
+
+def set_heating_limit(prob, heating_limit):
+    # Moves the upper bound of the q path constraint of a set-up problem; None for no limit
+    from autoscaling import set_bound
+
+    name = [name for name in prob.driver._cons if name.endswith("path:q")][0]
+    set_bound(prob.driver, name, "upper", NO_LIMIT if heating_limit is None else heating_limit)
+
+def solve_step(prob, phase0, heating_limit, solution=None):
+    # One solve of the problem of build_step_problem at the given heating limit (None for
+    # unconstrained), warm started from solution when given and from the default linear guess
+    # otherwise
+    from reentry_dymos import driver_failed, set_initial_guess
+
+    set_heating_limit(prob, heating_limit)
+    if solution is None:
+        set_initial_guess(prob, phase0)
+    else:
+        apply_solution(prob, phase0, solution)
+
+    start = time.perf_counter()
+    failed = driver_failed(prob.run_driver())
+    step = {"heating_limit": heating_limit,
+            "failed": failed,
+            "function_evaluations": prob.driver.iter_count,
+            "wall_time": time.perf_counter() - start,
+            "final_theta": float(prob.get_val("traj.phase0.timeseries.states:theta")[-1]),
+            "peak_q": peak_heating(prob)}
+    return(step)
+
+def continuation(heating_limit=70., num_steps=4, min_step=.5, growth=1.5, optimizer="SNOPT", out_stream=sys.stdout, **options):
+    # Solves without the heating constraint, then lowers the limit from the unconstrained peak q
+    # to heating_limit, warm starting each step from the last converged one. A failed step is
+    # retried with half the step size, a converged one lets the next step grow by growth; the
+    # continuation gives up when the step falls below min_step (Btu/ft**2/s). All the steps
+    # solve one problem, which is left at the last converged solution.
+    history = []
+
+    def record(step):
+        history.append(step)
+        if out_stream is not None:
+            limit = step["heating_limit"]
+            out_stream.write("%10s %7s %6d %9.2f %12.8f %9.3f\n" % ("none" if limit is None else "%.3f" % limit, step["failed"], step["function_evaluations"],
+                                                                   step["wall_time"], step["final_theta"], step["peak_q"]))
+            out_stream.flush()
+
+    prob, phase0 = build_step_problem(heating_limit, optimizer, **options)
+    step = solve_step(prob, phase0, None)
+    record(step)
+    if step["failed"]:
+        return(prob, phase0, history)
+
+    solution, accepted = extract_solution(prob), None
+    limit = step["peak_q"]
+    if limit <= heating_limit:
+        # the unconstrained optimum already satisfies the limit; confirm it with the constraint on
+        record(solve_step(prob, phase0, heating_limit, solution))
+        return(prob, phase0, history)
+
+    delta = (limit - heating_limit)/float(num_steps)
+    while limit > heating_limit:
+        target = max(limit - delta, heating_limit)
+        step = solve_step(prob, phase0, target, solution)
+        record(step)
+
+        if step["failed"]:
+            delta /= 2
+            if delta < min_step:
+                break
+            continue
+
+        solution, accepted = extract_solution(prob), target
+        limit = target
+        delta *= growth
+
+    if step["failed"]:
+        # back to the last converged step
+        set_heating_limit(prob, accepted)
+        apply_solution(prob, phase0, solution)
+        prob.run_model()
+    return(prob, phase0, history)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the reentry problem by continuation on the heating rate limit.")
+    parser.add_argument("--heating-limit", type=float, default=70., help="target q path constraint upper bound (Btu/ft**2/s)")
+    parser.add_argument("--steps", type=int, default=4, help="initial number of steps from the unconstrained peak q")
+    parser.add_argument("--min-step", type=float, default=.5)
+    parser.add_argument("--segments", type=int, default=50)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--transcription", choices=["radau", "gauss-lobatto"], default="radau")
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--compare-cold", action="store_true", help="also run a single cold solve at the target limit")
+    args = parser.parse_args(argv)
+    options = {"num_segments": args.segments, "order": args.order, "transcription": args.transcription}
+
+    print("%10s %7s %6s %9s %12s %9s" % ("limit", "failed", "evals", "time (s)", "theta_f", "peak q"))
+    start = time.perf_counter()
+    prob, phase0, history = continuation(args.heating_limit, args.steps, args.min_step, optimizer=args.optimizer, **options)
+    reached = not history[-1]["failed"] and history[-1]["heating_limit"] == args.heating_limit
+    print("Continuation %s in %d solves, %d function evaluations, %.2f s of solves, %.2f s with the setup"
+          % ("converged" if reached else "did not reach the target", len(history), sum(step["function_evaluations"] for step in history),
+             sum(step["wall_time"] for step in history), time.perf_counter() - start))
+
+    if args.compare_cold:
+        start = time.perf_counter()
+        cold_prob, cold_phase0 = build_step_problem(args.heating_limit, args.optimizer, **options)
+        step = solve_step(cold_prob, cold_phase0, args.heating_limit)
+        print("Cold solve %s in %d function evaluations, %.2f s of solve, %.2f s with the setup"
+              % ("failed" if step["failed"] else "converged", step["function_evaluations"], step["wall_time"], time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from openmdao.recorders.case_recorder import CaseRecorder
+
+def count_totals(driver, callback):
+    # Calls callback() after every total derivative evaluation of the optimizer, which the SQP and
+    # interior point methods do once per major iteration. The optimizer asks for the totals at the
+    # point it evaluated last, so they are counted only at the driver's iter_count of that
+    # evaluation; the evaluations of the dynamic coloring come before the first one of the run,
+    # after run_driver has reset iter_count, and are left out
+    objfunc = driver._objfunc
+    compute_totals = driver._compute_totals
+    evaluated = [None]
+
+    def evaluate(*args, **kwargs):
+        result = objfunc(*args, **kwargs)
+        evaluated[0] = driver.iter_count
+        return(result)
+
+    def counted(*args, **kwargs):
+        totals = compute_totals(*args, **kwargs)
+        if driver.iter_count == evaluated[0]:
+            callback()
+        return(totals)
+
+    driver._objfunc = evaluate
+    driver._compute_totals = counted
+    return(driver)
+
+class DriverRecorder(CaseRecorder):
+
+    # Base of the recorders that only follow the driver (guidance.PlanTracker,
+    # checkpoint.Checkpointer): every hook but record_iteration_driver, which subclasses
+    # override, does nothing
+
+    def __init__(self):
+        super(DriverRecorder, self).__init__(record_viewer_data=False)
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        pass
+
+    def record_iteration_system(self, recording_requester, data, metadata):
+        pass
+
+    def record_iteration_solver(self, recording_requester, data, metadata):
+        pass
+
+    def record_iteration_problem(self, recording_requester, data, metadata):
+        pass
+
+    def record_metadata_system(self, *args, **kwargs):
+        pass
+
+    def record_metadata_solver(self, *args, **kwargs):
+        pass
+
+    def record_derivatives_driver(self, recording_requester, data, metadata):
+        pass
+
+    def record_viewer_data(self, *args, **kwargs):
+        pass
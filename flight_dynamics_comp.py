@@ -1,11 +1,16 @@
 import numpy as np 
-import matplotlib.pyplot as plt 
 from openmdao.api import ExplicitComponent, Problem
+from input_cache import InputCache
+from reentry_physics import PARAMETERS
+from physics_kernels import ENGINES, EOM_RESULTS, eom_kernel, KernelResults, use_kernels
+from node_chunks import NodeChunks
 
 class FlightDynamics(ExplicitComponent):
 
     def initialize(self):
         self.options.declare("num_nodes", types=int)
+        self.options.declare("engine", default="numpy", values=ENGINES, desc="numpy expressions or the fused numba kernel")
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
 
     def setup(self):
         nn = self.options["num_nodes"]
@@ -18,6 +23,7 @@ class FlightDynamics(ExplicitComponent):
         self.add_input("v", val=np.ones(nn), desc="velocity of shuttle", units="ft/s")
         self.add_input("lift", val=np.ones(nn), desc="lift on shuttle", units="lb")
         self.add_input("drag", val=np.ones(nn), desc="drag on shuttle", units="lb")
+        self.add_input("w", val=PARAMETERS["w"][0]*np.ones(nn), desc="weight of shuttle", units=PARAMETERS["w"][1])
 
         self.add_output("hdot", val=np.ones(nn), desc="rate of change of altitude", units="ft/s")
         self.add_output("gammadot", val=np.ones(nn), desc="rate of change of flight path angle", units="rad/s")
@@ -60,93 +66,236 @@ class FlightDynamics(ExplicitComponent):
         self.declare_partials("vdot", "gamma", rows=partial_range, cols=partial_range)
         self.declare_partials("vdot", "h", rows=partial_range, cols=partial_range)
 
+        self.declare_partials(["gammadot", "psidot", "vdot"], "w", rows=partial_range, cols=partial_range)
+
+        self._cache = InputCache(["beta", "gamma", "h", "psi", "theta"], ["s_beta", "c_beta", "s_gamma", "c_gamma", "s_psi", "c_psi", "c_theta", "s_theta", "r", "g"], nn)
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+        self._kernel = KernelResults(["beta", "gamma", "h", "psi", "theta", "v", "lift", "drag", "w"], EOM_RESULTS, nn, self._chunks) if use_kernels(self.options["engine"], self) else None
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        R_e = 20902900
+        mu = .14076539e17
+        r = buf["r"][s]
+        g = buf["g"][s]
+
+        np.sin(inputs["beta"][s], out=buf["s_beta"][s])
+        np.cos(inputs["beta"][s], out=buf["c_beta"][s])
+        np.sin(inputs["gamma"][s], out=buf["s_gamma"][s])
+        np.cos(inputs["gamma"][s], out=buf["c_gamma"][s])
+        np.sin(inputs["psi"][s], out=buf["s_psi"][s])
+        np.cos(inputs["psi"][s], out=buf["c_psi"][s])
+        np.cos(inputs["theta"][s], out=buf["c_theta"][s])
+        np.sin(inputs["theta"][s], out=buf["s_theta"][s])
+        np.add(R_e, inputs["h"][s], out=r)
+        np.square(r, out=g)
+        np.divide(mu, g, out=g)
+
     def compute(self, inputs, outputs):
-        v = inputs["v"]
-        gamma = inputs["gamma"]
-        theta = inputs["theta"]
-        lift = inputs["lift"]
-        drag = inputs["drag"]
-        h = inputs["h"]
-        beta = inputs["beta"]
-        psi = inputs["psi"]
+        if self._kernel is not None and not np.iscomplexobj(inputs["v"]):
+            out = self._kernel.evaluate(inputs, eom_kernel)
+            for name, row in self._kernel.rows.items():
+                if isinstance(name, str):
+                    outputs[name] = out[row]
+            return
+
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, inputs, buf, outputs)
+
+    def _compute(self, inputs, buf, outputs, s):
+        v = inputs["v"][s]
+        lift = inputs["lift"][s]
+        drag = inputs["drag"][s]
         g_0 = 32.174
-        w = 203000
-        R_e = 20902900
+        w = inputs["w"][s]
         mu = .14076539e17
-        s_beta = np.sin(beta) 
-        c_beta = np.cos(beta)
-        s_gamma = np.sin(gamma) 
-        c_gamma = np.cos(gamma)
-        s_psi = np.sin(psi) 
-        c_psi = np.cos(psi) 
-        c_theta = np.cos(theta)
-        s_theta = np.sin(theta) 
-        r = R_e + h 
+        s_beta = buf["s_beta"][s]
+        c_beta = buf["c_beta"][s]
+        s_gamma = buf["s_gamma"][s]
+        c_gamma = buf["c_gamma"][s]
+        s_psi = buf["s_psi"][s]
+        c_psi = buf["c_psi"][s]
+        c_theta = buf["c_theta"][s]
+        s_theta = buf["s_theta"][s]
+        r = buf["r"][s]
         m = w/g_0
-        g = mu/r**2
+        g = buf["g"][s]
 
-        outputs["hdot"] = v*s_gamma
-        outputs["gammadot"] = lift/(m*v)*c_beta + c_gamma*(v/r - g/v)
-        outputs["phidot"] = v/r*c_gamma*s_psi/c_theta
-        outputs["psidot"] = lift*s_beta/(m*v*c_gamma) + v*c_gamma*s_psi*s_theta/(r*c_theta)
-        outputs["thetadot"] = c_gamma*c_psi*v/r
-        outputs["vdot"] = -drag/m - g*s_gamma
+        outputs["hdot"][s] = v*s_gamma
+        outputs["gammadot"][s] = lift/(m*v)*c_beta + c_gamma*(v/r - g/v)
+        outputs["phidot"][s] = v/r*c_gamma*s_psi/c_theta
+        outputs["psidot"][s] = lift*s_beta/(m*v*c_gamma) + v*c_gamma*s_psi*s_theta/(r*c_theta)
+        outputs["thetadot"][s] = c_gamma*c_psi*v/r
+        outputs["vdot"][s] = -drag/m - g*s_gamma
 
     def compute_partials(self, inputs, J):
-        v = inputs["v"]
-        gamma = inputs["gamma"]
-        theta = inputs["theta"]
-        lift = inputs["lift"]
-        h = inputs["h"]
-        beta = inputs["beta"]
-        psi = inputs["psi"]
+        if self._kernel is not None:
+            out = self._kernel.evaluate(inputs, eom_kernel)
+            for key, row in self._kernel.rows.items():
+                if isinstance(key, tuple):
+                    J[key] = out[row]
+            return
+
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, inputs, buf, J)
+
+    def _compute_partials(self, inputs, buf, J, s):
+        v = inputs["v"][s]
+        lift = inputs["lift"][s]
         g_0 = 32.174
-        w = 203000
-        R_e = 20902900
+        w = inputs["w"][s]
         mu = .14076539e17
-        s_beta = np.sin(beta) 
-        c_beta = np.cos(beta)
-        s_gamma = np.sin(gamma) 
-        c_gamma = np.cos(gamma)
-        s_psi = np.sin(psi) 
-        c_psi = np.cos(psi) 
-        c_theta = np.cos(theta)
-        s_theta = np.sin(theta) 
-        r = R_e + h 
+        s_beta = buf["s_beta"][s]
+        c_beta = buf["c_beta"][s]
+        s_gamma = buf["s_gamma"][s]
+        c_gamma = buf["c_gamma"][s]
+        s_psi = buf["s_psi"][s]
+        c_psi = buf["c_psi"][s]
+        c_theta = buf["c_theta"][s]
+        s_theta = buf["s_theta"][s]
+        r = buf["r"][s]
         m = w/g_0
-        g = mu/r**2
+        g = buf["g"][s]
 
-        J["hdot", "v"] = s_gamma
-        J["hdot", "gamma"] = v*c_gamma
+        J["hdot", "v"][s] = s_gamma
+        J["hdot", "gamma"][s] = v*c_gamma
 
-        J["gammadot", "lift"] = c_beta/(m*v)
-        J["gammadot", "h"] = c_gamma*(-v/r**2 + 2*mu/(r**3*v))
-        J["gammadot", "beta"] = -lift/(m*v)*s_beta
-        J["gammadot", "gamma"] = -s_gamma*(v/r - g/v) 
-        J["gammadot", "v"] = -lift/(m*v**2)*c_beta + c_gamma*(1/r + g/v**2)
+        J["gammadot", "lift"][s] = c_beta/(m*v)
+        J["gammadot", "h"][s] = c_gamma*(-v/r**2 + 2*mu/(r**3*v))
+        J["gammadot", "beta"][s] = -lift/(m*v)*s_beta
+        J["gammadot", "gamma"][s] = -s_gamma*(v/r - g/v) 
+        J["gammadot", "v"][s] = -lift/(m*v**2)*c_beta + c_gamma*(1/r + g/v**2)
         
-        J["phidot", "v"] = c_gamma*s_psi/(c_theta*r)
-        J["phidot", "h"] = -v/r**2*c_gamma*s_psi/c_theta
-        J["phidot", "gamma"] = -v/r*s_gamma*s_psi/c_theta
-        J["phidot", "psi"] = v/r*c_gamma*c_psi/c_theta
-        J["phidot", "theta"] = v/r*c_gamma*s_psi/(c_theta**2)*s_theta
+        J["phidot", "v"][s] = c_gamma*s_psi/(c_theta*r)
+        J["phidot", "h"][s] = -v/r**2*c_gamma*s_psi/c_theta
+        J["phidot", "gamma"][s] = -v/r*s_gamma*s_psi/c_theta
+        J["phidot", "psi"][s] = v/r*c_gamma*c_psi/c_theta
+        J["phidot", "theta"][s] = v/r*c_gamma*s_psi/(c_theta**2)*s_theta
         
-        J["psidot", "v"] = -lift*s_beta/(m*c_gamma*v**2) + c_gamma*s_psi*s_theta/(r*c_theta)
-        J["psidot", "gamma"] = lift*s_beta/(m*v*c_gamma**2)*s_gamma - v*s_gamma*s_psi*s_theta/(r*c_theta)
-        J["psidot", "h"] = -v*c_gamma*s_psi*s_theta/(c_theta*r**2)
-        J["psidot", "beta"] = lift*c_beta/(m*v*c_gamma)
-        J["psidot", "theta"] = v*c_gamma*s_psi/(r*c_theta**2)
-        J["psidot", "psi"] = v*c_gamma*c_psi*s_theta/(r*c_theta)
-        J["psidot", "lift"] = s_beta/(m*v*c_gamma)
+        J["psidot", "v"][s] = -lift*s_beta/(m*c_gamma*v**2) + c_gamma*s_psi*s_theta/(r*c_theta)
+        J["psidot", "gamma"][s] = lift*s_beta/(m*v*c_gamma**2)*s_gamma - v*s_gamma*s_psi*s_theta/(r*c_theta)
+        J["psidot", "h"][s] = -v*c_gamma*s_psi*s_theta/(c_theta*r**2)
+        J["psidot", "beta"][s] = lift*c_beta/(m*v*c_gamma)
+        J["psidot", "theta"][s] = v*c_gamma*s_psi/(r*c_theta**2)
+        J["psidot", "psi"][s] = v*c_gamma*c_psi*s_theta/(r*c_theta)
+        J["psidot", "lift"][s] = s_beta/(m*v*c_gamma)
         
-        J["thetadot", "v"] = c_gamma*c_psi/r
-        J["thetadot", "h"] = -v/r**2*c_gamma*c_psi
-        J["thetadot", "gamma"] = -v/r*s_gamma*c_psi
-        J["thetadot", "psi"] = -v/r*c_gamma*s_psi
-
-        J["vdot", "h"] = 2*s_gamma*mu/r**3
-        J["vdot", "drag"] = -1/m
-        J["vdot", "gamma"] = -g*c_gamma
+        J["thetadot", "v"][s] = c_gamma*c_psi/r
+        J["thetadot", "h"][s] = -v/r**2*c_gamma*c_psi
+        J["thetadot", "gamma"][s] = -v/r*s_gamma*c_psi
+        J["thetadot", "psi"][s] = -v/r*c_gamma*s_psi
+
+        J["vdot", "h"][s] = 2*s_gamma*mu/r**3
+        J["vdot", "drag"][s] = -1/m
+        J["vdot", "gamma"][s] = -g*c_gamma
+
+        J["gammadot", "w"][s] = -lift/(m*v)*c_beta/w
+        J["psidot", "w"][s] = -lift*s_beta/(m*v*c_gamma)/w
+        J["vdot", "w"][s] = inputs["drag"][s]/m/w
+
+    def compute_second_partials(self, inputs, H):
+        # H[of, wrt_1, wrt_2] per node for the nonzero second partials with respect to the states,
+        # controls, lift and drag, with wrt_1 declared before wrt_2 (see hessian.py); drag enters
+        # linearly and w is a parameter
+        buf = self._intermediates(inputs)
+
+        v = inputs["v"]
+        lift = inputs["lift"]
+        g_0 = 32.174
+        m = inputs["w"]/g_0
+        mu = .14076539e17
+        s_beta = buf["s_beta"]
+        c_beta = buf["c_beta"]
+        s_gamma = buf["s_gamma"]
+        c_gamma = buf["c_gamma"]
+        s_psi = buf["s_psi"]
+        c_psi = buf["c_psi"]
+        c_theta = buf["c_theta"]
+        s_theta = buf["s_theta"]
+        t_theta = s_theta/c_theta
+        r = buf["r"]
+        g = buf["g"]
+
+        H["hdot", "gamma", "gamma"] = -v*s_gamma
+        H["hdot", "gamma", "v"] = c_gamma
+
+        H["gammadot", "beta", "beta"] = -lift*c_beta/(m*v)
+        H["gammadot", "beta", "v"] = lift*s_beta/(m*v**2)
+        H["gammadot", "beta", "lift"] = -s_beta/(m*v)
+        H["gammadot", "gamma", "gamma"] = -c_gamma*(v/r - g/v)
+        H["gammadot", "gamma", "h"] = -s_gamma*(-v/r**2 + 2*mu/(r**3*v))
+        H["gammadot", "gamma", "v"] = -s_gamma*(1/r + g/v**2)
+        H["gammadot", "h", "h"] = c_gamma*(2*v/r**3 - 6*mu/(r**4*v))
+        H["gammadot", "h", "v"] = c_gamma*(-1/r**2 - 2*mu/(r**3*v**2))
+        H["gammadot", "v", "v"] = 2*lift*c_beta/(m*v**3) - 2*c_gamma*g/v**3
+        H["gammadot", "v", "lift"] = -c_beta/(m*v**2)
+
+        # phidot = v/r*c_gamma*s_psi/c_theta
+        phidot = v/r*c_gamma*s_psi/c_theta
+        H["phidot", "gamma", "gamma"] = -phidot
+        H["phidot", "gamma", "h"] = v*s_gamma*s_psi/(r**2*c_theta)
+        H["phidot", "gamma", "psi"] = -v*s_gamma*c_psi/(r*c_theta)
+        H["phidot", "gamma", "theta"] = -v*s_gamma*s_psi*t_theta/(r*c_theta)
+        H["phidot", "gamma", "v"] = -s_gamma*s_psi/(r*c_theta)
+        H["phidot", "h", "h"] = 2*phidot/r**2
+        H["phidot", "h", "psi"] = -v*c_gamma*c_psi/(r**2*c_theta)
+        H["phidot", "h", "theta"] = -v*c_gamma*s_psi*t_theta/(r**2*c_theta)
+        H["phidot", "h", "v"] = -c_gamma*s_psi/(r**2*c_theta)
+        H["phidot", "psi", "psi"] = -phidot
+        H["phidot", "psi", "theta"] = v*c_gamma*c_psi*t_theta/(r*c_theta)
+        H["phidot", "psi", "v"] = c_gamma*c_psi/(r*c_theta)
+        H["phidot", "theta", "theta"] = phidot*(1 + s_theta**2)/c_theta**2
+        H["phidot", "theta", "v"] = c_gamma*s_psi*t_theta/(r*c_theta)
+
+        # psidot = lift*s_beta/(m*v*c_gamma) + v/r*c_gamma*s_psi*t_theta
+        turn = lift*s_beta/(m*v*c_gamma)
+        rotation = v/r*c_gamma*s_psi*t_theta
+        H["psidot", "beta", "beta"] = -turn
+        H["psidot", "beta", "gamma"] = lift*c_beta*s_gamma/(m*v*c_gamma**2)
+        H["psidot", "beta", "v"] = -lift*c_beta/(m*v**2*c_gamma)
+        H["psidot", "beta", "lift"] = c_beta/(m*v*c_gamma)
+        H["psidot", "gamma", "gamma"] = turn*(1 + s_gamma**2)/c_gamma**2 - rotation
+        H["psidot", "gamma", "h"] = v*s_gamma*s_psi*t_theta/r**2
+        H["psidot", "gamma", "psi"] = -v*s_gamma*c_psi*t_theta/r
+        H["psidot", "gamma", "theta"] = -v*s_gamma*s_psi/(r*c_theta**2)
+        H["psidot", "gamma", "v"] = -lift*s_beta*s_gamma/(m*v**2*c_gamma**2) - s_gamma*s_psi*t_theta/r
+        H["psidot", "gamma", "lift"] = s_beta*s_gamma/(m*v*c_gamma**2)
+        H["psidot", "h", "h"] = 2*rotation/r**2
+        H["psidot", "h", "psi"] = -v*c_gamma*c_psi*t_theta/r**2
+        H["psidot", "h", "theta"] = -v*c_gamma*s_psi/(r**2*c_theta**2)
+        H["psidot", "h", "v"] = -c_gamma*s_psi*t_theta/r**2
+        H["psidot", "psi", "psi"] = -rotation
+        H["psidot", "psi", "theta"] = v*c_gamma*c_psi/(r*c_theta**2)
+        H["psidot", "psi", "v"] = c_gamma*c_psi*t_theta/r
+        H["psidot", "theta", "theta"] = 2*v/r*c_gamma*s_psi*s_theta/c_theta**3
+        H["psidot", "theta", "v"] = c_gamma*s_psi/(r*c_theta**2)
+        H["psidot", "v", "v"] = 2*turn/v**2
+        H["psidot", "v", "lift"] = -s_beta/(m*v**2*c_gamma)
+
+        # thetadot = v/r*c_gamma*c_psi
+        thetadot = v/r*c_gamma*c_psi
+        H["thetadot", "gamma", "gamma"] = -thetadot
+        H["thetadot", "gamma", "h"] = v*s_gamma*c_psi/r**2
+        H["thetadot", "gamma", "psi"] = v*s_gamma*s_psi/r
+        H["thetadot", "gamma", "v"] = -s_gamma*c_psi/r
+        H["thetadot", "h", "h"] = 2*thetadot/r**2
+        H["thetadot", "h", "psi"] = v*c_gamma*s_psi/r**2
+        H["thetadot", "h", "v"] = -c_gamma*c_psi/r**2
+        H["thetadot", "psi", "psi"] = -thetadot
+        H["thetadot", "psi", "v"] = -c_gamma*s_psi/r
+
+        H["vdot", "gamma", "gamma"] = g*s_gamma
+        H["vdot", "gamma", "h"] = 2*mu*c_gamma/r**3
+        H["vdot", "h", "h"] = -6*mu*s_gamma/r**4
 
 
 def test_reentry_ode():
@@ -0,0 +1,191 @@
+import argparse
+import csv
+import functools
+import os
+import time
+import traceback
+import numpy as np
+from sweep import run_tasks
+
+COLUMNS = ["direction", "arc", "status", "phi_f", "theta_f", "final_time", "function_evaluations", "wall_time", "warm_start", "error"]
+
+# Boundary conditions of reentry_dymos.set_initial_guess, which the footprint keeps fixed
+BOUNDARY = {"h": (260000., 80000.), "gamma": (-1*np.pi/180, -5*np.pi/180), "v": (25600., 2500.)}
+
+def boundary_directions(num_points, start=90.):
+    # Objective directions (deg) in the (phi, theta) plane evenly spaced around the circle,
+    # starting from the crossrange direction of the nominal problem
+    return((start + 360.*np.arange(num_points)/num_points) % 360.)
+
+def split_arcs(directions, num_arcs):
+    # Contiguous runs of directions, each marched by one pool task from its first direction
+    return([[float(direction) for direction in arc] for arc in np.array_split(np.asarray(directions), num_arcs) if len(arc)])
+
+class DirectionalProblem(object):
+
+    # One set-up reentry problem with the footprint objective of reentry_dymos.build_problem;
+    # each direction only changes the inputs of the footprint component, so the setup and the
+    # total coloring are paid once per arc rather than once per point
+
+    def __init__(self, heating_limit=70., optimizer="SNOPT", **options):
+        from reentry_dymos import build_problem
+
+        self.prob, self.phase0 = build_problem(heating_limit=heating_limit, optimizer=optimizer, check=False, direction=0., **options)
+        if optimizer == "SNOPT":
+            self.prob.driver.opt_settings["iSumm"] = 0
+
+    def solve(self, direction, solution=None):
+        # Maximizes the final position along direction (deg) from solution, or from the default
+        # guess when None; returns the row and the solution, None unless converged
+        from reentry_dymos import driver_failed, set_initial_guess
+        from warm_start import apply_solution, extract_solution
+
+        prob = self.prob
+        prob.set_val("footprint.cos_a", np.cos(direction*np.pi/180))
+        prob.set_val("footprint.sin_a", np.sin(direction*np.pi/180))
+        if solution is None:
+            set_initial_guess(prob, self.phase0)
+        else:
+            apply_solution(prob, self.phase0, solution, boundary=BOUNDARY)
+
+        failed = driver_failed(prob.run_driver())
+        row = {"status": "failed" if failed else "converged",
+               "phi_f": float(prob.get_val("traj.phase0.timeseries.states:phi", units="deg")[-1]),
+               "theta_f": float(prob.get_val("traj.phase0.timeseries.states:theta", units="deg")[-1]),
+               "final_time": float(prob.get_val("traj.phase0.timeseries.time")[-1]),
+               "function_evaluations": prob.driver.iter_count}
+        return(row, None if failed else extract_solution(prob))
+
+def march_arc(problem, directions, arc=0, seed=None):
+    # Solves the directions in order, warm starting each one from the last converged neighbor (the
+    # seed, or the default guess, for the first); a failed point is reported and skipped over.
+    # warm_start holds the direction of the neighbor, "seed" or "" for the default guess.
+    rows = []
+    solutions = {}
+    guess, source = seed, "" if seed is None else "seed"
+    for direction in directions:
+        row = {"direction": direction, "arc": arc, "warm_start": source, "error": ""}
+        start = time.perf_counter()
+        try:
+            stats, solution = problem.solve(direction, guess)
+            row.update(stats)
+        except Exception:
+            solution = None
+            row.update(status="error", phi_f=np.nan, theta_f=np.nan, final_time=np.nan, function_evaluations=0,
+                       error=traceback.format_exc().strip().splitlines()[-1])
+        row["wall_time"] = time.perf_counter() - start
+        rows.append(row)
+        if solution is not None:
+            solutions[direction] = solution
+            guess, source = solution, direction
+    return(rows, solutions)
+
+def run_arc(directions, arc=0, seed=None, problem_class=DirectionalProblem, **options):
+    # Pool task: builds the problem of one arc in the worker and marches it
+    start = time.perf_counter()
+    problem = problem_class(**options)
+    rows, solutions = march_arc(problem, directions, arc, seed)
+    if rows:
+        # the build is part of what a point costs, so it is charged to the first point of the arc
+        rows[0]["wall_time"] += time.perf_counter() - start - sum(row["wall_time"] for row in rows)
+    return(rows, solutions)
+
+def generate_footprint(num_points=24, num_arcs=None, max_workers=None, seed=None, cold=False, problem_class=DirectionalProblem, **options):
+    # Traces the landing footprint under the heating limit with num_points rotated objectives,
+    # marching num_arcs arcs in parallel (one per worker by default). cold solves every point
+    # independently from the default guess instead, for comparison. Returns the rows sorted by
+    # direction and the converged solutions by direction.
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    directions = boundary_directions(num_points)
+    if cold:
+        arcs = [[float(direction)] for direction in directions]
+        seed = None
+    else:
+        arcs = split_arcs(directions, min(num_arcs or max_workers, num_points))
+
+    rows = []
+    solutions = {}
+    tasks = [(arc_directions, arc, seed) for arc, arc_directions in enumerate(arcs)]
+    for arc, result, err in run_tasks(functools.partial(run_arc, problem_class=problem_class, **options), tasks, min(max_workers, len(arcs))):
+        if err is None:
+            arc_rows, arc_solutions = result
+        else:
+            # the worker process itself died; the whole arc is lost, but not the other arcs
+            arc_rows = [{"direction": direction, "arc": arc, "status": "error", "phi_f": np.nan, "theta_f": np.nan, "final_time": np.nan,
+                         "function_evaluations": 0, "wall_time": np.nan, "warm_start": "", "error": repr(err)} for direction in arcs[arc]]
+            arc_solutions = {}
+        rows.extend(arc_rows)
+        solutions.update(arc_solutions)
+
+    rows.sort(key=lambda row: row["direction"])
+    return(rows, solutions)
+
+def footprint_polygon(rows):
+    # (phi_f, theta_f) vertices in degrees of the converged points, in order of direction; each
+    # is the support point of the footprint along its direction, so the order follows its boundary
+    points = [(row["phi_f"], row["theta_f"]) for row in sorted(rows, key=lambda row: row["direction"]) if row["status"] == "converged"]
+    return(np.array(points, dtype=float).reshape(-1, 2))
+
+def polygon_area(points):
+    # Shoelace area of the closed polygon (deg**2)
+    x, y = points[:, 0], points[:, 1]
+    return(.5*abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+
+def write_footprint(rows, filename):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+def format_summary(rows):
+    converged = [row for row in rows if row["status"] == "converged"]
+    lines = ["%d of %d points converged in %d function evaluations, %.2f s of solves" % (len(converged), len(rows), sum(row["function_evaluations"] for row in rows),
+                                                                              np.nansum([row["wall_time"] for row in rows]))]
+    for label, group in (("cold", [row for row in converged if row["warm_start"] == ""]),
+                         ("seeded", [row for row in converged if row["warm_start"] == "seed"]),
+                         ("warm", [row for row in converged if row["warm_start"] not in ("", "seed")])):
+        if group:
+            lines.append("%-6s %3d points, %6.1f evaluations, %7.2f s per point" % (label, len(group), np.mean([row["function_evaluations"] for row in group]),
+                                                                               np.mean([row["wall_time"] for row in group])))
+    polygon = footprint_polygon(rows)
+    if len(polygon) >= 3:
+        lines.append("footprint area %.1f deg**2, phi_f %.2f to %.2f deg, theta_f %.2f to %.2f deg" % (polygon_area(polygon), polygon[:, 0].min(), polygon[:, 0].max(),
+                                                                                                     polygon[:, 1].min(), polygon[:, 1].max()))
+    return("\n".join(lines))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trace the reachable landing footprint under the heating limit with rotated objectives.")
+    parser.add_argument("--points", type=int, default=24, help="objective directions around the footprint")
+    parser.add_argument("--arcs", type=int, default=None, help="arcs marched in parallel (default: one per worker)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cold", action="store_true", help="solve every point independently from the default guess instead")
+    parser.add_argument("--heating-limit", type=float, default=70.)
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--transcription", choices=["radau", "gauss-lobatto"], default="radau")
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--coloring-dir", default=None, help="total coloring cache shared by the workers")
+    parser.add_argument("--warm-start-dir", default=None, help="solution store whose nearest solution seeds the first point of each arc")
+    parser.add_argument("--out", default="footprint.csv")
+    args = parser.parse_args(argv)
+
+    seed = None
+    if args.warm_start_dir and not args.cold:
+        from sweep import DEFAULTS, solution_config
+        from warm_start import SolutionStore
+
+        case = dict(DEFAULTS, heating_limit=args.heating_limit, num_segments=args.segments, order=args.order, transcription=args.transcription)
+        stored = SolutionStore(args.warm_start_dir).nearest(solution_config(case))
+        seed = stored[1] if stored is not None else None
+
+    rows, solutions = generate_footprint(args.points, args.arcs, args.workers, seed, args.cold, heating_limit=args.heating_limit,
+                                         num_segments=args.segments, order=args.order, transcription=args.transcription,
+                                         optimizer=args.optimizer, coloring_dir=args.coloring_dir)
+    write_footprint(rows, args.out)
+    print(format_summary(rows))
+    print("Footprint points in %s" % args.out)
+
+if __name__ == "__main__":
+    main()
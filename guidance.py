@@ -0,0 +1,246 @@
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from driver_recorder import DriverRecorder
+from warm_start import STATES, CONTROLS, extract_solution, apply_solution, blend_boundary
+from continuation import peak_heating
+
+# (shortest remaining horizon in s, num_segments): the mesh shrinks as the entry proceeds
+MESH_SCHEDULE = [(1000., 20), (400., 10), (0., 5)]
+
+# Fixed final states of the phase, as in set_initial_guess
+TERMINAL = {"h": 80000., "gamma": -5*np.pi/180, "v": 2500.}
+
+# Measurement noise of the replay benchmark (1 sigma)
+STATE_NOISE = {"h": 500., "gamma": .05*np.pi/180, "phi": 1e-4, "psi": .05*np.pi/180, "theta": 1e-4, "v": 10.}
+
+def select_mesh(schedule, horizon):
+    for min_horizon, num_segments in sorted(schedule, reverse=True):
+        if horizon >= min_horizon:
+            return(num_segments)
+    return(min(num_segments for min_horizon, num_segments in schedule))
+
+def truncate_plan(solution, t):
+    # The part of a plan after time t, starting with its values interpolated at t
+    time_s = solution["time"]
+    keep = time_s > t
+    truncated = {"time": np.concatenate([[t], time_s[keep]])}
+    for name in list(STATES) + list(CONTROLS):
+        truncated[name] = np.concatenate([[np.interp(t, time_s, solution[name])], solution[name][keep]])
+    return(truncated)
+
+def linear_plan(state, t, duration, terminal=None):
+    # Straight-line guess from the current state to the terminal conditions, with the controls of
+    # set_initial_guess; states without a terminal condition are held
+    if terminal is None:
+        terminal = TERMINAL
+    plan = {"time": np.array([t, t + duration]),
+            "alpha": np.array([17.4, 17.4])*np.pi/180,
+            "beta": np.array([-75., 0.])*np.pi/180}
+    for name in STATES:
+        plan[name] = np.array([state[name], terminal.get(name, state[name])], dtype=float)
+    return(plan)
+
+def equality_violation(driver):
+    # Largest scaled equality constraint (collocation defects and continuity); every equality
+    # constraint of the phase has equals=0
+    values = driver.get_constraint_values(driver_scaling=True)
+    violation = 0.
+    for name, meta in driver._cons.items():
+        if meta["equals"] is not None and name in values:
+            violation = max(violation, float(np.abs(values[name]).max()))
+    return(violation)
+
+def latency_percentiles(latencies, percentiles=(50, 90, 99)):
+    latencies = np.asarray(latencies, dtype=float)
+    stats = dict(("p%d" % p, float(np.percentile(latencies, p))) for p in percentiles)
+    stats["mean"] = float(latencies.mean())
+    stats["max"] = float(latencies.max())
+    return(stats)
+
+class PlanTracker(DriverRecorder):
+
+    # Driver recorder that keeps the best feasible iterate of a solve as a plan (the
+    # extract_solution dict of the lowest objective among the iterates that pass feasible(driver))
+    # and stops the optimizer once the deadline passes. Stopping sets the flag that the driver's
+    # own user_terminate_signal handler sets, so pyOptSparseDriver returns fail=2 from the next
+    # function evaluation and the optimizer ends the run; other drivers run to their iteration limit.
+
+    def __init__(self, feasible, extract):
+        super(PlanTracker, self).__init__()
+        self.feasible = feasible
+        self.extract = extract
+        self.reset()
+
+    def reset(self, deadline=np.inf):
+        self.deadline = deadline
+        self.best = None
+        self.best_objective = np.inf
+        self.num_evaluations = 0
+        self.timed_out = False
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        driver = recording_requester
+        self.num_evaluations += 1
+        if self.feasible(driver):
+            objective = float(np.sum(list(driver.get_objective_values().values())))
+            if objective < self.best_objective:
+                self.best_objective = objective
+                self.best = self.extract()
+
+        if time.perf_counter() > self.deadline:
+            self.timed_out = True
+            driver._user_termination_flag = True
+
+class Guidance(object):
+
+    # Receding-horizon re-planning of the rest of the entry. One problem per mesh of the schedule
+    # is set up (and its total coloring computed) at construction; plan() then only sets values:
+    # t_initial and the initial states come from the measured state, the rest of the guess from the
+    # previous plan shifted to the current time. Each solve runs under a wall-clock budget and
+    # returns the optimum, the best feasible iterate when the budget ran out, or else the previous
+    # plan blended onto the current state.
+    #
+    #     guidance = Guidance(heating_limit=70., budget=2., plan=solution)
+    #     step = guidance.plan(state, t)
+
+    def __init__(self, heating_limit=70., budget=1., plan=None, mesh_schedule=None, order=3, transcription="radau", optimizer="SNOPT",
+                 terminal=None, feasibility_tol=1e-6, ode_options=None, coloring_dir=None):
+        from reentry_dymos import build_problem
+
+        self.heating_limit = heating_limit
+        self.budget = budget
+        self.solution = plan
+        self.mesh_schedule = mesh_schedule if mesh_schedule is not None else MESH_SCHEDULE
+        self.terminal = terminal if terminal is not None else TERMINAL
+        self.feasibility_tol = feasibility_tol
+
+        self._coloring_tmp = None
+        if coloring_dir is None:
+            coloring_dir = self._coloring_tmp = tempfile.mkdtemp(prefix="guidance_coloring_")
+
+        self.problems = {}
+        for min_horizon, num_segments in self.mesh_schedule:
+            prob, phase0 = build_problem(heating_limit=heating_limit, transcription=transcription, num_segments=num_segments, order=order,
+                                         optimizer=optimizer, ode_options=ode_options, check=False, coloring_dir=coloring_dir)
+            if optimizer == "SNOPT":
+                prob.driver.opt_settings["iSumm"] = 0
+            tracker = PlanTracker(self._feasible_check(prob), lambda prob=prob: extract_solution(prob))
+            prob.driver.add_recorder(tracker)
+            self.problems[num_segments] = (prob, phase0, tracker)
+
+    def _feasible_check(self, prob):
+        def feasible(driver):
+            return(equality_violation(driver) <= self.feasibility_tol and peak_heating(prob) <= self.heating_limit*(1 + self.feasibility_tol))
+        return(feasible)
+
+    def close(self):
+        if self._coloring_tmp is not None:
+            shutil.rmtree(self._coloring_tmp, ignore_errors=True)
+            self._coloring_tmp = None
+
+    def plan(self, state, t, budget=None, duration=None):
+        # state maps the names of STATES to the measured values (ft, rad, ft/s) at time t (s);
+        # duration is only used to guess the remaining time when there is no previous plan
+        from reentry_dymos import driver_failed
+
+        start = time.perf_counter()
+        budget = self.budget if budget is None else budget
+
+        if self.solution is not None and self.solution["time"][-1] > t:
+            guess = truncate_plan(self.solution, t)
+        else:
+            guess = linear_plan(state, t, duration if duration is not None else 1000., self.terminal)
+        boundary = dict((name, (state[name], self.terminal.get(name, guess[name][-1]))) for name in STATES)
+        guess = blend_boundary(guess, boundary)
+
+        horizon = guess["time"][-1] - t
+        num_segments = select_mesh(self.mesh_schedule, horizon)
+        prob, phase0, tracker = self.problems[num_segments]
+        apply_solution(prob, phase0, guess)
+
+        tracker.reset(deadline=start + budget)
+        prob.driver._user_termination_flag = False
+        failed = driver_failed(prob.run_driver())
+
+        if not failed and not tracker.timed_out and tracker.feasible(prob.driver):
+            source = "optimal"
+            solution = extract_solution(prob)
+        elif tracker.best is not None:
+            source = "best-feasible"
+            solution = tracker.best
+        else:
+            source = "previous"
+            solution = guess
+
+        if source != "previous":
+            self.solution = solution
+
+        return({"solution": solution,
+                "source": source,
+                "feasible": source != "previous",
+                "timed_out": tracker.timed_out,
+                "t": t,
+                "horizon": horizon,
+                "num_segments": num_segments,
+                "function_evaluations": tracker.num_evaluations,
+                "final_theta": float(solution["theta"][-1]),
+                "latency": time.perf_counter() - start})
+
+def replay(guidance, reference, interval=100., min_horizon=200., budget=None, noise=None, seed=0, out_stream=sys.stdout):
+    # Re-plans at every interval along a reference trajectory from its (optionally noisy) states,
+    # as an onboard guidance loop would; returns the steps and the latency percentiles (s)
+    rng = np.random.default_rng(seed)
+    time_s = reference["time"]
+    steps = []
+    for t in np.arange(time_s[0] + interval, time_s[-1] - min_horizon, interval):
+        state = dict((name, float(np.interp(t, time_s, reference[name]))) for name in STATES)
+        if noise is not None:
+            for name, sigma in noise.items():
+                state[name] += sigma*rng.standard_normal()
+
+        step = guidance.plan(state, t, budget)
+        steps.append(step)
+        if out_stream is not None:
+            out_stream.write("%8.1f %8.1f %5d %-14s %5s %6d %10.1f %12.8f\n" % (t, step["horizon"], step["num_segments"], step["source"], step["timed_out"],
+                                                                                 step["function_evaluations"], step["latency"]*1e3, step["final_theta"]))
+            out_stream.flush()
+
+    return(steps, latency_percentiles([step["latency"] for step in steps]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay receding-horizon guidance along a solved trajectory and report the re-planning latency.")
+    parser.add_argument("solution", help="npz file with the timeseries of a converged solution (see warm_start.extract_solution)")
+    parser.add_argument("--budget", type=float, default=2., help="wall-clock budget of each re-plan (s)")
+    parser.add_argument("--interval", type=float, default=100., help="time between re-plans along the trajectory (s)")
+    parser.add_argument("--min-horizon", type=float, default=200., help="stop re-planning when less than this remains (s)")
+    parser.add_argument("--heating-limit", type=float, default=70.)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--transcription", choices=["radau", "gauss-lobatto"], default="radau")
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--noise", action="store_true", help="perturb the replayed states with STATE_NOISE")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--coloring-dir", default=None)
+    args = parser.parse_args(argv)
+
+    with np.load(args.solution) as data:
+        solution = dict((name, data[name]) for name in data.files)
+
+    guidance = Guidance(heating_limit=args.heating_limit, budget=args.budget, plan=solution, order=args.order,
+                        transcription=args.transcription, optimizer=args.optimizer, coloring_dir=args.coloring_dir)
+    try:
+        print("%8s %8s %5s %-14s %5s %6s %10s %12s" % ("t (s)", "horizon", "segs", "source", "late", "evals", "latency ms", "theta_f"))
+        steps, stats = replay(guidance, solution, args.interval, args.min_horizon, noise=STATE_NOISE if args.noise else None, seed=args.seed)
+    finally:
+        guidance.close()
+
+    print("Latency over %d re-plans: p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms (budget %.1f ms)"
+          % (len(steps), stats["p50"]*1e3, stats["p90"]*1e3, stats["p99"]*1e3, stats["max"]*1e3, args.budget*1e3))
+    print("%d optimal, %d best feasible, %d fell back to the previous plan" % tuple(sum(step["source"] == source for step in steps)
+                                                                                for source in ("optimal", "best-feasible", "previous")))
+
+if __name__ == "__main__":
+    main()
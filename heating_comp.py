@@ -1,11 +1,16 @@
 import numpy as np 
-import matplotlib.pyplot as plt 
 from openmdao.api import ExplicitComponent, Problem
+from input_cache import InputCache
+from reentry_physics import PARAMETERS
+from physics_kernels import ENGINES, HEATING_RESULTS, heating_kernel, KernelResults, use_kernels
+from node_chunks import NodeChunks
 
 class AerodynamicHeating(ExplicitComponent):
 
     def initialize(self):
         self.options.declare("num_nodes", types=int)
+        self.options.declare("engine", default="numpy", values=ENGINES, desc="numpy expressions or the fused numba kernel")
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
 
     def setup(self):
 
@@ -14,6 +19,10 @@ class AerodynamicHeating(ExplicitComponent):
         self.add_input("rho", val=np.ones(nn), desc="local density", units="slug/ft**3")
         self.add_input("v", val=np.ones(nn), desc="velocity of shuttle", units="ft/s")
         self.add_input("alpha", val=np.ones(nn), desc="angle of attack of shuttle", units="deg")
+        self.add_input("c_0", val=PARAMETERS["c_0"][0]*np.ones(nn), desc="constant heating coefficient", units=PARAMETERS["c_0"][1])
+        self.add_input("c_1", val=PARAMETERS["c_1"][0]*np.ones(nn), desc="linear heating coefficient", units=PARAMETERS["c_1"][1])
+        self.add_input("c_2", val=PARAMETERS["c_2"][0]*np.ones(nn), desc="quadratic heating coefficient", units=PARAMETERS["c_2"][1])
+        self.add_input("c_3", val=PARAMETERS["c_3"][0]*np.ones(nn), desc="cubic heating coefficient", units=PARAMETERS["c_3"][1])
 
         self.add_output("q", val=np.ones(nn), desc="aerodynamic heating on leading edge of shuttle", units="Btu/ft**2/s")
 
@@ -22,37 +31,128 @@ class AerodynamicHeating(ExplicitComponent):
         self.declare_partials("q", "rho", rows=partial_range, cols=partial_range)
         self.declare_partials("q", "v", rows=partial_range, cols=partial_range)
         self.declare_partials("q", "alpha", rows=partial_range, cols=partial_range)
+        self.declare_partials("q", ["c_0", "c_1", "c_2", "c_3"], rows=partial_range, cols=partial_range)
+
+        self._cache = InputCache(["rho", "v", "alpha", "c_0", "c_1", "c_2", "c_3"], ["sqrt_rho", "v_scaled", "v_307", "q_r", "q_a", "scratch"], nn)
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+        self._kernel = KernelResults(["rho", "v", "alpha", "c_0", "c_1", "c_2", "c_3"], HEATING_RESULTS, nn, self._chunks) if use_kernels(self.options["engine"], self) else None
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        rho = inputs["rho"][s]
+        v = inputs["v"][s]
+        alpha = inputs["alpha"][s]
+        c_0 = inputs["c_0"][s]
+        c_1 = inputs["c_1"][s]
+        c_2 = inputs["c_2"][s]
+        c_3 = inputs["c_3"][s]
+        sqrt_rho = buf["sqrt_rho"][s]
+        v_scaled = buf["v_scaled"][s]
+        v_307 = buf["v_307"][s]
+        q_r = buf["q_r"][s]
+        q_a = buf["q_a"][s]
+        scratch = buf["scratch"][s]
+
+        # q_r = 17700*rho**.5*(.0001*v)**3.07
+        np.sqrt(rho, out=sqrt_rho)
+        np.multiply(.0001, v, out=v_scaled)
+        np.power(v_scaled, 3.07, out=v_307)
+        np.multiply(17700, sqrt_rho, out=q_r)
+        np.multiply(q_r, v_307, out=q_r)
+
+        # q_a = c_0 + c_1*alpha + c_2*alpha**2 + c_3*alpha**3
+        np.multiply(c_1, alpha, out=q_a)
+        np.add(c_0, q_a, out=q_a)
+        np.square(alpha, out=scratch)
+        np.multiply(c_2, scratch, out=scratch)
+        np.add(q_a, scratch, out=q_a)
+        np.power(alpha, 3, out=scratch)
+        np.multiply(c_3, scratch, out=scratch)
+        np.add(q_a, scratch, out=q_a)
 
     def compute(self, inputs, outputs):
+        if self._kernel is not None and not np.iscomplexobj(inputs["rho"]):
+            out = self._kernel.evaluate(inputs, heating_kernel)
+            for name, row in self._kernel.rows.items():
+                if isinstance(name, str):
+                    outputs[name] = out[row]
+            return
 
-        rho = inputs["rho"]
-        v = inputs["v"]
-        alpha = inputs["alpha"]
-        c_0 = 1.0672181
-        c_1 = -.19213774e-1
-        c_2 = .21286289e-3
-        c_3 = -.10117249e-5
-        q_r = 17700*rho**.5*(.0001*v)**3.07
-        q_a = c_0 + c_1*alpha + c_2*alpha**2 + c_3*alpha**3
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, buf, outputs)
+
+    def _compute(self, buf, outputs, s):
 
-        outputs["q"] = q_r*q_a
+        np.multiply(buf["q_r"][s], buf["q_a"][s], out=outputs["q"][s])
 
     def compute_partials(self, inputs, J):
-        
+        if self._kernel is not None:
+            out = self._kernel.evaluate(inputs, heating_kernel)
+            for key, row in self._kernel.rows.items():
+                if isinstance(key, tuple):
+                    J[key] = out[row]
+            return
+
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, inputs, buf, J)
+
+    def _compute_partials(self, inputs, buf, J, s):
+
+        alpha = inputs["alpha"][s]
+        c_1 = inputs["c_1"][s]
+        c_2 = inputs["c_2"][s]
+        c_3 = inputs["c_3"][s]
+        q_a = buf["q_a"][s]
+        q_r = buf["q_r"][s]
+        sqrt_rho = buf["sqrt_rho"][s]
+        v_307 = buf["v_307"][s]
+        v_scaled = buf["v_scaled"][s]
+
+        # (.0001*v)**2.07, recovered from the cached 3.07 power instead of a second fractional power
+        v_207 = buf["scratch"][s]
+        v_207[:] = 0.
+        np.divide(v_307, v_scaled, out=v_207, where=v_scaled != 0)
+
+        J["q", "rho"][s] = q_a*.5*17700*v_307/sqrt_rho
+        J["q", "v"][s] = q_a*3.07*17700*sqrt_rho*.0001*v_207
+        J["q", "alpha"][s] = q_r*(c_1 + 2*c_2*alpha + 3*c_3*alpha**2)
+        J["q", "c_0"][s] = q_r
+        J["q", "c_1"][s] = q_r*alpha
+        J["q", "c_2"][s] = q_r*alpha**2
+        J["q", "c_3"][s] = q_r*alpha**3
+
+    def compute_second_partials(self, inputs, H):
+        # H[of, wrt_1, wrt_2] per node for the second partials with respect to rho, v and alpha,
+        # with wrt_1 declared before wrt_2 (see hessian.py)
+        buf = self._intermediates(inputs)
+
         rho = inputs["rho"]
         v = inputs["v"]
         alpha = inputs["alpha"]
-        c_0 = 1.0672181
-        c_1 = -.19213774e-1
-        c_2 = .21286289e-3
-        c_3 = -.10117249e-5
-
-        q_r = 17700*rho**.5*(.0001*v)**3.07
-        q_a = c_0 + c_1*alpha + c_2*alpha**2 + c_3*alpha**3
-
-        J["q", "rho"] = q_a*.5*17700*rho**(-.5)*(.0001*v)**3.07
-        J["q", "v"] = q_a*3.07*17700*rho**.5*(.0001)**3.07*v**2.07
-        J["q", "alpha"] = q_r*(c_1 + 2*c_2*alpha + 3*c_3*alpha**2)
+        c_1 = inputs["c_1"]
+        c_2 = inputs["c_2"]
+        c_3 = inputs["c_3"]
+        q_r = buf["q_r"]
+        q_a = buf["q_a"]
+
+        dqa_dalpha = c_1 + 2*c_2*alpha + 3*c_3*alpha**2
+        q = q_r*q_a
+
+        H["q", "rho", "rho"] = -.25*q/rho**2
+        H["q", "rho", "v"] = .5*3.07*q/(rho*v)
+        H["q", "rho", "alpha"] = .5*q_r*dqa_dalpha/rho
+        H["q", "v", "v"] = 3.07*2.07*q/v**2
+        H["q", "v", "alpha"] = 3.07*q_r*dqa_dalpha/v
+        H["q", "alpha", "alpha"] = q_r*(2*c_2 + 6*c_3*alpha)
 
 def test_heating():
     prob = Problem()
@@ -0,0 +1,322 @@
+import argparse
+import sys
+import time
+import numpy as np
+import scipy.sparse as sparse
+from aerodynamics_comp import Aerodynamics
+from atmosphere_comp import Atmosphere
+
+# Inputs of ShuttleODE the second derivatives are composed with respect to (in the units of the
+# ODE, so alpha in degrees) and the outputs they are composed for
+ODE_INPUTS = ["h", "gamma", "psi", "theta", "v", "alpha", "beta"]
+ODE_OUTPUTS = ["hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot", "q"]
+
+# (subsystem, inputs that depend on ODE_INPUTS, outputs) of ShuttleODE in evaluation order; the
+# remaining inputs of each component are parameters
+CHAIN = [("atmosphere", ["h"], ["rho"]),
+         ("aerodynamics", ["alpha", "v", "rho"], ["drag", "lift"]),
+         ("heating", ["rho", "v", "alpha"], ["q"]),
+         ("eom", ["beta", "gamma", "h", "psi", "theta", "v", "lift", "drag"], ["hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"])]
+
+class _Partials(dict):
+
+    # Stands in for the component Jacobian when compute_partials is called outside of a
+    # linearization: every sub-Jacobian is a preallocated array of the node values
+
+    def __init__(self, num_nodes):
+        super(_Partials, self).__init__()
+        self.num_nodes = num_nodes
+
+    def __missing__(self, key):
+        value = self[key] = np.zeros(self.num_nodes)
+        return(value)
+
+def ode_derivatives(ode):
+    # Values, gradients (nn x 7) and Hessians (nn x 7 x 7) of ODE_OUTPUTS with respect to
+    # ODE_INPUTS at every node of a ShuttleODE that has just run, composed from the analytic
+    # first and second partials of its components. Every output at a node depends only on the
+    # inputs at that node, so this is a second-order forward pass of the chain rule per node:
+    # grad o = sum_y do/dy grad y and hess o = sum_y do/dy hess y + sum_yz d2o/dydz grad y grad z^T.
+    nn = ode.options["num_nodes"]
+    nx = len(ODE_INPUTS)
+    if not isinstance(ode._get_subsystem("atmosphere"), Atmosphere) or not isinstance(ode._get_subsystem("aerodynamics"), Aerodynamics):
+        raise ValueError("second derivatives need the exponential atmosphere and the polynomial aerodynamics")
+
+    gradients = {}
+    hessians = {}
+    for i, name in enumerate(ODE_INPUTS):
+        gradients[name] = np.zeros((nn, nx))
+        gradients[name][:, i] = 1.
+        hessians[name] = None
+
+    values = {}
+    for subsystem, wrts, ofs in CHAIN:
+        comp = ode._get_subsystem(subsystem)
+        J = _Partials(nn)
+        comp.compute_partials(comp._inputs, J)
+        H = {}
+        comp.compute_second_partials(comp._inputs, H)
+
+        for of in ofs:
+            values[of] = np.array(comp._outputs[of])
+            gradient = np.zeros((nn, nx))
+            hessian = np.zeros((nn, nx, nx))
+            for wrt in wrts:
+                if (of, wrt) not in J:
+                    continue
+                gradient += J[of, wrt][:, np.newaxis]*gradients[wrt]
+                if hessians[wrt] is not None:
+                    hessian += J[of, wrt][:, np.newaxis, np.newaxis]*hessians[wrt]
+            for (name, a, b), d2 in H.items():
+                if name != of:
+                    continue
+                outer = gradients[a][:, :, np.newaxis]*gradients[b][:, np.newaxis, :]
+                if a != b:
+                    outer = outer + outer.transpose(0, 2, 1)
+                hessian += d2[:, np.newaxis, np.newaxis]*outer
+            gradients[of] = gradient
+            hessians[of] = hessian
+
+    return(dict((name, values[name]) for name in ODE_OUTPUTS),
+           dict((name, gradients[name]) for name in ODE_OUTPUTS),
+           dict((name, hessians[name]) for name in ODE_OUTPUTS))
+
+def lagrangian_hessian(hessians, weights):
+    # Sparse Hessian of sum_o sum_i weights[o][i]*o_i with respect to ODE_INPUTS at all nodes,
+    # node-major (row 7*i + j is input j at node i). Nodes do not couple, so it is block diagonal
+    # with one symmetric 7 x 7 block per node; a transcription maps it onto its design variables
+    # with its (linear) interpolation matrices.
+    blocks = sum(np.asarray(weights[name], dtype=float)[:, np.newaxis, np.newaxis]*hessians[name] for name in weights)
+    nn, nx = blocks.shape[:2]
+    return(sparse.bsr_matrix((blocks, np.arange(nn), np.arange(nn + 1)), shape=(nn*nx, nn*nx)).tocsr())
+
+# Variables at every node of CollocationNLP, with the scales of the design vector and the bounds of
+# reentry_dymos.build_problem (alpha in degrees as in the ODE)
+NODE_VARIABLES = ["h", "gamma", "phi", "psi", "theta", "v", "alpha", "beta"]
+STATE_NAMES = ["h", "gamma", "phi", "psi", "theta", "v"]
+RATES = {"h": "hdot", "gamma": "gammadot", "phi": "phidot", "psi": "psidot", "theta": "thetadot", "v": "vdot"}
+SCALES = {"h": 1e5, "gamma": .1, "phi": 1., "psi": 1., "theta": .1, "v": 1e4, "alpha": 10., "beta": 1., "duration": 1e3, "q": 100.}
+BOUNDS = {"h": (0., np.inf), "gamma": (-89*np.pi/180, 89*np.pi/180), "phi": (0., 89*np.pi/180), "psi": (0., 90*np.pi/180),
+          "theta": (-89*np.pi/180, 89*np.pi/180), "v": (0., np.inf), "alpha": (-90., 90.), "beta": (-89*np.pi/180, 1*np.pi/180),
+          "duration": (500., 4000.)}
+
+class CollocationNLP(object):
+
+    # The crossrange problem of reentry_dymos.py in a compact trapezoidal transcription whose
+    # derivatives are all explicit: the design vector is the scaled NODE_VARIABLES at num_nodes
+    # equally spaced nodes followed by the duration, the constraints are the scaled defects
+    # x_k+1 - x_k - dt/2*(f_k + f_k+1) and q at every node, and the boundary conditions of
+    # set_initial_guess are linear equalities. It serves to measure what exact Lagrangian Hessians
+    # buy a second-order NLP solver, which pyOptSparseDriver has no way to pass to its optimizers.
+
+    def __init__(self, num_nodes=21, heating_limit=70., ode_options=None):
+        from openmdao.api import Problem
+        from shuttle_ode import ShuttleODE
+
+        self.num_nodes = num_nodes
+        self.heating_limit = heating_limit
+        self.prob = Problem(model=ShuttleODE(num_nodes=num_nodes, **(ode_options if ode_options is not None else {})))
+        self.prob.setup(check=False)
+        self.prob.final_setup()
+        self._z = None
+        self.num_ode_evaluations = 0
+
+        nv = len(NODE_VARIABLES)
+        self.size = num_nodes*nv + 1
+        self.scales = np.append(np.tile([SCALES[name] for name in NODE_VARIABLES], num_nodes), SCALES["duration"])
+        # columns of the ODE inputs at every node in the design vector
+        self._input_columns = np.array([[i*nv + NODE_VARIABLES.index(name) for name in ODE_INPUTS] for i in range(num_nodes)])
+
+    def index(self, name, node):
+        return(node*len(NODE_VARIABLES) + NODE_VARIABLES.index(name))
+
+    def unscale(self, z):
+        x = z*self.scales
+        nodes = x[:-1].reshape(self.num_nodes, len(NODE_VARIABLES))
+        return(dict((name, nodes[:, j]) for j, name in enumerate(NODE_VARIABLES)), x[-1])
+
+    def _evaluate(self, z):
+        if self._z is not None and np.array_equal(z, self._z):
+            return
+        nodes, duration = self.unscale(z)
+        for name in ODE_INPUTS:
+            self.prob.set_val(name, nodes[name])
+        self.prob.run_model()
+        self.values, self.gradients, self.hessians = ode_derivatives(self.prob.model)
+        self.num_ode_evaluations += 1
+        self._z = np.array(z)
+
+    def guess(self, h_0=260000., h_f=80000., gamma_0=-1*np.pi/180, gamma_f=-5*np.pi/180, v_0=25600., v_f=2500., duration=2000.):
+        # The straight-line guess of reentry_dymos.set_initial_guess
+        ends = {"h": (h_0, h_f), "gamma": (gamma_0, gamma_f), "phi": (0., 75*np.pi/180), "psi": (90*np.pi/180, 10*np.pi/180),
+                "theta": (0., 25*np.pi/180), "v": (v_0, v_f), "alpha": (17.4, 17.4), "beta": (-75*np.pi/180, 0.)}
+        s = np.linspace(0., 1., self.num_nodes)
+        x = np.empty(self.size)
+        for name, (start, end) in ends.items():
+            x[[self.index(name, i) for i in range(self.num_nodes)]] = start + (end - start)*s
+        x[-1] = duration
+        self.boundary = dict((name, ends[name]) for name in ("h", "gamma", "phi", "psi", "theta", "v"))
+        return(x/self.scales)
+
+    def objective(self, z):
+        return(-z[self.index("theta", self.num_nodes - 1)])
+
+    def objective_gradient(self, z):
+        gradient = np.zeros(self.size)
+        gradient[self.index("theta", self.num_nodes - 1)] = -1.
+        return(gradient)
+
+    def objective_hessian(self, z):
+        return(sparse.csr_matrix((self.size, self.size)))
+
+    def constraints(self, z):
+        self._evaluate(z)
+        nodes, duration = self.unscale(z)
+        half_step = duration/(2*(self.num_nodes - 1))
+        defects = []
+        for name in STATE_NAMES:
+            f = self.values[RATES[name]]
+            defects.append((np.diff(nodes[name]) - half_step*(f[:-1] + f[1:]))/SCALES[name])
+        return(np.concatenate(defects + [self.values["q"]/SCALES["q"]]))
+
+    def constraint_jacobian(self, z):
+        self._evaluate(z)
+        nodes, duration = self.unscale(z)
+        n = self.num_nodes - 1
+        half_step = duration/(2*n)
+        rows = []
+        cols = []
+        data = []
+        for s, name in enumerate(STATE_NAMES):
+            row = s*n + np.arange(n)
+            # x_k+1 - x_k
+            for offset, sign in ((1, 1.), (0, -1.)):
+                rows.append(row)
+                cols.append([self.index(name, k + offset) for k in range(n)])
+                data.append(sign*np.ones(n))
+            # -dt/2*(f_k + f_k+1)
+            gradient = self.gradients[RATES[name]]
+            for offset in (0, 1):
+                node = np.arange(n) + offset
+                rows.append(np.repeat(row, len(ODE_INPUTS)))
+                cols.append(self._input_columns[node].ravel())
+                data.append((-half_step*gradient[node]*self.scales[self._input_columns[node]]/SCALES[name]).ravel())
+            f = self.values[RATES[name]]
+            rows.append(row)
+            cols.append(np.full(n, self.size - 1))
+            data.append(-(f[:-1] + f[1:])/(2*n)*SCALES["duration"]/SCALES[name])
+        row = len(STATE_NAMES)*n + np.arange(self.num_nodes)
+        rows.append(np.repeat(row, len(ODE_INPUTS)))
+        cols.append(self._input_columns.ravel())
+        data.append((self.gradients["q"]*self.scales[self._input_columns]/SCALES["q"]).ravel())
+        shape = (len(STATE_NAMES)*n + self.num_nodes, self.size)
+        return(sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=shape))
+
+    def constraint_hessian(self, z, multipliers):
+        # Exact Hessian of multipliers^T constraints(z): the node blocks of lagrangian_hessian
+        # with each rate weighted by the defects it enters, plus the duration couplings
+        self._evaluate(z)
+        nodes, duration = self.unscale(z)
+        n = self.num_nodes - 1
+        half_step = duration/(2*n)
+
+        weights = {"q": multipliers[len(STATE_NAMES)*n:]/SCALES["q"]}
+        duration_row = np.zeros(self.size)
+        for s, name in enumerate(STATE_NAMES):
+            lam = multipliers[s*n:(s + 1)*n]/SCALES[name]
+            # node k enters defects k - 1 and k
+            per_node = np.append(lam, 0.) + np.append(0., lam)
+            weights[RATES[name]] = -half_step*per_node
+            derivative = -per_node[:, np.newaxis]*self.gradients[RATES[name]]/(2*n)
+            np.add.at(duration_row, self._input_columns.ravel(), (derivative*self.scales[self._input_columns]).ravel())
+        duration_row *= SCALES["duration"]
+
+        node_hessian = lagrangian_hessian(self.hessians, weights)
+        columns = self._input_columns.ravel()
+        scaling = sparse.diags(self.scales[columns])
+        selection = sparse.csr_matrix((np.ones(columns.size), (np.arange(columns.size), columns)), shape=(columns.size, self.size))
+        hessian = selection.T.dot(scaling.dot(node_hessian).dot(scaling)).dot(selection)
+        coupling = sparse.csr_matrix((duration_row, (np.full(self.size, self.size - 1), np.arange(self.size))), shape=(self.size, self.size))
+        return((hessian + coupling + coupling.T).tocsr())
+
+    def boundary_constraint(self):
+        from scipy.optimize import LinearConstraint
+
+        rows = []
+        values = []
+        for name, (start, end) in self.boundary.items():
+            rows.append(self.index(name, 0))
+            values.append(start/SCALES[name])
+            if name in ("h", "gamma", "v"):
+                rows.append(self.index(name, self.num_nodes - 1))
+                values.append(end/SCALES[name])
+        A = sparse.csr_matrix((np.ones(len(rows)), (np.arange(len(rows)), rows)), shape=(len(rows), self.size))
+        return(LinearConstraint(A, values, values))
+
+    def bounds(self):
+        from scipy.optimize import Bounds
+
+        lower = np.append(np.tile([BOUNDS[name][0] for name in NODE_VARIABLES], self.num_nodes), BOUNDS["duration"][0])
+        upper = np.append(np.tile([BOUNDS[name][1] for name in NODE_VARIABLES], self.num_nodes), BOUNDS["duration"][1])
+        return(Bounds(lower/self.scales, upper/self.scales))
+
+    def solve(self, hessian="exact", maxiter=1000, tol=1e-6, z0=None):
+        # Solves with scipy's trust-constr, an SQP / interior point method that takes the
+        # Lagrangian Hessian either exactly (hessian="exact") or from BFGS updates ("bfgs", the
+        # quasi-Newton baseline SNOPT also uses); returns the scipy result with the wall time and
+        # the ODE evaluations
+        from scipy.optimize import minimize, NonlinearConstraint, BFGS
+
+        if z0 is None:
+            z0 = self.guess()
+        heating_upper = np.inf if self.heating_limit is None else self.heating_limit/SCALES["q"]
+        lower = np.append(np.zeros(len(STATE_NAMES)*(self.num_nodes - 1)), np.full(self.num_nodes, -np.inf))
+        upper = np.append(np.zeros(len(STATE_NAMES)*(self.num_nodes - 1)), np.full(self.num_nodes, heating_upper))
+        # the objective is linear, so only the constraint part of the Lagrangian Hessian differs
+        constraint_hessian = self.constraint_hessian if hessian == "exact" else BFGS()
+        constraint = NonlinearConstraint(self.constraints, lower, upper, jac=self.constraint_jacobian, hess=constraint_hessian)
+
+        self._z = None
+        self.num_ode_evaluations = 0
+        start = time.perf_counter()
+        result = minimize(self.objective, z0, method="trust-constr", jac=self.objective_gradient, hess=self.objective_hessian,
+                          constraints=[constraint, self.boundary_constraint()], bounds=self.bounds(),
+                          options={"maxiter": maxiter, "gtol": tol, "xtol": 1e-12})
+        result.wall_time = time.perf_counter() - start
+        result.ode_evaluations = self.num_ode_evaluations
+        return(result)
+
+def compare(num_nodes=21, heating_limit=70., maxiter=1000, tol=1e-6):
+    rows = []
+    for hessian in ("exact", "bfgs"):
+        nlp = CollocationNLP(num_nodes, heating_limit)
+        result = nlp.solve(hessian, maxiter, tol)
+        nodes, duration = nlp.unscale(result.x)
+        rows.append({"hessian": hessian, "status": result.status, "iterations": result.nit, "ode_evaluations": result.ode_evaluations,
+                     "wall_time": result.wall_time, "optimality": result.optimality, "violation": result.constr_violation,
+                     "final_time": duration, "final_theta": nodes["theta"][-1]})
+    return(rows)
+
+def format_comparison(rows):
+    lines = ["%-8s %6s %10s %10s %10s %12s %12s %10s %10s" % ("hessian", "status", "iterations", "ode evals", "wall s", "optimality", "violation",
+                                                              "t_f", "theta_f")]
+    for row in rows:
+        lines.append("%-8s %6d %10d %10d %10.2f %12.3e %12.3e %10.1f %10.6f" % (row["hessian"], row["status"], row["iterations"], row["ode_evaluations"],
+                                                                                row["wall_time"], row["optimality"], row["violation"],
+                                                                                row["final_time"], row["final_theta"]))
+    return("\n".join(lines))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare exact Lagrangian Hessians of the shuttle ODE with BFGS updates on a trapezoidal reentry NLP.")
+    parser.add_argument("--nodes", type=int, default=21)
+    parser.add_argument("--heating-limit", type=float, default=70., help="q path constraint upper bound (Btu/ft**2/s); <= 0 drops it")
+    parser.add_argument("--maxiter", type=int, default=1000)
+    parser.add_argument("--tol", type=float, default=1e-6)
+    args = parser.parse_args(argv)
+
+    rows = compare(args.nodes, args.heating_limit if args.heating_limit > 0 else None, args.maxiter, args.tol)
+    print(format_comparison(rows))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import numpy as np
+
+class InputCache(object):
+
+    # Per-component store for intermediate arrays that both compute and compute_partials need.
+    # The arrays are preallocated from num_nodes and filled with out= ufunc calls; the cache
+    # remembers the input values they were computed for so compute_partials can skip the work
+    # when the driver linearizes at the point it just evaluated. Complex-step evaluations get
+    # their own buffers and are never treated as cache hits. index_names are integer buffers,
+    # e.g. table lookup indices, that are allocated alongside the floating point ones.
+
+    def __init__(self, input_names, buffer_names, num_nodes, index_names=()):
+        self._input_names = list(input_names)
+        self._buffer_names = list(buffer_names)
+        self._index_names = list(index_names)
+        self._num_nodes = num_nodes
+        self._keys = dict((name, np.empty(num_nodes)) for name in self._input_names)
+        self._buffers = {}
+        self.valid = False
+
+    def buffers(self, dtype):
+        dtype = np.dtype(dtype)
+        if dtype not in self._buffers:
+            self._buffers[dtype] = dict((name, np.empty(self._num_nodes, dtype=dtype)) for name in self._buffer_names)
+            self._buffers[dtype].update((name, np.empty(self._num_nodes, dtype=int)) for name in self._index_names)
+        return self._buffers[dtype]
+
+    def lookup(self, inputs):
+        if not self.valid or np.iscomplexobj(inputs[self._input_names[0]]):
+            return None
+        for name in self._input_names:
+            if not np.array_equal(self._keys[name], inputs[name]):
+                return None
+        return self._buffers[np.dtype(float)]
+
+    def fill(self, inputs):
+        dtype = inputs[self._input_names[0]].dtype
+        if not np.iscomplexobj(inputs[self._input_names[0]]):
+            self.valid = False
+        return self.buffers(dtype)
+
+    def store(self, inputs):
+        if np.iscomplexobj(inputs[self._input_names[0]]):
+            return
+        for name in self._input_names:
+            self._keys[name][:] = inputs[name]
+        self.valid = True
+
+    def invalidate(self):
+        self.valid = False
@@ -0,0 +1,156 @@
+import argparse
+import sys
+import time
+import numpy as np
+from scipy.integrate import solve_ivp
+from reentry_physics import density, aero_coefficients, aero_forces, state_rates
+from warm_start import STATES, extract_solution, apply_solution
+
+def segment_errors(prob, phase0, phase_path="traj.phase0", rtol=1e-10):
+    # Per-segment error estimate: each segment is re-integrated from its first node with an
+    # explicit integrator, holding the controls to the segment's interpolating polynomial, and the
+    # largest state difference over the segment's nodes is scaled by (1 + max |state|)
+    grid_data = phase0.options["transcription"].grid_data
+    time_s = prob.get_val(phase_path + ".timeseries.time", units="s").ravel()
+    states = np.stack([prob.get_val(phase_path + ".timeseries.states:" + name, units=units).ravel() for name, units in STATES.items()], axis=1)
+    alpha = prob.get_val(phase_path + ".timeseries.controls:alpha", units="deg").ravel()
+    beta = prob.get_val(phase_path + ".timeseries.controls:beta", units="rad").ravel()
+    scale = 1 + np.abs(states).max(axis=0)
+
+    errors = np.zeros(grid_data.num_segments)
+    for i, (i_0, i_1) in enumerate(grid_data.segment_indices):
+        t = time_s[i_0:i_1]
+        dt = t[-1] - t[0]
+        if dt <= 0:
+            continue
+        tau = (t - t[0])/dt
+        alpha_poly = np.polyfit(tau, alpha[i_0:i_1], len(t) - 1)
+        beta_poly = np.polyfit(tau, beta[i_0:i_1], len(t) - 1)
+
+        def rhs(t_i, y):
+            tau_i = (t_i - t[0])/dt
+            alpha_i = np.polyval(alpha_poly, tau_i)
+            lift, drag = aero_forces(density(y[0]), y[5], *aero_coefficients(alpha_i))
+            return(state_rates(y[0], y[1], y[3], y[4], y[5], lift, drag, np.polyval(beta_poly, tau_i)))
+
+        sol = solve_ivp(rhs, (t[0], t[-1]), states[i_0], method="DOP853", t_eval=t, rtol=rtol, atol=rtol)
+        if not sol.success:
+            errors[i] = np.inf
+            continue
+        errors[i] = (np.abs(sol.y.T - states[i_0:i_1])/scale).max()
+
+    return(errors)
+
+def refine_mesh(segment_ends, orders, errors, tol, max_order=7):
+    # Segments within tolerance are kept. The others get one order per decade of excess error;
+    # a segment that would exceed max_order, or whose re-integration failed, is split into equal
+    # parts at its current order.
+    new_ends = [segment_ends[0]]
+    new_orders = []
+    for i, error in enumerate(errors):
+        order = orders[i]
+        if error > tol:
+            required = order + max(int(np.ceil(np.log10(error/tol))), 1) if np.isfinite(error) else max_order + 1
+            if required <= max_order:
+                order = required
+            else:
+                num_splits = max(int(np.ceil(required/float(max_order))), 2)
+                new_ends.extend(np.linspace(segment_ends[i], segment_ends[i + 1], num_splits + 1)[1:-1])
+                new_orders.extend([order]*(num_splits - 1))
+        new_ends.append(segment_ends[i + 1])
+        new_orders.append(order)
+
+    return(np.array(new_ends), new_orders)
+
+def nlp_size(prob):
+    return(sum(np.size(value) for value in prob.driver.get_design_var_values().values()))
+
+def refine(tol=1e-4, num_segments=10, order=3, max_order=7, max_iterations=8, heating_limit=70, transcription="radau",
+           optimizer="SNOPT", out_stream=sys.stdout):
+    # Solves on a coarse uniform mesh and refines it where segment_errors exceeds tol, warm
+    # starting every solve from the previous one, until the mesh is accepted or max_iterations
+    from reentry_dymos import build_problem, driver_failed, set_initial_guess
+
+    segment_ends = np.linspace(-1, 1, num_segments + 1)
+    orders = [order]*num_segments
+    solution = None
+    history = []
+
+    for iteration in range(max_iterations):
+        prob, phase0 = build_problem(heating_limit=heating_limit, transcription=transcription, num_segments=len(orders),
+                                     order=orders, segment_ends=segment_ends, optimizer=optimizer, check=False)
+        if optimizer == "SNOPT":
+            prob.driver.opt_settings["iSumm"] = 0
+        if solution is None:
+            set_initial_guess(prob, phase0)
+        else:
+            apply_solution(prob, phase0, solution)
+
+        start = time.perf_counter()
+        failed = driver_failed(prob.run_driver())
+        wall_time = time.perf_counter() - start
+
+        solution = extract_solution(prob)
+        errors = segment_errors(prob, phase0)
+        history.append({"iteration": iteration,
+                        "num_segments": len(orders),
+                        "nlp_size": nlp_size(prob),
+                        "failed": failed,
+                        "final_theta": float(prob.get_val("traj.phase0.timeseries.states:theta")[-1]),
+                        "max_error": errors.max(),
+                        "wall_time": wall_time})
+        if out_stream is not None:
+            out_stream.write("%3d %9d %9d %7s %12.8f %12.3e %9.2f\n" % tuple(history[-1][key] for key in ("iteration", "num_segments", "nlp_size", "failed",
+                                                                                                           "final_theta", "max_error", "wall_time")))
+            out_stream.flush()
+
+        if errors.max() <= tol:
+            break
+        segment_ends, orders = refine_mesh(segment_ends, orders, errors, tol, max_order)
+
+    return(prob, phase0, history)
+
+def fixed_mesh(num_segments=50, order=3, heating_limit=70, transcription="radau", optimizer="SNOPT"):
+    # One cold solve on the uniform mesh of reentry_dymos.py, the baseline refine is measured against
+    from reentry_dymos import build_problem, driver_failed, set_initial_guess
+
+    prob, phase0 = build_problem(heating_limit=heating_limit, transcription=transcription, num_segments=num_segments, order=order,
+                                 optimizer=optimizer, check=False)
+    if optimizer == "SNOPT":
+        prob.driver.opt_settings["iSumm"] = 0
+    set_initial_guess(prob, phase0)
+
+    start = time.perf_counter()
+    failed = driver_failed(prob.run_driver())
+    return({"num_segments": num_segments,
+            "nlp_size": nlp_size(prob),
+            "failed": failed,
+            "final_theta": float(prob.get_val("traj.phase0.timeseries.states:theta")[-1]),
+            "wall_time": time.perf_counter() - start})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the reentry problem with automatic mesh refinement from a coarse grid.")
+    parser.add_argument("--tol", type=float, default=1e-4, help="accepted relative state error per segment")
+    parser.add_argument("--segments", type=int, default=10, help="segments of the initial uniform mesh")
+    parser.add_argument("--order", type=int, default=3, help="initial transcription order")
+    parser.add_argument("--max-order", type=int, default=7)
+    parser.add_argument("--max-iterations", type=int, default=8)
+    parser.add_argument("--heating-limit", type=float, default=70.)
+    parser.add_argument("--transcription", choices=["radau", "gauss-lobatto"], default="radau")
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--compare", type=int, metavar="SEGMENTS", default=None, help="also solve cold on a uniform mesh of this many segments")
+    args = parser.parse_args(argv)
+
+    print("%3s %9s %9s %7s %12s %12s %9s" % ("it", "segments", "nlp size", "failed", "theta_f", "max error", "time (s)"))
+    prob, phase0, history = refine(args.tol, args.segments, args.order, args.max_order, args.max_iterations, args.heating_limit,
+                                   args.transcription, args.optimizer)
+    print("Total solve time %.2f s" % sum(row["wall_time"] for row in history))
+
+    if args.compare:
+        fixed = fixed_mesh(args.compare, args.order, args.heating_limit, args.transcription, args.optimizer)
+        print("Uniform %d segment mesh %s: nlp size %d, theta_f %.8f, %.2f s (refined: nlp size %d, theta_f %.8f, %.2f s)"
+              % (args.compare, "failed" if fixed["failed"] else "converged", fixed["nlp_size"], fixed["final_theta"], fixed["wall_time"],
+                 history[-1]["nlp_size"], history[-1]["final_theta"], sum(row["wall_time"] for row in history)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from reentry_physics import RHO_0, H_R, W, density, aero_coefficients, aero_forces, heating_rate, state_rates
+
+STATE_NAMES = ["h", "gamma", "phi", "psi", "theta", "v"]
+
+# 1-sigma dispersions: fractional for the model parameters, absolute (ft, rad, ft/s) for the entry state
+DEFAULT_DISPERSIONS = {"rho_0": .05,
+                       "h_r": .02,
+                       "c_L": .05,
+                       "c_D": .05,
+                       "w": .02,
+                       "h": 500.,
+                       "gamma": .05*np.pi/180,
+                       "psi": .1*np.pi/180,
+                       "v": 25.}
+
+PARAMETERS = ["rho_0", "h_r", "c_L", "c_D", "w"]
+NOMINAL = {"rho_0": RHO_0, "h_r": H_R, "c_L": 1., "c_D": 1., "w": W}
+
+SUMMARY = ["sample", "peak_q", "final_time"] + ["final_" + name for name in STATE_NAMES] + PARAMETERS
+
+class Schedule(object):
+
+    # Open-loop alpha (deg) and beta (rad) histories, e.g. from warm_start.extract_solution, and the
+    # entry state the schedule was optimized for
+
+    def __init__(self, solution):
+        self.time = np.asarray(solution["time"], dtype=float)
+        self.alpha = np.asarray(solution["alpha"], dtype=float)*180/np.pi
+        self.beta = np.asarray(solution["beta"], dtype=float)
+        self.initial_state = np.array([solution[name][0] for name in STATE_NAMES], dtype=float)
+
+    def controls(self, t):
+        return(np.interp(t, self.time, self.alpha), np.interp(t, self.time, self.beta))
+
+def sample_dispersions(num_samples, rng, dispersions=None):
+    if dispersions is None:
+        dispersions = DEFAULT_DISPERSIONS
+
+    samples = {}
+    for name in PARAMETERS:
+        samples[name] = NOMINAL[name]*(1 + dispersions.get(name, 0.)*rng.standard_normal(num_samples))
+    for name in STATE_NAMES:
+        samples[name] = dispersions.get(name, 0.)*rng.standard_normal(num_samples)
+    return(samples)
+
+def _rates(t, state, schedule, samples):
+    alpha, beta = schedule.controls(t)
+    h = state[:, 0]
+    v = state[:, 5]
+    rho = density(h, samples["rho_0"], samples["h_r"])
+    c_L, c_D = aero_coefficients(alpha)
+    lift, drag = aero_forces(rho, v, samples["c_L"]*c_L, samples["c_D"]*c_D)
+    rates = state_rates(h, state[:, 1], state[:, 3], state[:, 4], v, lift, drag, beta, samples["w"])
+    return(np.stack(rates, axis=1), heating_rate(rho, v, alpha))
+
+def simulate_batch(schedule, samples, dt=1., h_floor=0.):
+    # Flies every sample with the same control schedule using fixed-step RK4 on an (N, 6) state
+    # array. Only per-sample summaries are kept; a sample stops once it falls below h_floor.
+    num_samples = len(samples["w"])
+    state = schedule.initial_state + np.stack([samples[name] for name in STATE_NAMES], axis=1)
+    t_0 = schedule.time[0]
+    t_f = schedule.time[-1]
+    num_steps = max(int(np.ceil((t_f - t_0)/dt)), 1)
+    dt = (t_f - t_0)/num_steps
+
+    peak_q = np.zeros(num_samples)
+    final_time = np.full(num_samples, t_f)
+    active = np.ones(num_samples, dtype=bool)
+
+    t = t_0
+    for step in range(num_steps):
+        k_1, q = _rates(t, state, schedule, samples)
+        np.maximum(peak_q, np.where(active, q, 0.), out=peak_q)
+        k_2 = _rates(t + dt/2, state + dt/2*k_1, schedule, samples)[0]
+        k_3 = _rates(t + dt/2, state + dt/2*k_2, schedule, samples)[0]
+        k_4 = _rates(t + dt, state + dt*k_3, schedule, samples)[0]
+        state += np.where(active[:, np.newaxis], dt/6*(k_1 + 2*k_2 + 2*k_3 + k_4), 0.)
+        t = t_0 + (step + 1)*dt
+
+        landed = active & (state[:, 0] < h_floor)
+        final_time[landed] = t
+        active &= ~landed
+
+    q = _rates(t, state, schedule, samples)[1]
+    np.maximum(peak_q, np.where(active, q, 0.), out=peak_q)
+
+    # the crossrange is final_theta, in rad, as in the optimized problem
+    summary = {"peak_q": peak_q, "final_time": final_time}
+    for i, name in enumerate(STATE_NAMES):
+        summary["final_" + name] = state[:, i]
+    for name in PARAMETERS:
+        summary[name] = samples[name]
+    return(summary)
+
+def run_chunk(solution, start, num_samples, seed, dispersions=None, dt=1.):
+    rng = np.random.default_rng(seed)
+    summary = simulate_batch(Schedule(solution), sample_dispersions(num_samples, rng, dispersions), dt=dt)
+    summary["sample"] = np.arange(start, start + num_samples)
+    return(summary)
+
+class RunningStatistics(object):
+
+    # Streaming count, mean, standard deviation, min and max per summary quantity (Chan et al.
+    # pairwise update), so that the statistics of a run never need all samples in memory
+
+    def __init__(self, names):
+        self.names = names
+        self.count = 0
+        self.mean = dict((name, 0.) for name in names)
+        self.m2 = dict((name, 0.) for name in names)
+        self.min = dict((name, np.inf) for name in names)
+        self.max = dict((name, -np.inf) for name in names)
+
+    def update(self, summary):
+        n_b = len(summary[self.names[0]])
+        if n_b == 0:
+            return
+        n = self.count + n_b
+        for name in self.names:
+            x = summary[name]
+            mean_b = x.mean()
+            delta = mean_b - self.mean[name]
+            self.mean[name] += delta*n_b/n
+            self.m2[name] += ((x - mean_b)**2).sum() + delta**2*self.count*n_b/n
+            self.min[name] = min(self.min[name], x.min())
+            self.max[name] = max(self.max[name], x.max())
+        self.count = n
+
+    def std(self, name):
+        return(np.sqrt(self.m2[name]/(self.count - 1)) if self.count > 1 else 0.)
+
+    def table(self):
+        lines = ["%-14s %14s %14s %14s %14s" % ("quantity", "mean", "std", "min", "max")]
+        for name in self.names:
+            lines.append("%-14s %14.6g %14.6g %14.6g %14.6g" % (name, self.mean[name], self.std(name), self.min[name], self.max[name]))
+        return("\n".join(lines))
+
+def run_monte_carlo(solution, num_samples, filename=None, chunk_size=10000, max_workers=None, seed=0,
+                    dispersions=None, dt=1.):
+    # Splits the samples into chunks with independent random streams (so results do not depend on
+    # the number of workers), runs them on a process pool and streams each chunk's per-sample
+    # summaries to the CSV file and the running statistics as it finishes
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    starts = list(range(0, num_samples, chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    statistics = RunningStatistics(SUMMARY[1:])
+
+    f = open(filename, "w", newline="") if filename is not None else None
+    try:
+        if f is not None:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY)
+
+        def consume(summary):
+            statistics.update(summary)
+            if f is not None:
+                writer.writerows(zip(*[summary[name] for name in SUMMARY]))
+                f.flush()
+
+        if max_workers == 1:
+            for start, chunk_seed in zip(starts, seeds):
+                consume(run_chunk(solution, start, min(chunk_size, num_samples - start), chunk_seed, dispersions, dt))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(run_chunk, solution, start, min(chunk_size, num_samples - start), chunk_seed, dispersions, dt)
+                           for start, chunk_seed in zip(starts, seeds)]
+                for future in as_completed(futures):
+                    consume(future.result())
+    finally:
+        if f is not None:
+            f.close()
+
+    return(statistics)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fly dispersed trajectories with an optimized alpha/beta schedule.")
+    parser.add_argument("solution", help="npz file with the timeseries of a converged solution (see warm_start.extract_solution)")
+    parser.add_argument("--samples", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dt", type=float, default=1., help="integration step (s)")
+    parser.add_argument("--out", default="monte_carlo.csv")
+    args = parser.parse_args(argv)
+
+    with np.load(args.solution) as data:
+        solution = dict((name, data[name]) for name in data.files)
+
+    start = time.perf_counter()
+    statistics = run_monte_carlo(solution, args.samples, args.out, chunk_size=args.chunk_size, max_workers=args.workers,
+                                 seed=args.seed, dt=args.dt)
+    print(statistics.table())
+    print("%d samples in %.2f s; per-sample summaries in %s" % (statistics.count, time.perf_counter() - start, args.out))
+
+if __name__ == "__main__":
+    main()
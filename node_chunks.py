@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Thread-parallel evaluation over contiguous node ranges. Every component expression is
+# elementwise, so a chunk only reads and writes its own slice of the input, buffer, output and
+# sparse Jacobian arrays; NumPy ufuncs and the nogil numba kernels release the GIL while they run.
+# Below MIN_CHUNK_NODES nodes per thread the dispatch costs more than it saves, so smaller meshes
+# (and num_threads=1) evaluate the whole range on the calling thread.
+
+MIN_CHUNK_NODES = 4096
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def thread_pool(num_threads):
+    # One persistent pool per size, shared by every component in the process
+    with _POOLS_LOCK:
+        pool = _POOLS.get(num_threads)
+        if pool is None:
+            pool = _POOLS[num_threads] = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="ode-chunk")
+    return(pool)
+
+def node_slices(num_nodes, num_threads, min_chunk=None):
+    if min_chunk is None:
+        min_chunk = MIN_CHUNK_NODES
+    num_chunks = max(1, min(num_threads, num_nodes//max(min_chunk, 1)))
+    bounds = np.linspace(0, num_nodes, num_chunks + 1).astype(int)
+    return([slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])])
+
+class NodeChunks(object):
+
+    # run(function, *args) calls function(*args, s) for every node slice s; the calling thread
+    # takes the first chunk while the pool works on the others
+
+    def __init__(self, num_nodes, num_threads=1, min_chunk=None):
+        self.slices = node_slices(num_nodes, num_threads, min_chunk)
+        self._pool = thread_pool(len(self.slices) - 1) if len(self.slices) > 1 else None
+
+    @property
+    def parallel(self):
+        return(self._pool is not None)
+
+    def run(self, function, *args):
+        if self._pool is None:
+            function(*(args + (self.slices[0],)))
+            return
+
+        futures = [self._pool.submit(function, *(args + (s,))) for s in self.slices[1:]]
+        try:
+            function(*(args + (self.slices[0],)))
+        finally:
+            for future in futures:
+                future.result()
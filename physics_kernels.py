@@ -0,0 +1,181 @@
+import math
+import warnings
+import numpy as np
+
+# Fused single-pass kernels for AerodynamicHeating and FlightDynamics: one loop over the nodes
+# evaluates the outputs and every analytic partial into the rows of a preallocated
+# (len(RESULTS), num_nodes) array, with no temporaries. They are compiled with numba when it is
+# installed; the components fall back to their NumPy expressions otherwise, and always for
+# complex-step evaluations. The compiled kernels release the GIL, so they can run on node chunks
+# in parallel.
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+
+ENGINES = ["numpy", "numba"]
+
+HEATING_RESULTS = ["q", ("q", "rho"), ("q", "v"), ("q", "alpha"), ("q", "c_0"), ("q", "c_1"), ("q", "c_2"), ("q", "c_3")]
+
+EOM_RESULTS = ["hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot",
+               ("hdot", "v"), ("hdot", "gamma"),
+               ("gammadot", "lift"), ("gammadot", "h"), ("gammadot", "beta"), ("gammadot", "gamma"), ("gammadot", "v"),
+               ("phidot", "v"), ("phidot", "h"), ("phidot", "gamma"), ("phidot", "psi"), ("phidot", "theta"),
+               ("psidot", "v"), ("psidot", "gamma"), ("psidot", "h"), ("psidot", "beta"), ("psidot", "theta"), ("psidot", "psi"), ("psidot", "lift"),
+               ("thetadot", "v"), ("thetadot", "h"), ("thetadot", "gamma"), ("thetadot", "psi"),
+               ("vdot", "h"), ("vdot", "drag"), ("vdot", "gamma"),
+               ("gammadot", "w"), ("psidot", "w"), ("vdot", "w")]
+
+def _heating(rho, v, alpha, c_0, c_1, c_2, c_3, out):
+    for i in range(rho.shape[0]):
+        a = alpha[i]
+        sqrt_rho = math.sqrt(rho[i])
+        v_scaled = .0001*v[i]
+        v_307 = v_scaled**3.07
+        v_207 = v_307/v_scaled if v_scaled != 0. else 0.
+        q_r = 17700*sqrt_rho*v_307
+        q_a = c_0[i] + c_1[i]*a + c_2[i]*a*a + c_3[i]*a*a*a
+
+        out[0, i] = q_r*q_a
+        out[1, i] = q_a*.5*17700*v_307/sqrt_rho
+        out[2, i] = q_a*3.07*17700*sqrt_rho*.0001*v_207
+        out[3, i] = q_r*(c_1[i] + 2*c_2[i]*a + 3*c_3[i]*a*a)
+        out[4, i] = q_r
+        out[5, i] = q_r*a
+        out[6, i] = q_r*a*a
+        out[7, i] = q_r*a*a*a
+
+def _eom(beta, gamma, h, psi, theta, v, lift, drag, w, out):
+    R_e = 20902900
+    mu = .14076539e17
+    g_0 = 32.174
+    for i in range(v.shape[0]):
+        m = w[i]/g_0
+        inv_w = 1/w[i]
+        v_i = v[i]
+        L = lift[i]
+        s_beta = math.sin(beta[i])
+        c_beta = math.cos(beta[i])
+        s_gamma = math.sin(gamma[i])
+        c_gamma = math.cos(gamma[i])
+        s_psi = math.sin(psi[i])
+        c_psi = math.cos(psi[i])
+        c_theta = math.cos(theta[i])
+        s_theta = math.sin(theta[i])
+
+        # reciprocals are formed once; the rest of the loop only multiplies
+        r = R_e + h[i]
+        inv_r = 1/r
+        inv_v = 1/v_i
+        inv_c_theta = 1/c_theta
+        inv_c_gamma = 1/c_gamma
+        inv_mv = inv_v/m
+        g = mu*inv_r*inv_r
+        t_theta = s_theta*inv_c_theta
+
+        v_r = v_i*inv_r
+        horizontal = v_r*c_gamma*s_psi*inv_c_theta
+        lift_turn = L*s_beta*inv_mv*inv_c_gamma
+        turn = horizontal*s_theta
+        climb = v_r - g*inv_v
+
+        out[0, i] = v_i*s_gamma
+        out[1, i] = L*inv_mv*c_beta + c_gamma*climb
+        out[2, i] = horizontal
+        out[3, i] = lift_turn + turn
+        out[4, i] = c_gamma*c_psi*v_r
+        out[5, i] = -drag[i]/m - g*s_gamma
+
+        out[6, i] = s_gamma
+        out[7, i] = v_i*c_gamma
+
+        out[8, i] = c_beta*inv_mv
+        out[9, i] = c_gamma*(-v_r*inv_r + 2*g*inv_r*inv_v)
+        out[10, i] = -L*inv_mv*s_beta
+        out[11, i] = -s_gamma*climb
+        out[12, i] = -L*inv_mv*inv_v*c_beta + c_gamma*(inv_r + g*inv_v*inv_v)
+
+        out[13, i] = horizontal*inv_v
+        out[14, i] = -horizontal*inv_r
+        out[15, i] = -v_r*s_gamma*s_psi*inv_c_theta
+        out[16, i] = v_r*c_gamma*c_psi*inv_c_theta
+        out[17, i] = horizontal*t_theta
+
+        out[18, i] = (turn - lift_turn)*inv_v
+        out[19, i] = lift_turn*s_gamma*inv_c_gamma - v_r*s_gamma*s_psi*t_theta
+        out[20, i] = -turn*inv_r
+        out[21, i] = L*c_beta*inv_mv*inv_c_gamma
+        out[22, i] = horizontal*inv_c_theta
+        out[23, i] = v_r*c_gamma*c_psi*t_theta
+        out[24, i] = s_beta*inv_mv*inv_c_gamma
+
+        out[25, i] = c_gamma*c_psi*inv_r
+        out[26, i] = -v_r*inv_r*c_gamma*c_psi
+        out[27, i] = -v_r*s_gamma*c_psi
+        out[28, i] = -v_r*c_gamma*s_psi
+
+        out[29, i] = 2*s_gamma*g*inv_r
+        out[30, i] = -1/m
+        out[31, i] = -g*c_gamma
+
+        # the lift and drag accelerations scale with 1/w
+        out[32, i] = -L*inv_mv*c_beta*inv_w
+        out[33, i] = -lift_turn*inv_w
+        out[34, i] = drag[i]/m*inv_w
+
+if HAVE_NUMBA:
+    heating_kernel = numba.njit(cache=True, nogil=True)(_heating)
+    eom_kernel = numba.njit(cache=True, nogil=True)(_eom)
+else:
+    heating_kernel = _heating
+    eom_kernel = _eom
+
+def use_kernels(engine, system):
+    # Resolves a component's engine option; asking for numba without it installed warns once per
+    # component and runs the NumPy path
+    if engine == "numba" and not HAVE_NUMBA:
+        warnings.warn("%s: numba is not installed, using the numpy engine" % system.pathname)
+        return(False)
+    return(engine == "numba")
+
+class KernelResults(object):
+
+    # Holds the kernel output rows of one component and the input values they belong to, so
+    # compute_partials after compute at the same point only copies rows. With chunks (a
+    # node_chunks.NodeChunks) the kernel runs on column slices of the rows.
+
+    def __init__(self, input_names, results, num_nodes, chunks=None):
+        self.input_names = list(input_names)
+        self.chunks = chunks
+        self.rows = dict((name, i) for i, name in enumerate(results))
+        self.out = np.empty((len(results), num_nodes))
+        self._keys = np.empty((len(self.input_names), num_nodes))
+        self.valid = False
+
+    def evaluate(self, inputs, kernel):
+        if self.valid:
+            for i, name in enumerate(self.input_names):
+                if not np.array_equal(self._keys[i], inputs[name]):
+                    break
+            else:
+                return(self.out)
+
+        self.valid = False
+        arrays = [inputs[name] for name in self.input_names]
+        if self.chunks is None:
+            kernel(*(arrays + [self.out]))
+        else:
+            self.chunks.run(self._evaluate_chunk, kernel, arrays)
+        for i, name in enumerate(self.input_names):
+            self._keys[i] = inputs[name]
+        self.valid = True
+        return(self.out)
+
+    def _evaluate_chunk(self, kernel, arrays, s):
+        kernel(*([array[s] for array in arrays] + [self.out[:, s]]))
+
+    def invalidate(self):
+        self.valid = False
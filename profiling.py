@@ -0,0 +1,122 @@
+import csv
+import sys
+import time
+from atmosphere_comp import Atmosphere
+from atmosphere_table_comp import AtmosphereTable
+from aerodynamics_comp import Aerodynamics
+from aerodynamics_table_comp import AerodynamicsTable
+from heating_comp import AerodynamicHeating
+from flight_dynamics_comp import FlightDynamics
+from shuttle_ode_fused_comp import ShuttleODEFused
+
+PROFILED_CLASSES = [Atmosphere, AtmosphereTable, Aerodynamics, AerodynamicsTable, AerodynamicHeating, FlightDynamics, ShuttleODEFused]
+PROFILED_METHODS = ["compute", "compute_partials"]
+
+COLUMNS = ["pathname", "class", "method", "num_nodes", "calls", "total_s", "mean_us", "min_us", "max_us"]
+
+class ComponentProfiler(object):
+
+    # Counts and times compute/compute_partials of the ODE components while the context is
+    # active. The methods are wrapped on the classes on entry and restored on exit, so nothing is
+    # added to the calls outside of a profiling block. Every instance is reported by pathname,
+    # which separates the phase ODEs from the ones created by traj.simulate().
+    #
+    #     with ComponentProfiler() as profiler:
+    #         prob.run_driver()
+    #     print(profiler.table())
+
+    def __init__(self, classes=None, methods=None):
+        self.classes = classes if classes is not None else PROFILED_CLASSES
+        self.methods = methods if methods is not None else PROFILED_METHODS
+        self.stats = {}
+        self.wall_time = 0.
+        self._originals = []
+
+    def _wrap(self, cls, method_name, method):
+        stats = self.stats
+        clock = time.perf_counter
+
+        def profiled(system, *args, **kwargs):
+            start = clock()
+            try:
+                return(method(system, *args, **kwargs))
+            finally:
+                elapsed = clock() - start
+                key = (system.pathname, method_name)
+                entry = stats.get(key)
+                if entry is None:
+                    entry = stats[key] = {"class": cls.__name__, "num_nodes": system.options["num_nodes"],
+                                          "calls": 0, "total": 0., "min": float("inf"), "max": 0.}
+                entry["calls"] += 1
+                entry["total"] += elapsed
+                entry["min"] = min(entry["min"], elapsed)
+                entry["max"] = max(entry["max"], elapsed)
+
+        profiled.__name__ = method.__name__
+        profiled.__doc__ = method.__doc__
+        return(profiled)
+
+    def __enter__(self):
+        for cls in self.classes:
+            for method_name in self.methods:
+                original = cls.__dict__.get(method_name)
+                if original is None:
+                    continue
+                self._originals.append((cls, method_name, original))
+                setattr(cls, method_name, self._wrap(cls, method_name, original))
+        self._start = time.perf_counter()
+        return(self)
+
+    def __exit__(self, *exc_info):
+        self.wall_time += time.perf_counter() - self._start
+        for cls, method_name, original in reversed(self._originals):
+            setattr(cls, method_name, original)
+        self._originals = []
+        return(False)
+
+    def rows(self):
+        rows = []
+        for (pathname, method_name), entry in sorted(self.stats.items(), key=lambda item: -item[1]["total"]):
+            rows.append({"pathname": pathname,
+                         "class": entry["class"],
+                         "method": method_name,
+                         "num_nodes": entry["num_nodes"],
+                         "calls": entry["calls"],
+                         "total_s": entry["total"],
+                         "mean_us": entry["total"]/entry["calls"]*1e6,
+                         "min_us": entry["min"]*1e6,
+                         "max_us": entry["max"]*1e6})
+        return(rows)
+
+    def component_time(self):
+        return(sum(entry["total"] for entry in self.stats.values()))
+
+    def table(self):
+        lines = ["%-60s %-18s %-16s %6s %8s %10s %10s %10s %10s" % tuple(COLUMNS)]
+        for row in self.rows():
+            lines.append("%-60s %-18s %-16s %6d %8d %10.4f %10.1f %10.1f %10.1f" % tuple(row[column] for column in COLUMNS))
+
+        # per class and method totals, then the share of the profiled block spent in the components
+        totals = {}
+        for row in self.rows():
+            key = (row["class"], row["method"])
+            calls, total = totals.get(key, (0, 0.))
+            totals[key] = (calls + row["calls"], total + row["total_s"])
+        lines.append("")
+        for (class_name, method_name), (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append("%-18s %-16s %8d calls %10.4f s" % (class_name, method_name, calls, total))
+
+        component_time = self.component_time()
+        if self.wall_time > 0:
+            lines.append("Component time %.4f s of %.4f s wall time (%.1f%%); the rest is framework, linear solves and optimizer"
+                         % (component_time, self.wall_time, 100*component_time/self.wall_time))
+        return("\n".join(lines))
+
+    def write_csv(self, filename):
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def report(self, out_stream=sys.stdout):
+        out_stream.write(self.table() + "\n")
@@ -1,145 +1,238 @@
+import argparse
+import contextlib
+import os
+import sys
 import numpy as np 
-import matplotlib.pyplot as plt 
-from openmdao.api import Problem, Group, IndepVarComp, pyOptSparseDriver
+from openmdao.api import Problem, Group, ExecComp, pyOptSparseDriver
 from dymos import Trajectory, GaussLobatto, Phase, Radau
-from shuttle_ode import ShuttleODE
-
-# Create the problem
-prob = Problem(model=Group())
-
-# Create the trajectory
-traj = prob.model.add_subsystem("traj", Trajectory())
-
-# Create the phase and add it to the trajectory
-phase0 = Phase(ode_class=ShuttleODE, transcription=Radau(num_segments=50, order=3))
-traj.add_phase(name="phase0", phase=phase0)
-
-# Fix the initial time and manually scale time
-phase0.set_time_options(fix_initial=True, units="s", duration_ref=200)
-
-# Fix initial and necessary final states and manually scale them
-phase0.set_state_options("h", fix_initial=True, fix_final=True, units="ft", rate_source="hdot", targets=["h"], lower=0, ref0=75000, ref=300000, defect_ref=1000)
-phase0.set_state_options("gamma", fix_initial=True, fix_final=True, units="rad", rate_source="gammadot", targets=["gamma"], lower=-89.*np.pi/180, upper=89.*np.pi/180)
-phase0.set_state_options("phi", fix_initial=True, fix_final=False, units="rad", rate_source="phidot", lower=0, upper=89.*np.pi/180)
-phase0.set_state_options("psi", fix_initial=True, fix_final=False, units="rad", rate_source="psidot", targets=["psi"], lower=0, upper=90.*np.pi/180)
-phase0.set_state_options("theta", fix_initial=True, fix_final=False, units="rad", rate_source="thetadot", targets=["theta"], lower=-89.*np.pi/180, upper=89.*np.pi/180)
-phase0.set_state_options("v", fix_initial=True, fix_final=True, units="ft/s", rate_source="vdot", targets=["v"], lower=0, ref0=2500, ref=25000)
-
-# Add necessary controls, enforce bounds on them, and connect them to variables in the ode
-phase0.add_control("alpha", units="rad", opt=True, lower=-np.pi/2, upper=np.pi/2, targets=["alpha"])
-phase0.add_control("beta", units="rad", opt=True, lower=-89*np.pi/180, upper=1*np.pi/180, targets=["beta"])
-
-# Constrain the maximum leading edge heating and scale it
-phase0.add_path_constraint("q", lower=0, upper=70, units="Btu/ft**2/s", ref=70)
-
-# Maximize the crossrange (latitude) and scale it
-phase0.add_objective("theta", loc="final", ref=-0.01)
-
-# Add the pyOptSparseDriver to the problem and allow it to use coloring
-prob.driver = pyOptSparseDriver()
-prob.driver.declare_coloring()
-
-# Set the optimizer
-prob.driver.options["optimizer"] = 'SNOPT'
-prob.driver.opt_settings["iSumm"] = 6
-
-# Set up the problem
-prob.setup(check=True)
-
-# Set the initial guesses for states, controls, and time values
-prob.set_val("traj.phase0.states:h", phase0.interpolate(ys=[260000, 80000], nodes="state_input"), units="ft")
-prob.set_val("traj.phase0.states:gamma", phase0.interpolate(ys=[-1*np.pi/180, -5*np.pi/180], nodes="state_input"), units="rad")
-prob.set_val("traj.phase0.states:phi", phase0.interpolate(ys=[0, 75*np.pi/180], nodes="state_input"), units="rad")
-prob.set_val("traj.phase0.states:psi", phase0.interpolate(ys=[90*np.pi/180, 10*np.pi/180], nodes="state_input"), units="rad")
-prob.set_val("traj.phase0.states:theta", phase0.interpolate(ys=[0, 25*np.pi/180], nodes="state_input"), units="rad")
-prob.set_val("traj.phase0.states:v", phase0.interpolate(ys=[25600, 2500], nodes="state_input"), units="ft/s")
-prob.set_val("traj.phase0.t_initial", 0, units="s")
-prob.set_val("traj.phase0.t_duration", 2000, units="s")
-prob.set_val("traj.phase0.controls:alpha", phase0.interpolate(ys=[17.4*np.pi/180, 17.4*np.pi/180], nodes="control_input"), units="rad")
-prob.set_val("traj.phase0.controls:beta", phase0.interpolate(ys=[-75*np.pi/180, 0*np.pi/180], nodes="control_input"), units="rad")
-
-# Run the driver
-prob.run_driver()
-
-# Output the results
-print("\nTotal time is: ", prob.get_val("traj.phase0.timeseries.time")[-1], "s\n")
-print("Final crossrange is: ", prob.get_val("traj.phase0.timeseries.states:theta")[-1]*180/np.pi, "degrees\n")
-
-# Run the simulation to check if the model is physically valid
-sim_out = traj.simulate()
-
-# Plot the results
-plt.figure(0)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.controls:alpha", units="deg"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.controls:alpha", units="deg"), "b-", label="Simulation")
-plt.title("Angle of Attack over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Angle of Attack (degrees)")
-plt.legend()
-
-plt.figure(1)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.controls:beta", units="deg"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.controls:beta", units="deg"), "b-", label="Simulation")
-plt.title("Bank Angle over Time")
-plt.xlabel("Time points")
-plt.ylabel("Bank Angle (degrees)")
-plt.legend()
-
-plt.figure(2)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.states:h", units="ft"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.states:h", units="ft"), "b-", label="Simulation")
-plt.title("Altitude over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Altitude (feet)")
-plt.legend()
-
-plt.figure(3)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.states:gamma", units="deg"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.states:gamma", units="deg"), "b-", label="Simulation")
-plt.title("Flight Path Angle over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Flight Path Angle (degrees)")
-plt.legend()
-
-plt.figure(4)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.states:phi", units="deg"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.states:phi", units="deg"), "b-", label="Simulation")
-plt.title("Longitude over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Longitudinal Angle (degrees)")
-plt.legend()
-
-plt.figure(5)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.states:psi", units="deg"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.states:psi", units="deg"), "b-", label="Simulation")
-plt.title("Azimuth over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Azimuthal Angle (degrees)")
-plt.legend()
-
-plt.figure(6)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.states:theta", units="deg"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.states:theta", units="deg"), "b-", label="Simulation")
-plt.title("Latitude over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Latitudinal Angle (degrees)")
-plt.legend()
-
-plt.figure(7)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"), prob.get_val("traj.phase0.timeseries.states:v"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"), sim_out.get_val("traj.phase0.timeseries.states:v"), "b-", label="Simulation")
-plt.title("Velocity over Time")
-plt.xlabel("Time (s)")
-plt.ylabel("Velocity (ft/s)")
-plt.legend()
-
-plt.figure(8)
-plt.plot(prob.get_val("traj.phase0.timeseries.time", units="s"),
-         prob.get_val("traj.phase0.timeseries.q"), "ro", label="Solution")
-plt.plot(sim_out.get_val("traj.phase0.timeseries.time", units="s"),
-         sim_out.get_val("traj.phase0.timeseries.q"), "b-", label="Simulation")
-plt.title("Heating rate over Time")
-plt.xlabel("Time points")
-plt.ylabel("Heating Rate (BTU/ft**2/s")
-
-plt.show()
\ No newline at end of file
+from shuttle_ode import ShuttleODE, ode_parameters
+from reentry_physics import PARAMETERS
+from results_io import extract_timeseries, save_results
+from coloring_cache import ColoringCache, coloring_key
+from warm_start import extract_solution
+from validator import validate, simulation_results, format_report
+
+TRANSCRIPTIONS = {"radau": Radau, "gauss-lobatto": GaussLobatto}
+
+# Hand-tuned scaling of the phase; autoscaling.compute_scaling derives the same structure from
+# the initial guess and the constraint Jacobian
+MANUAL_SCALING = {"time": {"duration_ref": 200},
+                  "states": {"h": {"ref0": 75000, "ref": 300000, "defect_ref": 1000},
+                             "gamma": {}, "phi": {}, "psi": {}, "theta": {},
+                             "v": {"ref0": 2500, "ref": 25000}},
+                  "controls": {"alpha": {}, "beta": {}},
+                  "q": {"ref": 70},
+                  "objective": {"ref": -0.01}}
+
+def build_problem(heating_limit=70, transcription="radau", num_segments=50, order=3, optimizer="SNOPT", ode_class=ShuttleODE, ode_options=None, check=True, segment_ends=None, coloring_dir=None, driver=None, scaling=None, parameters=None, direction=None):
+
+    # Create the problem
+    prob = Problem(model=Group())
+
+    # Create the trajectory
+    traj = prob.model.add_subsystem("traj", Trajectory())
+
+    # Create the phase and add it to the trajectory; order may be given per segment and segment_ends
+    # (in [-1, 1]) places the segment boundaries, as the mesh refinement does
+    phase0 = Phase(ode_class=ode_class, transcription=TRANSCRIPTIONS[transcription](num_segments=num_segments, order=order, segment_ends=segment_ends),
+                   ode_init_kwargs=ode_options if ode_options is not None else {})
+    traj.add_phase(name="phase0", phase=phase0)
+
+    # The hand-tuned scaling unless another one (e.g. from autoscaling.compute_scaling) is given
+    if scaling is None:
+        scaling = MANUAL_SCALING
+    states = scaling["states"]
+    controls = scaling["controls"]
+
+    # Fix the initial time and scale time
+    phase0.set_time_options(fix_initial=True, units="s", **scaling["time"])
+
+    # Fix initial and necessary final states and scale them
+    phase0.set_state_options("h", fix_initial=True, fix_final=True, units="ft", rate_source="hdot", targets=["h"], lower=0, **states["h"])
+    phase0.set_state_options("gamma", fix_initial=True, fix_final=True, units="rad", rate_source="gammadot", targets=["gamma"], lower=-89.*np.pi/180, upper=89.*np.pi/180, **states["gamma"])
+    phase0.set_state_options("phi", fix_initial=True, fix_final=False, units="rad", rate_source="phidot", lower=0, upper=89.*np.pi/180, **states["phi"])
+    phase0.set_state_options("psi", fix_initial=True, fix_final=False, units="rad", rate_source="psidot", targets=["psi"], lower=0, upper=90.*np.pi/180, **states["psi"])
+    phase0.set_state_options("theta", fix_initial=True, fix_final=False, units="rad", rate_source="thetadot", targets=["theta"], lower=-89.*np.pi/180, upper=89.*np.pi/180, **states["theta"])
+    phase0.set_state_options("v", fix_initial=True, fix_final=True, units="ft/s", rate_source="vdot", targets=["v"], lower=0, **states["v"])
+
+    # Add necessary controls, enforce bounds on them, and connect them to variables in the ode
+    phase0.add_control("alpha", units="rad", opt=True, lower=-np.pi/2, upper=np.pi/2, targets=["alpha"], **controls["alpha"])
+    phase0.add_control("beta", units="rad", opt=True, lower=-89*np.pi/180, upper=1*np.pi/180, targets=["beta"], **controls["beta"])
+
+    # Constrain the maximum leading edge heating and scale it; heating_limit=None leaves it unconstrained
+    if heating_limit is not None:
+        phase0.add_path_constraint("q", lower=0, upper=heating_limit, units="Btu/ft**2/s", **scaling["q"])
+    else:
+        phase0.add_timeseries_output("q", units="Btu/ft**2/s")
+
+    # Expose vehicle and environment constants as fixed phase parameters, so they can be changed
+    # without editing the components and sensitivity.py can differentiate the optimum with
+    # respect to them: True adds every constant the ODE takes, a list adds the named ones at their
+    # defaults and a dict sets their values (in the units of reentry_physics.PARAMETERS)
+    if parameters is not None:
+        if parameters is True:
+            ode_kwargs = ode_options if ode_options is not None else {}
+            parameters = ode_parameters(ode_kwargs.get("atmosphere", "exponential"), ode_kwargs.get("aero_table"))
+        if not isinstance(parameters, dict):
+            parameters = dict((name, PARAMETERS[name][0]) for name in parameters)
+        for name, value in parameters.items():
+            phase0.add_parameter(name, val=value, units=PARAMETERS[name][1], opt=False, targets=[name])
+
+    # Maximize the crossrange (latitude) and scale it; a direction (rad) instead maximizes the final
+    # position along cos(direction)*phi + sin(direction)*theta, a point of the landing footprint
+    # (see footprint.py). The direction is an input of the footprint component, so a set-up
+    # problem can be turned to another one without rebuilding it.
+    if direction is None:
+        phase0.add_objective("theta", loc="final", **scaling["objective"])
+    else:
+        prob.model.add_subsystem("footprint", ExecComp("J = cos_a*phi_f + sin_a*theta_f", J={"units": "rad"}, phi_f={"units": "rad"}, theta_f={"units": "rad"},
+                                                       cos_a=np.cos(direction), sin_a=np.sin(direction)))
+        prob.model.connect("traj.phase0.timeseries.states:phi", "footprint.phi_f", src_indices=[-1], flat_src_indices=True)
+        prob.model.connect("traj.phase0.timeseries.states:theta", "footprint.theta_f", src_indices=[-1], flat_src_indices=True)
+        prob.model.add_objective("footprint.J", **scaling["objective"])
+
+    # Add the pyOptSparseDriver to the problem and allow it to use coloring; a given driver (e.g. a
+    # ScipyOptimizeDriver where pyoptsparse is not installed) replaces it and keeps its own optimizer
+    if driver is None:
+        prob.driver = pyOptSparseDriver()
+
+        # Set the optimizer
+        prob.driver.options["optimizer"] = optimizer
+        if optimizer == "SNOPT":
+            prob.driver.opt_settings["iSumm"] = 6
+    else:
+        prob.driver = driver
+    prob.driver.declare_coloring()
+
+    # Set up the problem
+    prob.setup(check=check)
+
+    # Reuse the total coloring of an identical earlier problem instead of recomputing it
+    if coloring_dir is not None:
+        config = {"transcription": transcription,
+                  "num_segments": num_segments,
+                  "order": np.asarray(order).tolist(),
+                  "segment_ends": None if segment_ends is None else np.asarray(segment_ends).tolist(),
+                  "heating_constraint": heating_limit is not None,
+                  "footprint": direction is not None,
+                  "ode_class": ode_class.__name__,
+                  "ode_options": ode_options}
+        ColoringCache(coloring_dir).apply(prob, coloring_key(config, ode_class, build_problem))
+
+    return(prob, phase0)
+
+def set_initial_guess(prob, phase0, h_0=260000, h_f=80000, gamma_0=-1*np.pi/180, gamma_f=-5*np.pi/180, v_0=25600, v_f=2500, duration=2000):
+
+    # Set the initial guesses for states, controls, and time values; the end points of the
+    # fixed states are also the boundary conditions of the phase
+    prob.set_val("traj.phase0.states:h", phase0.interpolate(ys=[h_0, h_f], nodes="state_input"), units="ft")
+    prob.set_val("traj.phase0.states:gamma", phase0.interpolate(ys=[gamma_0, gamma_f], nodes="state_input"), units="rad")
+    prob.set_val("traj.phase0.states:phi", phase0.interpolate(ys=[0, 75*np.pi/180], nodes="state_input"), units="rad")
+    prob.set_val("traj.phase0.states:psi", phase0.interpolate(ys=[90*np.pi/180, 10*np.pi/180], nodes="state_input"), units="rad")
+    prob.set_val("traj.phase0.states:theta", phase0.interpolate(ys=[0, 25*np.pi/180], nodes="state_input"), units="rad")
+    prob.set_val("traj.phase0.states:v", phase0.interpolate(ys=[v_0, v_f], nodes="state_input"), units="ft/s")
+    prob.set_val("traj.phase0.t_initial", 0, units="s")
+    prob.set_val("traj.phase0.t_duration", duration, units="s")
+    prob.set_val("traj.phase0.controls:alpha", phase0.interpolate(ys=[17.4*np.pi/180, 17.4*np.pi/180], nodes="control_input"), units="rad")
+    prob.set_val("traj.phase0.controls:beta", phase0.interpolate(ys=[-75*np.pi/180, 0*np.pi/180], nodes="control_input"), units="rad")
+
+def driver_failed(result):
+    # True unless the driver converged; run_driver returns a DriverResult on newer OpenMDAO
+    # versions, whose truth value is deprecated, and the fail flag on older ones
+    if hasattr(result, "success"):
+        return(not result.success)
+    return(bool(result))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the shuttle reentry crossrange problem.")
+    parser.add_argument("--headless", action="store_true", help="record the results without plotting; render them later with report.py")
+    parser.add_argument("--out", default="reentry_results.npz", help="results file (.npz), or a directory of memory mappable .npy files")
+    parser.add_argument("--no-simulate", action="store_true", help="skip the explicit simulation of the solution")
+    parser.add_argument("--dymos-simulate", action="store_true", help="check the solution with traj.simulate() instead of the validator")
+    parser.add_argument("--heating-limit", type=float, default=70.)
+    parser.add_argument("--segments", type=int, default=50)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--transcription", choices=list(TRANSCRIPTIONS), default="radau")
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--threads", type=int, default=1, help="num_threads of the ODE components, for very fine meshes")
+    parser.add_argument("--no-check", action="store_true", help="skip the setup checks")
+    parser.add_argument("--coloring-dir", default=None, help="cache of total colorings reused by runs with the same problem structure")
+    parser.add_argument("--profile", metavar="FILE", default=None, help="count and time the ODE component calls and write the table as CSV")
+    parser.add_argument("--autoscale", action="store_true", help="derive the scaling from the initial guess instead of the hand-tuned values")
+    parser.add_argument("--checkpoint", metavar="FILE", default=None, help="write the design vector to this file every --checkpoint-every major iterations")
+    parser.add_argument("--checkpoint-every", type=int, default=10)
+    parser.add_argument("--resume", action="store_true", help="start from the --checkpoint file when it exists")
+    args = parser.parse_args(argv)
+
+    options = dict(heating_limit=args.heating_limit, transcription=args.transcription, num_segments=args.segments, order=args.order,
+                   optimizer=args.optimizer, check=not args.no_check, coloring_dir=args.coloring_dir,
+                   ode_options={"num_threads": args.threads} if args.threads > 1 else None)
+    if args.autoscale:
+        from autoscaling import autoscale, format_scaling
+        prob, phase0, scaling, conditions = autoscale(**options)
+        print(format_scaling(scaling, conditions) + "\n")
+    else:
+        prob, phase0 = build_problem(**options)
+        set_initial_guess(prob, phase0)
+
+    # Checkpoint the run, continuing a killed one from its last checkpoint; the guess above still
+    # fixes the boundary conditions, which the checkpoint holds too
+    if args.checkpoint:
+        from checkpoint import Checkpointer, restore
+        checkpointer = Checkpointer(args.checkpoint, every=args.checkpoint_every,
+                                    metadata={"heating_limit": args.heating_limit, "transcription": args.transcription,
+                                              "num_segments": args.segments, "order": args.order})
+        if args.resume and os.path.exists(args.checkpoint):
+            metadata = restore(prob, args.checkpoint)
+            checkpointer.num_majors = metadata["major_iterations"]
+            print("Resuming from %s at major iteration %d\n" % (args.checkpoint, metadata["major_iterations"]))
+        prob.driver.add_recorder(checkpointer)
+
+    if args.profile:
+        from profiling import ComponentProfiler
+        profiler = ComponentProfiler()
+    else:
+        profiler = contextlib.nullcontext()
+
+    # Run the driver
+    with profiler:
+        failed = driver_failed(prob.run_driver())
+    if args.checkpoint:
+        checkpointer.save(complete=not failed)
+
+    # Output the results
+    print("\nTotal time is: ", prob.get_val("traj.phase0.timeseries.time")[-1], "s\n")
+    print("Final crossrange is: ", prob.get_val("traj.phase0.timeseries.states:theta")[-1]*180/np.pi, "degrees\n")
+
+    # Record the solution first so that it is kept even if the simulation fails
+    results = extract_timeseries(prob)
+    save_results(results, args.out)
+
+    # Integrate the equations of motion with the optimal controls to check if the model is
+    # physically valid; a failed check sets the exit status
+    passed = True
+    if not args.no_simulate:
+        with profiler:
+            if args.dymos_simulate:
+                sim_out = prob.model.traj.simulate()
+                results.update(extract_timeseries(sim_out, prefix="sim_"))
+            else:
+                validation = validate(extract_solution(prob), heating_limit=args.heating_limit)
+                print(format_report(validation) + "\n")
+                passed = validation["passed"]
+                if validation["success"]:
+                    results.update(simulation_results(validation))
+        save_results(results, args.out)
+
+    if args.profile:
+        profiler.report()
+        profiler.write_csv(args.profile)
+
+    if not args.headless:
+        from report import plot_results
+        plot_results(results)
+
+    return(0 if passed else 1)
+
+if __name__ == "__main__":
+    sys.exit(main())
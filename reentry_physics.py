@@ -0,0 +1,75 @@
+import numpy as np
+
+# Vectorized forms of the equations in the Atmosphere, Aerodynamics, AerodynamicHeating and
+# FlightDynamics components, for code that integrates many trajectories outside of OpenMDAO.
+# Every argument broadcasts, so per-sample parameters can be passed as arrays.
+
+R_E = 20902900.
+MU = .14076539e17
+G_0 = 32.174
+RHO_0 = .002378
+H_R = 23800.
+S = 2690.
+W = 203000.
+A = (-.20704, .029244)
+B = (.07854, -.61592e-2, .621408e-3)
+C = (1.0672181, -.19213774e-1, .21286289e-3, -.10117249e-5)
+
+# The vehicle and environment constants the ODE components take as inputs: name -> (default,
+# units). reentry_dymos.build_problem(parameters=...) exposes them as phase parameters and
+# sensitivity.py differentiates the optimum with respect to them.
+PARAMETERS = {"rho_0": (RHO_0, "slug/ft**3"),
+              "h_r": (H_R, "ft"),
+              "S": (S, "ft**2"),
+              "w": (W, "lb"),
+              "a_0": (A[0], None),
+              "a_1": (A[1], "1/deg"),
+              "b_0": (B[0], None),
+              "b_1": (B[1], "1/deg"),
+              "b_2": (B[2], "deg**-2"),
+              "c_0": (C[0], None),
+              "c_1": (C[1], "1/deg"),
+              "c_2": (C[2], "deg**-2"),
+              "c_3": (C[3], "deg**-3")}
+
+def density(h, rho_0=RHO_0, h_r=H_R):
+    return(rho_0*np.exp(-h/h_r))
+
+def aero_coefficients(alpha, a=A, b=B):
+    # alpha in degrees
+    a_0, a_1 = a
+    b_0, b_1, b_2 = b
+    c_L = a_0 + a_1*alpha
+    c_D = b_0 + b_1*alpha + b_2*alpha**2
+    return(c_L, c_D)
+
+def aero_forces(rho, v, c_L, c_D, S=S):
+    dynamic_area = .5*S*rho*v**2
+    return(c_L*dynamic_area, c_D*dynamic_area)
+
+def heating_rate(rho, v, alpha, c=C):
+    # alpha in degrees
+    c_0, c_1, c_2, c_3 = c
+    q_r = 17700*rho**.5*(.0001*v)**3.07
+    q_a = c_0 + c_1*alpha + c_2*alpha**2 + c_3*alpha**3
+    return(q_r*q_a)
+
+def state_rates(h, gamma, psi, theta, v, lift, drag, beta, w=W):
+    # Returns (hdot, gammadot, phidot, psidot, thetadot, vdot)
+    m = w/G_0
+    r = R_E + h
+    g = MU/r**2
+    s_gamma = np.sin(gamma)
+    c_gamma = np.cos(gamma)
+    s_psi = np.sin(psi)
+    c_psi = np.cos(psi)
+    c_theta = np.cos(theta)
+    s_theta = np.sin(theta)
+
+    hdot = v*s_gamma
+    gammadot = lift/(m*v)*np.cos(beta) + c_gamma*(v/r - g/v)
+    phidot = v/r*c_gamma*s_psi/c_theta
+    psidot = lift*np.sin(beta)/(m*v*c_gamma) + v*c_gamma*s_psi*s_theta/(r*c_theta)
+    thetadot = c_gamma*c_psi*v/r
+    vdot = -drag/m - g*s_gamma
+    return(hdot, gammadot, phidot, psidot, thetadot, vdot)
@@ -0,0 +1,53 @@
+import argparse
+import os
+from results_io import load_results
+
+# (name, title, x label, y label) of each figure, in the order reentry_dymos used to draw them
+FIGURES = [("alpha", "Angle of Attack over Time", "Time (s)", "Angle of Attack (degrees)"),
+           ("beta", "Bank Angle over Time", "Time (s)", "Bank Angle (degrees)"),
+           ("h", "Altitude over Time", "Time (s)", "Altitude (feet)"),
+           ("gamma", "Flight Path Angle over Time", "Time (s)", "Flight Path Angle (degrees)"),
+           ("phi", "Longitude over Time", "Time (s)", "Longitudinal Angle (degrees)"),
+           ("psi", "Azimuth over Time", "Time (s)", "Azimuthal Angle (degrees)"),
+           ("theta", "Latitude over Time", "Time (s)", "Latitudinal Angle (degrees)"),
+           ("v", "Velocity over Time", "Time (s)", "Velocity (ft/s)"),
+           ("q", "Heating rate over Time", "Time (s)", "Heating Rate (BTU/ft**2/s)")]
+
+def plot_results(results, out_dir=None):
+    # Draws the solution, and the simulation when it was recorded, for every figure. With out_dir
+    # the figures are written there as PNG files instead of being shown.
+    import matplotlib
+    if out_dir is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    for i, (name, title, xlabel, ylabel) in enumerate(FIGURES):
+        if name not in results:
+            continue
+        plt.figure(i)
+        plt.plot(results["time"], results[name], "ro", label="Solution")
+        if "sim_" + name in results:
+            plt.plot(results["sim_time"], results["sim_" + name], "b-", label="Simulation")
+        plt.title(title)
+        plt.xlabel(xlabel)
+        plt.ylabel(ylabel)
+        plt.legend()
+
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            plt.savefig(os.path.join(out_dir, name + ".png"))
+            plt.close(i)
+
+    if out_dir is None:
+        plt.show()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plot recorded reentry results.")
+    parser.add_argument("results", help="results file or directory written by reentry_dymos.py")
+    parser.add_argument("--out-dir", default=None, help="write PNG files here instead of opening windows")
+    args = parser.parse_args(argv)
+
+    plot_results(load_results(args.results), args.out_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import numpy as np
+
+# Timeseries kept from a solve, with the variable under the phase and the units it is stored in
+TIMESERIES = {"time": ("timeseries.time", "s"),
+              "h": ("timeseries.states:h", "ft"),
+              "gamma": ("timeseries.states:gamma", "deg"),
+              "phi": ("timeseries.states:phi", "deg"),
+              "psi": ("timeseries.states:psi", "deg"),
+              "theta": ("timeseries.states:theta", "deg"),
+              "v": ("timeseries.states:v", "ft/s"),
+              "alpha": ("timeseries.controls:alpha", "deg"),
+              "beta": ("timeseries.controls:beta", "deg"),
+              "q": ("timeseries.q", "Btu/ft**2/s")}
+
+def extract_timeseries(prob, phase_path="traj.phase0", prefix="", names=None):
+    # Reads the chosen timeseries from a problem, or with prefix="sim_" from the one returned by simulate()
+    results = {}
+    for name in (names if names is not None else TIMESERIES):
+        path, units = TIMESERIES[name]
+        results[prefix + name] = prob.get_val(phase_path + "." + path, units=units).ravel()
+    return(results)
+
+def save_results(results, path):
+    # A path ending in .npz gets one compressed archive; any other path becomes a directory of
+    # .npy files, which is larger on disk but can be memory mapped by load_results
+    if path.endswith(".npz"):
+        np.savez_compressed(path, **results)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    for name, value in results.items():
+        np.save(os.path.join(path, name + ".npy"), value)
+
+def load_results(path, mmap=True):
+    if os.path.isdir(path):
+        mmap_mode = "r" if mmap else None
+        return(dict((filename[:-4], np.load(os.path.join(path, filename), mmap_mode=mmap_mode))
+                    for filename in sorted(os.listdir(path)) if filename.endswith(".npy")))
+
+    with np.load(path) as data:
+        return(dict((name, data[name]) for name in data.files))
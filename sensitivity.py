@@ -0,0 +1,189 @@
+import argparse
+import sys
+import numpy as np
+from autoscaling import _scaler, _unscaled_bounds
+from reentry_physics import PARAMETERS
+
+# A scaled constraint or design variable within ACTIVE_TOL of a bound counts as active; bounds
+# beyond NO_BOUND are the "unbounded" defaults of OpenMDAO
+ACTIVE_TOL = 1e-6
+NO_BOUND = 1e20
+
+def _scaled_bound(driver, meta, key, size):
+    # Bound of a driver variable in the driver (scaled) units, or None
+    bound = meta.get(key)
+    if bound is None:
+        return(None)
+    bound = np.broadcast_to(np.asarray(bound, dtype=float), (size,)).copy()
+    if _unscaled_bounds(driver):
+        if meta.get("total_adder") is not None:
+            bound = bound + meta["total_adder"]
+        if meta.get("total_scaler") is not None:
+            bound = bound*meta["total_scaler"]
+    bound[np.abs(bound) >= NO_BOUND] = np.nan
+    return(bound)
+
+def _at_bound(driver, value, meta, size, tol):
+    # Mask of the entries of a scaled value sitting at its lower or upper bound
+    at_bound = np.zeros(size, dtype=bool)
+    for key in ("lower", "upper"):
+        bound = _scaled_bound(driver, meta, key, size)
+        if bound is not None:
+            at_bound |= np.abs(value - bound) <= tol
+    return(at_bound)
+
+def kkt_multipliers(prob, active_tol=ACTIVE_TOL):
+    # Lagrange multipliers of the constraints at a converged point of the driver, from the
+    # stationarity condition grad f + J_A^T lambda = 0 of the scaled problem restricted to the
+    # active constraints A (the equalities and the inequality rows at a bound) and to the design
+    # variables off their bounds. This is one least squares solve with the scaled total Jacobian
+    # the optimizer sees; at a KKT point its residual vanishes. Returns {constraint: multipliers} in
+    # driver scaling (zero on inactive rows) and the residual relative to |grad f|.
+    driver = prob.driver
+    designvars = driver._designvars
+    objective = list(driver._objs)[0]
+    of = [objective] + list(driver._cons)
+    wrt = list(designvars)
+    totals = prob.compute_totals(of=of, wrt=wrt, return_format="dict", driver_scaling=True)
+
+    dv_values = driver.get_design_var_values()
+    free = []
+    for name in wrt:
+        value = np.atleast_1d(dv_values[name]).ravel()
+        free.append(~_at_bound(driver, value, designvars[name], value.size, active_tol))
+    free = np.concatenate(free)
+
+    con_values = driver.get_constraint_values()
+    rows = []
+    active = {}
+    for name, meta in driver._cons.items():
+        value = np.atleast_1d(con_values[name]).ravel()
+        if meta.get("equals") is not None:
+            active[name] = np.ones(value.size, dtype=bool)
+        else:
+            active[name] = _at_bound(driver, value, meta, value.size, active_tol)
+        J = np.hstack([np.atleast_2d(totals[name][w]) for w in wrt])
+        rows.append(J[active[name]])
+
+    grad = np.hstack([np.atleast_2d(totals[objective][w]) for w in wrt]).ravel()
+    A = np.vstack(rows)[:, free]
+    lam, _, _, _ = np.linalg.lstsq(A.T, -grad[free], rcond=None)
+    residual = np.linalg.norm(grad[free] + A.T.dot(lam))/max(np.linalg.norm(grad[free]), 1e-300)
+
+    multipliers = {}
+    start = 0
+    for name in driver._cons:
+        values = np.zeros(active[name].size)
+        count = int(active[name].sum())
+        values[active[name]] = lam[start:start + count]
+        multipliers[name] = values
+        start += count
+    return(multipliers, residual)
+
+def sensitivities(prob, parameters, active_tol=ACTIVE_TOL):
+    # Derivatives of the optimal objective with respect to fixed model inputs at a converged
+    # optimum, by the envelope theorem: df*/dp = df/dp + lambda^T dc/dp with the multipliers of
+    # kkt_multipliers. All parameters cost one multiplier solve and one total derivative
+    # evaluation instead of a re-optimization each. parameters maps labels to promoted input (or
+    # output) names; an input with several entries (e.g. a value per node) is varied uniformly.
+    # Returns {label: df*/dp} in the units of the objective and the parameter, and the relative
+    # stationarity residual of the multipliers, which is small only at a KKT point.
+    driver = prob.driver
+    multipliers, residual = kkt_multipliers(prob, active_tol)
+    if not parameters:
+        return({}, residual)
+
+    objective = list(driver._objs)[0]
+    sources = dict((label, prob.model.get_source(name)) for label, name in parameters.items())
+    of = [objective] + list(driver._cons)
+    totals = prob.compute_totals(of=of, wrt=list(sources.values()), return_format="dict")
+
+    # the multipliers belong to the scaled constraints and objective
+    objective_scaler = float(np.atleast_1d(_scaler(driver._objs[objective]))[0])
+    derivatives = {}
+    for label, source in sources.items():
+        df_dp = objective_scaler*np.atleast_2d(totals[objective][source]).sum()
+        for name, lam in multipliers.items():
+            if not lam.any():
+                continue
+            dc_dp = np.atleast_2d(totals[name][source]).sum(axis=1)*np.broadcast_to(_scaler(driver._cons[name]), lam.shape)
+            df_dp += lam.dot(dc_dp)
+        derivatives[label] = float(df_dp/objective_scaler)
+    return(derivatives, residual)
+
+def phase_parameters(prob, phase_path="traj.phase0"):
+    # {name: promoted name} of the reentry_physics.PARAMETERS a phase built with
+    # reentry_dymos.build_problem(parameters=...) exposes
+    found = {}
+    for name in PARAMETERS:
+        path = phase_path + ".parameters:" + name
+        try:
+            prob.get_val(path)
+        except KeyError:
+            continue
+        found[name] = path
+    return(found)
+
+def reentry_sensitivities(prob, phase_path="traj.phase0", active_tol=ACTIVE_TOL):
+    # d(final theta)/dp for every vehicle and environment parameter of a solved reentry problem,
+    # with the parameter values and the relative sensitivities (p/theta_f)*d(theta_f)/dp
+    parameters = phase_parameters(prob, phase_path)
+    derivatives, residual = sensitivities(prob, parameters, active_tol)
+    final_theta = float(prob.get_val(phase_path + ".timeseries.states:theta", units="rad")[-1])
+    rows = []
+    for name, path in parameters.items():
+        value = float(np.atleast_1d(prob.get_val(path, units=PARAMETERS[name][1]))[0])
+        rows.append({"parameter": name, "value": value, "units": PARAMETERS[name][1] or "",
+                     "derivative": derivatives[name], "relative": value/final_theta*derivatives[name]})
+    return(rows, residual)
+
+def format_sensitivities(rows, residual=None):
+    lines = ["%-8s %14s %-12s %16s %12s" % ("param", "value", "units", "dtheta_f/dp", "relative")]
+    for row in rows:
+        lines.append("%-8s %14.6g %-12s %16.6e %12.4e" % (row["parameter"], row["value"], row["units"], row["derivative"], row["relative"]))
+    if residual is not None:
+        lines.append("Relative KKT stationarity residual of the multipliers: %.2e" % residual)
+    return("\n".join(lines))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the reentry problem and report d(final crossrange)/d(parameter) for the vehicle and environment constants.")
+    parser.add_argument("--heating-limit", type=float, default=70.)
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--transcription", choices=["radau", "gauss-lobatto"], default="radau")
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--check", metavar="PARAM", nargs="*", default=[],
+                        help="also re-solve with these parameters perturbed and compare central differences")
+    parser.add_argument("--step", type=float, default=1e-3, help="relative step of the --check re-solves")
+    args = parser.parse_args(argv)
+
+    from reentry_dymos import build_problem, driver_failed, set_initial_guess
+
+    def solve(values=None):
+        prob, phase0 = build_problem(heating_limit=args.heating_limit, transcription=args.transcription, num_segments=args.segments,
+                                     order=args.order, optimizer=args.optimizer, check=False, parameters=values if values is not None else True)
+        set_initial_guess(prob, phase0)
+        failed = driver_failed(prob.run_driver())
+        return(prob, failed)
+
+    prob, failed = solve()
+    if failed:
+        print("The optimization failed; the sensitivities below hold only at an optimum")
+    rows, residual = reentry_sensitivities(prob)
+    print(format_sensitivities(rows, residual))
+
+    for name in args.check:
+        base = dict((row["parameter"], row["value"]) for row in rows)
+        step = args.step*abs(base[name])
+        theta = []
+        for sign in (1, -1):
+            values = dict(base)
+            values[name] = base[name] + sign*step
+            perturbed, _ = solve(values)
+            theta.append(float(perturbed.get_val("traj.phase0.timeseries.states:theta", units="rad")[-1]))
+        derivative = [row["derivative"] for row in rows if row["parameter"] == name][0]
+        print("%s: KKT %.6e, central difference of re-solves %.6e" % (name, derivative, (theta[0] - theta[1])/(2*step)))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
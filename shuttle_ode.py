@@ -3,20 +3,56 @@ from heating_comp import AerodynamicHeating
 from flight_dynamics_comp import FlightDynamics
 from aerodynamics_comp import Aerodynamics
 from atmosphere_comp import Atmosphere
+from atmosphere_table_comp import AtmosphereTable
+from aerodynamics_table_comp import AerodynamicsTable, AeroTable
+from physics_kernels import ENGINES
+from reentry_physics import PARAMETERS
 import numpy as np
 
+def ode_parameters(atmosphere="exponential", aero_table=None):
+    # Names of the vehicle and environment constants (reentry_physics.PARAMETERS) a ShuttleODE with
+    # these options takes as inputs; the tabulated atmosphere and aerodynamics replace the fits
+    # and their coefficients
+    excluded = set()
+    if atmosphere != "exponential":
+        excluded.update(["rho_0", "h_r"])
+    if aero_table is not None:
+        excluded.update(["a_0", "a_1", "b_0", "b_1", "b_2"])
+    return([name for name in PARAMETERS if name not in excluded])
+
 class ShuttleODE(Group):
 
     def initialize(self):
         self.options.declare("num_nodes", types=int)
+        self.options.declare("atmosphere", default="exponential", values=["exponential", "us76"], desc="exponential fit or tabulated 1976 standard atmosphere")
+        self.options.declare("engine", default="numpy", values=ENGINES, desc="engine of the heating and flight dynamics components")
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes in every component")
+        self.options.declare("aero_table", default=None, types=(str, AeroTable), allow_none=True, desc="c_L/c_D table over (alpha, Mach), or the directory it was saved to; None uses the polynomial fits")
 
     def setup(self):
         nn = self.options["num_nodes"]
+        num_threads = self.options["num_threads"]
+
+        if self.options["atmosphere"] == "us76":
+            atmosphere = AtmosphereTable(num_nodes=nn, num_threads=num_threads)
+        else:
+            atmosphere = Atmosphere(num_nodes=nn, num_threads=num_threads)
+
+        if self.options["aero_table"] is not None:
+            aerodynamics = AerodynamicsTable(num_nodes=nn, table=self.options["aero_table"], num_threads=num_threads)
+        else:
+            aerodynamics = Aerodynamics(num_nodes=nn, num_threads=num_threads)
+
+        # The vehicle and environment constants are promoted too, so they can be set or connected to
+        # phase parameters by name
+        parameters = ode_parameters(self.options["atmosphere"], self.options["aero_table"])
+        atmosphere_parameters = [name for name in ("rho_0", "h_r") if name in parameters]
+        aerodynamics_parameters = [name for name in ("S", "a_0", "a_1", "b_0", "b_1", "b_2") if name in parameters]
 
-        self.add_subsystem("atmosphere", subsys=Atmosphere(num_nodes=nn), promotes_inputs=["h"], promotes_outputs=["rho"])
-        self.add_subsystem("aerodynamics", subsys=Aerodynamics(num_nodes=nn), promotes_inputs=["alpha", "v", "rho"], promotes_outputs=["lift", "drag"])
-        self.add_subsystem("heating", subsys=AerodynamicHeating(num_nodes=nn), promotes_inputs=["rho", "v", "alpha"], promotes_outputs=["q"])
-        self.add_subsystem("eom", subsys=FlightDynamics(num_nodes=nn), promotes_inputs=["beta", "gamma", "h", "psi", "theta", "v", "lift", "drag"], promotes_outputs=["hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"])
+        self.add_subsystem("atmosphere", subsys=atmosphere, promotes_inputs=["h"] + atmosphere_parameters, promotes_outputs=["rho"])
+        self.add_subsystem("aerodynamics", subsys=aerodynamics, promotes_inputs=["alpha", "v", "rho"] + aerodynamics_parameters, promotes_outputs=["lift", "drag"])
+        self.add_subsystem("heating", subsys=AerodynamicHeating(num_nodes=nn, engine=self.options["engine"], num_threads=num_threads), promotes_inputs=["rho", "v", "alpha", "c_0", "c_1", "c_2", "c_3"], promotes_outputs=["q"])
+        self.add_subsystem("eom", subsys=FlightDynamics(num_nodes=nn, engine=self.options["engine"], num_threads=num_threads), promotes_inputs=["beta", "gamma", "h", "psi", "theta", "v", "lift", "drag", "w"], promotes_outputs=["hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"])
 
 def test_shuttle_ode():
     prob = Problem()
@@ -0,0 +1,376 @@
+import time
+import numpy as np
+from openmdao.api import ExplicitComponent, Problem, Group
+from shuttle_ode import ShuttleODE
+from input_cache import InputCache
+from reentry_physics import PARAMETERS
+from node_chunks import NodeChunks
+
+class ShuttleODEFused(ExplicitComponent):
+
+    # Evaluates the whole ShuttleODE chain (h -> rho -> lift/drag/q -> state rates) in a single
+    # component, with the Jacobians of the four subsystems chained by hand. The expressions are
+    # written exactly as in the grouped components so the outputs match the ShuttleODE Group bit for bit.
+
+    def initialize(self):
+        self.options.declare("num_nodes", types=int)
+        self.options.declare("num_threads", default=1, types=int, desc="threads evaluating contiguous node chunks of large meshes")
+
+    def setup(self):
+        nn = self.options["num_nodes"]
+
+        self.add_input("h", val=np.ones(nn), desc="altitude of shuttle", units="ft")
+        self.add_input("alpha", val=np.ones(nn), desc="angle of attack", units="deg")
+        self.add_input("beta", val=np.ones(nn), desc="bank angle", units="rad")
+        self.add_input("gamma", val=np.ones(nn), desc="flight path angle", units="rad")
+        self.add_input("psi", val=np.ones(nn), desc="azimuthal angle", units="rad")
+        self.add_input("theta", val=np.ones(nn), desc="latitude", units="rad")
+        self.add_input("v", val=np.ones(nn), desc="velocity of shuttle", units="ft/s")
+
+        # vehicle and environment constants, as in the grouped components
+        for name, (value, units) in PARAMETERS.items():
+            self.add_input(name, val=value*np.ones(nn), units=units)
+
+        self.add_output("rho", val=np.ones(nn), desc="local density", units="slug/ft**3")
+        self.add_output("drag", val=np.ones(nn), desc="drag on shuttle", units="lb")
+        self.add_output("lift", val=np.ones(nn), desc="lift on shuttle", units="lb")
+        self.add_output("q", val=np.ones(nn), desc="aerodynamic heating on leading edge of shuttle", units="Btu/ft**2/s")
+        self.add_output("hdot", val=np.ones(nn), desc="rate of change of altitude", units="ft/s")
+        self.add_output("gammadot", val=np.ones(nn), desc="rate of change of flight path angle", units="rad/s")
+        self.add_output("phidot", val=np.ones(nn), desc="rate of change of longitude", units="rad/s")
+        self.add_output("psidot", val=np.ones(nn), desc="rate of change of azimuthal angle", units="rad/s")
+        self.add_output("thetadot", val=np.ones(nn), desc="rate of change of latitude", units="rad/s")
+        self.add_output("vdot", val=np.ones(nn), desc="rate of change of velocity", units="ft/s**2")
+
+        partial_range = np.arange(nn, dtype=int)
+
+        atmosphere = ["rho_0", "h_r"]
+        lift = atmosphere + ["S", "a_0", "a_1"]
+        drag = atmosphere + ["S", "b_0", "b_1", "b_2"]
+
+        self.declare_partials("rho", ["h"] + atmosphere, rows=partial_range, cols=partial_range)
+
+        self.declare_partials("drag", ["h", "alpha", "v"] + drag, rows=partial_range, cols=partial_range)
+        self.declare_partials("lift", ["h", "alpha", "v"] + lift, rows=partial_range, cols=partial_range)
+        self.declare_partials("q", ["h", "alpha", "v", "c_0", "c_1", "c_2", "c_3"] + atmosphere, rows=partial_range, cols=partial_range)
+
+        self.declare_partials("hdot", ["v", "gamma"], rows=partial_range, cols=partial_range)
+        self.declare_partials("gammadot", ["h", "alpha", "beta", "gamma", "v", "w"] + lift, rows=partial_range, cols=partial_range)
+        self.declare_partials("phidot", ["h", "gamma", "psi", "theta", "v"], rows=partial_range, cols=partial_range)
+        self.declare_partials("psidot", ["h", "alpha", "beta", "gamma", "psi", "theta", "v", "w"] + lift, rows=partial_range, cols=partial_range)
+        self.declare_partials("thetadot", ["h", "gamma", "psi", "v"], rows=partial_range, cols=partial_range)
+        self.declare_partials("vdot", ["h", "alpha", "gamma", "v", "w"] + drag, rows=partial_range, cols=partial_range)
+
+        self._cache = InputCache(["h", "alpha", "beta", "gamma", "psi", "theta", "v"] + list(PARAMETERS),
+                                 ["exp_h", "rho", "c_L", "c_D", "v_sq", "drag", "lift", "sqrt_rho", "v_scaled", "v_307", "q_r", "q_a",
+                                  "s_beta", "c_beta", "s_gamma", "c_gamma", "s_psi", "c_psi", "c_theta", "s_theta", "r", "g", "scratch"], nn)
+        self._chunks = NodeChunks(nn, self.options["num_threads"])
+
+    def _intermediates(self, inputs):
+        buf = self._cache.lookup(inputs)
+        if buf is not None:
+            return(buf)
+
+        buf = self._cache.fill(inputs)
+        self._chunks.run(self._fill, inputs, buf)
+        self._cache.store(inputs)
+        return(buf)
+
+    def _fill(self, inputs, buf, s):
+        h = inputs["h"][s]
+        alpha = inputs["alpha"][s]
+        v = inputs["v"][s]
+
+        # views of this chunk of every buffer, so the expressions below read as for the whole mesh
+        buf = dict((name, value[s]) for name, value in buf.items())
+        scratch = buf["scratch"]
+
+        # atmosphere
+        h_r = inputs["h_r"][s]
+        rho_0 = inputs["rho_0"][s]
+        np.negative(h, out=buf["exp_h"])
+        np.divide(buf["exp_h"], h_r, out=buf["exp_h"])
+        np.exp(buf["exp_h"], out=buf["exp_h"])
+        np.multiply(rho_0, buf["exp_h"], out=buf["rho"])
+        rho = buf["rho"]
+
+        # aerodynamics
+        a_0 = inputs["a_0"][s]
+        a_1 = inputs["a_1"][s]
+        b_0 = inputs["b_0"][s]
+        b_1 = inputs["b_1"][s]
+        b_2 = inputs["b_2"][s]
+        S = inputs["S"][s]
+        c_L = buf["c_L"]
+        c_D = buf["c_D"]
+        np.multiply(b_1, alpha, out=c_D)
+        np.add(b_0, c_D, out=c_D)
+        np.square(alpha, out=scratch)
+        np.multiply(b_2, scratch, out=scratch)
+        np.add(c_D, scratch, out=c_D)
+        np.multiply(a_1, alpha, out=c_L)
+        np.add(a_0, c_L, out=c_L)
+        np.square(v, out=buf["v_sq"])
+        buf["drag"][:] = .5*c_D*S*rho*buf["v_sq"]
+        buf["lift"][:] = .5*c_L*S*rho*buf["v_sq"]
+
+        # heating
+        c_0 = inputs["c_0"][s]
+        c_1 = inputs["c_1"][s]
+        c_2 = inputs["c_2"][s]
+        c_3 = inputs["c_3"][s]
+        q_r = buf["q_r"]
+        q_a = buf["q_a"]
+        np.sqrt(rho, out=buf["sqrt_rho"])
+        np.multiply(.0001, v, out=buf["v_scaled"])
+        np.power(buf["v_scaled"], 3.07, out=buf["v_307"])
+        np.multiply(17700, buf["sqrt_rho"], out=q_r)
+        np.multiply(q_r, buf["v_307"], out=q_r)
+        np.multiply(c_1, alpha, out=q_a)
+        np.add(c_0, q_a, out=q_a)
+        np.square(alpha, out=scratch)
+        np.multiply(c_2, scratch, out=scratch)
+        np.add(q_a, scratch, out=q_a)
+        np.power(alpha, 3, out=scratch)
+        np.multiply(c_3, scratch, out=scratch)
+        np.add(q_a, scratch, out=q_a)
+
+        # flight dynamics
+        R_e = 20902900
+        mu = .14076539e17
+        np.sin(inputs["beta"][s], out=buf["s_beta"])
+        np.cos(inputs["beta"][s], out=buf["c_beta"])
+        np.sin(inputs["gamma"][s], out=buf["s_gamma"])
+        np.cos(inputs["gamma"][s], out=buf["c_gamma"])
+        np.sin(inputs["psi"][s], out=buf["s_psi"])
+        np.cos(inputs["psi"][s], out=buf["c_psi"])
+        np.cos(inputs["theta"][s], out=buf["c_theta"])
+        np.sin(inputs["theta"][s], out=buf["s_theta"])
+        np.add(R_e, h, out=buf["r"])
+        np.square(buf["r"], out=buf["g"])
+        np.divide(mu, buf["g"], out=buf["g"])
+
+    def compute(self, inputs, outputs):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute, inputs, buf, outputs)
+
+    def _compute(self, inputs, buf, outputs, s):
+        v = inputs["v"][s]
+        g_0 = 32.174
+        w = inputs["w"][s]
+        buf = dict((name, value[s]) for name, value in buf.items())
+        lift = buf["lift"]
+        drag = buf["drag"]
+        s_beta = buf["s_beta"]
+        c_beta = buf["c_beta"]
+        s_gamma = buf["s_gamma"]
+        c_gamma = buf["c_gamma"]
+        s_psi = buf["s_psi"]
+        c_psi = buf["c_psi"]
+        c_theta = buf["c_theta"]
+        s_theta = buf["s_theta"]
+        r = buf["r"]
+        m = w/g_0
+        g = buf["g"]
+
+        outputs["rho"][s] = buf["rho"]
+        outputs["drag"][s] = drag
+        outputs["lift"][s] = lift
+        np.multiply(buf["q_r"], buf["q_a"], out=outputs["q"][s])
+        outputs["hdot"][s] = v*s_gamma
+        outputs["gammadot"][s] = lift/(m*v)*c_beta + c_gamma*(v/r - g/v)
+        outputs["phidot"][s] = v/r*c_gamma*s_psi/c_theta
+        outputs["psidot"][s] = lift*s_beta/(m*v*c_gamma) + v*c_gamma*s_psi*s_theta/(r*c_theta)
+        outputs["thetadot"][s] = c_gamma*c_psi*v/r
+        outputs["vdot"][s] = -drag/m - g*s_gamma
+
+    def compute_partials(self, inputs, J):
+        buf = self._intermediates(inputs)
+        self._chunks.run(self._compute_partials, inputs, buf, J)
+
+    def _compute_partials(self, inputs, buf, J, s):
+        alpha = inputs["alpha"][s]
+        v = inputs["v"][s]
+        buf = dict((name, value[s]) for name, value in buf.items())
+        rho = buf["rho"]
+        lift = buf["lift"]
+        v_sq = buf["v_sq"]
+
+        # atmosphere
+        h = inputs["h"][s]
+        h_r = inputs["h_r"][s]
+        rho_0 = inputs["rho_0"][s]
+        drho_dh = -1/(h_r)*rho
+        drho_drho_0 = buf["exp_h"]
+        drho_dh_r = rho_0*buf["exp_h"]*h/h_r**2
+
+        # aerodynamics, chained through rho
+        a_1 = inputs["a_1"][s]
+        b_1 = inputs["b_1"][s]
+        b_2 = inputs["b_2"][s]
+        S = inputs["S"][s]
+        c_L = buf["c_L"]
+        c_D = buf["c_D"]
+        dD_dCD = .5*S*rho*v_sq
+        dD_drho = .5*c_D*S*v_sq
+        dL_drho = .5*c_L*S*v_sq
+
+        dD_dalpha = dD_dCD*(b_1 + 2*alpha*b_2)
+        dD_dv = c_D*S*rho*v
+        dD_dh = .5*c_D*S*v_sq*drho_dh
+        dL_dalpha = dD_dCD*a_1
+        dL_dv = c_L*S*rho*v
+        dL_dh = .5*c_L*S*v_sq*drho_dh
+
+        # parameters of lift and drag; the ones of the state rates are chained through these
+        dD_dp = {"rho_0": dD_drho*drho_drho_0, "h_r": dD_drho*drho_dh_r, "S": .5*c_D*rho*v_sq,
+                 "b_0": dD_dCD, "b_1": dD_dCD*alpha, "b_2": dD_dCD*alpha**2}
+        dL_dp = {"rho_0": dL_drho*drho_drho_0, "h_r": dL_drho*drho_dh_r, "S": .5*c_L*rho*v_sq,
+                 "a_0": dD_dCD, "a_1": dD_dCD*alpha}
+
+        # heating, chained through rho
+        c_1 = inputs["c_1"][s]
+        c_2 = inputs["c_2"][s]
+        c_3 = inputs["c_3"][s]
+        q_r = buf["q_r"]
+        q_a = buf["q_a"]
+        v_scaled = buf["v_scaled"]
+        v_207 = buf["scratch"]
+        v_207[:] = 0.
+        np.divide(buf["v_307"], v_scaled, out=v_207, where=v_scaled != 0)
+
+        # flight dynamics
+        g_0 = 32.174
+        w = inputs["w"][s]
+        mu = .14076539e17
+        s_beta = buf["s_beta"]
+        c_beta = buf["c_beta"]
+        s_gamma = buf["s_gamma"]
+        c_gamma = buf["c_gamma"]
+        s_psi = buf["s_psi"]
+        c_psi = buf["c_psi"]
+        c_theta = buf["c_theta"]
+        s_theta = buf["s_theta"]
+        r = buf["r"]
+        m = w/g_0
+        g = buf["g"]
+
+        dgd_dlift = c_beta/(m*v)
+        dpsid_dlift = s_beta/(m*v*c_gamma)
+        dvd_ddrag = -1/m
+
+        J["rho", "h"][s] = drho_dh
+        J["rho", "rho_0"][s] = drho_drho_0
+        J["rho", "h_r"][s] = drho_dh_r
+
+        J["drag", "h"][s] = dD_dh
+        J["drag", "alpha"][s] = dD_dalpha
+        J["drag", "v"][s] = dD_dv
+        J["lift", "h"][s] = dL_dh
+        J["lift", "alpha"][s] = dL_dalpha
+        J["lift", "v"][s] = dL_dv
+
+        J["q", "h"][s] = -.5/h_r*q_a*q_r
+        J["q", "alpha"][s] = q_r*(c_1 + 2*c_2*alpha + 3*c_3*alpha**2)
+        J["q", "v"][s] = q_a*3.07*17700*buf["sqrt_rho"]*.0001*v_207
+        J["q", "rho_0"][s] = .5/rho_0*q_a*q_r
+        J["q", "h_r"][s] = .5*h/h_r**2*q_a*q_r
+        J["q", "c_0"][s] = q_r
+        J["q", "c_1"][s] = q_r*alpha
+        J["q", "c_2"][s] = q_r*alpha**2
+        J["q", "c_3"][s] = q_r*alpha**3
+
+        J["hdot", "v"][s] = s_gamma
+        J["hdot", "gamma"][s] = v*c_gamma
+
+        J["gammadot", "h"][s] = c_gamma*(-v/r**2 + 2*mu/(r**3*v)) + dgd_dlift*dL_dh
+        J["gammadot", "alpha"][s] = dgd_dlift*dL_dalpha
+        J["gammadot", "beta"][s] = -lift/(m*v)*s_beta
+        J["gammadot", "gamma"][s] = -s_gamma*(v/r - g/v)
+        J["gammadot", "v"][s] = -lift/(m*v**2)*c_beta + c_gamma*(1/r + g/v**2) + dgd_dlift*dL_dv
+
+        J["phidot", "v"][s] = c_gamma*s_psi/(c_theta*r)
+        J["phidot", "h"][s] = -v/r**2*c_gamma*s_psi/c_theta
+        J["phidot", "gamma"][s] = -v/r*s_gamma*s_psi/c_theta
+        J["phidot", "psi"][s] = v/r*c_gamma*c_psi/c_theta
+        J["phidot", "theta"][s] = v/r*c_gamma*s_psi/(c_theta**2)*s_theta
+
+        J["psidot", "v"][s] = -lift*s_beta/(m*c_gamma*v**2) + c_gamma*s_psi*s_theta/(r*c_theta) + dpsid_dlift*dL_dv
+        J["psidot", "gamma"][s] = lift*s_beta/(m*v*c_gamma**2)*s_gamma - v*s_gamma*s_psi*s_theta/(r*c_theta)
+        J["psidot", "h"][s] = -v*c_gamma*s_psi*s_theta/(c_theta*r**2) + dpsid_dlift*dL_dh
+        J["psidot", "alpha"][s] = dpsid_dlift*dL_dalpha
+        J["psidot", "beta"][s] = lift*c_beta/(m*v*c_gamma)
+        J["psidot", "theta"][s] = v*c_gamma*s_psi/(r*c_theta**2)
+        J["psidot", "psi"][s] = v*c_gamma*c_psi*s_theta/(r*c_theta)
+
+        J["thetadot", "v"][s] = c_gamma*c_psi/r
+        J["thetadot", "h"][s] = -v/r**2*c_gamma*c_psi
+        J["thetadot", "gamma"][s] = -v/r*s_gamma*c_psi
+        J["thetadot", "psi"][s] = -v/r*c_gamma*s_psi
+
+        J["vdot", "h"][s] = 2*s_gamma*mu/r**3 + dvd_ddrag*dD_dh
+        J["vdot", "alpha"][s] = dvd_ddrag*dD_dalpha
+        J["vdot", "v"][s] = dvd_ddrag*dD_dv
+        J["vdot", "gamma"][s] = -g*c_gamma
+
+        for name, dD in dD_dp.items():
+            J["drag", name][s] = dD
+            J["vdot", name][s] = dvd_ddrag*dD
+        for name, dL in dL_dp.items():
+            J["lift", name][s] = dL
+            J["gammadot", name][s] = dgd_dlift*dL
+            J["psidot", name][s] = dpsid_dlift*dL
+        J["gammadot", "w"][s] = -lift/(m*v)*c_beta/w
+        J["psidot", "w"][s] = -lift*s_beta/(m*v*c_gamma)/w
+        J["vdot", "w"][s] = buf["drag"]/m/w
+
+
+def test_shuttle_ode_fused():
+    prob = Problem()
+    prob.model = ShuttleODEFused(num_nodes=5)
+
+    prob.setup(check=False, force_alloc_complex=True)
+
+    prob.run_model()
+
+    return(prob)
+
+def time_ode(ode_class, num_nodes, num_evals=50):
+    prob = Problem(model=Group())
+    prob.model.add_subsystem("ode", ode_class(num_nodes=num_nodes), promotes=["*"])
+    prob.setup(check=False)
+
+    prob.set_val("h", np.linspace(260000, 80000, num_nodes), units="ft")
+    prob.set_val("alpha", np.linspace(40, 15, num_nodes), units="deg")
+    prob.set_val("beta", np.linspace(-75, 0, num_nodes)*np.pi/180, units="rad")
+    prob.set_val("gamma", np.linspace(-1, -5, num_nodes)*np.pi/180, units="rad")
+    prob.set_val("psi", np.linspace(90, 10, num_nodes)*np.pi/180, units="rad")
+    prob.set_val("theta", np.linspace(0, 25, num_nodes)*np.pi/180, units="rad")
+    prob.set_val("v", np.linspace(25600, 2500, num_nodes), units="ft/s")
+    prob.run_model()
+
+    start = time.perf_counter()
+    for i in range(num_evals):
+        prob.run_model()
+    compute_time = (time.perf_counter() - start)/num_evals
+
+    start = time.perf_counter()
+    for i in range(num_evals):
+        prob.model.run_linearize()
+    partials_time = (time.perf_counter() - start)/num_evals
+
+    return(compute_time, partials_time)
+
+def compare_timing(node_counts=(10, 100, 200, 1000, 10000)):
+    print("%10s %16s %16s %16s %16s %10s" % ("num_nodes", "group compute", "fused compute", "group partials", "fused partials", "speedup"))
+    for nn in node_counts:
+        group_compute, group_partials = time_ode(ShuttleODE, nn)
+        fused_compute, fused_partials = time_ode(ShuttleODEFused, nn)
+        speedup = (group_compute + group_partials)/(fused_compute + fused_partials)
+        print("%10d %14.1fus %14.1fus %14.1fus %14.1fus %9.2fx" % (nn, group_compute*1e6, fused_compute*1e6, group_partials*1e6, fused_partials*1e6, speedup))
+
+if __name__ == "__main__":
+
+    prob = test_shuttle_ode_fused()
+    prob.check_partials(compact_print=True, method="cs")
+    compare_timing()
@@ -0,0 +1,455 @@
+import argparse
+import collections
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+import numpy as np
+from warm_start import config_key, SolutionStore
+
+# Fields of a solve request and their defaults; gamma_0 and gamma_f in degrees as on the command
+# lines, the other boundary conditions in ft and ft/s, the heating limit in Btu/ft**2/s (null for
+# no heating constraint)
+DEFAULTS = {"h_0": 260000.,
+            "h_f": 80000.,
+            "gamma_0": -1.,
+            "gamma_f": -5.,
+            "v_0": 25600.,
+            "v_f": 2500.,
+            "heating_limit": 70.,
+            "transcription": "radau",
+            "num_segments": 20,
+            "order": 3}
+
+TRANSCRIPTIONS = ["radau", "gauss-lobatto"]
+
+# Number of recent requests (and solves) the latency percentiles of the metrics are taken over
+LATENCY_WINDOW = 1000
+
+def request_config(request):
+    # Canonical configuration of a JSON solve request: DEFAULTS filled in, angles in radians and
+    # the same keys and types as sweep.solution_config, so that equal requests hash to the same
+    # config_key however they are written and the solution store can be shared with sweeps
+    unknown = set(request) - set(DEFAULTS)
+    if unknown:
+        raise ValueError("unknown request fields: " + ", ".join(sorted(unknown)))
+    values = dict(DEFAULTS)
+    values.update(request)
+    if values["transcription"] not in TRANSCRIPTIONS:
+        raise ValueError("transcription must be one of " + ", ".join(TRANSCRIPTIONS))
+
+    for name in DEFAULTS:
+        if name == "transcription" or (name == "heating_limit" and values[name] is None):
+            continue
+        # JSON null, strings, lists and objects would only fail later, in float() or int()
+        if isinstance(values[name], bool) or not isinstance(values[name], (int, float)) or not np.isfinite(values[name]):
+            raise ValueError("%s must be a finite number" % name)
+
+    config = {"heating_limit": None if values["heating_limit"] is None else float(values["heating_limit"]),
+              "transcription": values["transcription"],
+              "num_segments": int(values["num_segments"]),
+              "order": int(values["order"])}
+    for name in ("h_0", "h_f", "v_0", "v_f"):
+        config[name] = float(values[name])
+    for name in ("gamma_0", "gamma_f"):
+        config[name] = float(values[name])*np.pi/180
+    if config["num_segments"] < 1 or config["order"] < 1:
+        raise ValueError("num_segments and order must be positive")
+    return(config)
+
+def structure_key(config):
+    # Configurations with the same key share one set-up problem; the rest only changes values
+    return((config["transcription"], config["num_segments"], config["order"], config["heating_limit"] is not None))
+
+def summarize(solution, **stats):
+    result = {"final_time": float(solution["time"][-1]),
+              "final_theta": float(solution["theta"][-1]),
+              "solution": solution}
+    result.update(stats)
+    return(result)
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return(dict((key, _jsonable(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return([_jsonable(item) for item in value])
+    if isinstance(value, np.ndarray):
+        return(value.tolist())
+    if isinstance(value, np.generic):
+        return(value.item())
+    return(value)
+
+# Per-process state of a worker: its options and the set-up problems and last converged solutions
+# by structure_key
+_WORKER = {}
+
+def init_worker(options, prewarm=(), ready=None):
+    # Process pool initializer: builds (sets up and colors) the problems of the prewarm
+    # configurations once, so that the first requests only set values and run the driver, then
+    # reports its pid on the ready queue
+    _WORKER.clear()
+    _WORKER.update(options=options, problems={}, solutions={})
+    for config in prewarm:
+        worker_problem(config)
+    if ready is not None:
+        ready.put(os.getpid())
+
+def worker_ready():
+    return(os.getpid())
+
+def worker_problem(config):
+    key = structure_key(config)
+    if key not in _WORKER["problems"]:
+        from reentry_dymos import build_problem
+
+        options = _WORKER["options"]
+        prob, phase0 = build_problem(heating_limit=config["heating_limit"], transcription=config["transcription"],
+                                     num_segments=config["num_segments"], order=config["order"], optimizer=options["optimizer"],
+                                     check=False, coloring_dir=options["coloring_dir"])
+        if options["optimizer"] == "SNOPT":
+            prob.driver.opt_settings["iSumm"] = 0
+        prob.final_setup()
+        _WORKER["problems"][key] = (prob, phase0)
+    return(_WORKER["problems"][key])
+
+def solve_config(config):
+    # Solves one canonical configuration on the worker's problem of its structure. The heating
+    # limit is a bound of the reused driver; the guess is the nearest stored solution, else the
+    # last solution of this problem, blended onto the requested boundary conditions, else
+    # set_initial_guess. Failures are reported in the result, as sweep.run_case does.
+    from autoscaling import set_bound
+    from reentry_dymos import driver_failed, set_initial_guess
+    from warm_start import apply_solution, boundary_from_config, extract_solution
+
+    start = time.perf_counter()
+    stats = {"pid": os.getpid(), "warm_started": False}
+    try:
+        prob, phase0 = worker_problem(config)
+        if config["heating_limit"] is not None:
+            name = [name for name in prob.driver._cons if name.endswith("path:q")][0]
+            set_bound(prob.driver, name, "upper", config["heating_limit"])
+
+        options = _WORKER["options"]
+        store = SolutionStore(options["store_dir"], options["max_entries"]) if options["store_dir"] else None
+        stored = store.nearest(config) if store is not None else None
+        guess = stored[1] if stored is not None else _WORKER["solutions"].get(structure_key(config))
+        if guess is not None:
+            apply_solution(prob, phase0, guess, boundary=boundary_from_config(config))
+            stats["warm_started"] = True
+        else:
+            set_initial_guess(prob, phase0, h_0=config["h_0"], h_f=config["h_f"], gamma_0=config["gamma_0"], gamma_f=config["gamma_f"],
+                              v_0=config["v_0"], v_f=config["v_f"])
+
+        failed = driver_failed(prob.run_driver())
+        solution = extract_solution(prob)
+        if not failed:
+            _WORKER["solutions"][structure_key(config)] = solution
+            if store is not None:
+                store.save(config, solution)
+        stats.update(status="failed" if failed else "converged", function_evaluations=prob.driver.iter_count, error="")
+    except Exception:
+        solution = None
+        stats.update(status="error", function_evaluations=0, error=traceback.format_exc().strip().splitlines()[-1])
+    stats["solve_time"] = time.perf_counter() - start
+
+    if solution is None:
+        stats.update(final_time=np.nan, final_theta=np.nan, solution=None)
+        return(stats)
+    return(summarize(solution, **stats))
+
+class SolveService(object):
+
+    # Reentry solves behind a pool of long-lived worker processes. Each worker sets up (and colors)
+    # a problem per structure_key once and reuses it for every later request of that structure, so
+    # a request costs a run_driver and no process start, import or setup. Requests are keyed by
+    # config_key of their canonical configuration: a request whose key is already being solved
+    # waits for that solve instead of starting another, and converged results are kept in an LRU
+    # memory cache and, with store_dir, in a SolutionStore that persists across restarts and
+    # seeds the warm starts of the workers.
+    #
+    #     service = SolveService(workers=4)
+    #     result = service.solve({"heating_limit": 60., "gamma_0": -1.5})
+
+    def __init__(self, workers=None, optimizer="SNOPT", coloring_dir=None, store_dir=None, max_entries=200, cache_entries=1000,
+                 prewarm=None, solve_function=solve_config):
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.cache_entries = cache_entries
+        self.solve_function = solve_function
+        self.store = SolutionStore(store_dir, max_entries) if store_dir else None
+
+        self._coloring_tmp = None
+        if coloring_dir is None:
+            coloring_dir = self._coloring_tmp = tempfile.mkdtemp(prefix="solve_service_coloring_")
+        if prewarm is None:
+            prewarm = [request_config({})]
+
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self._in_flight = {}
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._solve_times = collections.deque(maxlen=LATENCY_WINDOW)
+        self.counts = dict.fromkeys(["requests", "solves", "memory_hits", "store_hits", "deduplicated", "errors"], 0)
+        self.started = time.time()
+
+        options = {"optimizer": optimizer, "coloring_dir": coloring_dir, "store_dir": store_dir, "max_entries": max_entries}
+        ready = multiprocessing.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(options, prewarm, ready))
+        # one task per worker starts them all now instead of at the first requests; every worker
+        # reports once it is warm
+        started = [self._executor.submit(worker_ready) for i in range(self.workers)]
+        wait(started)
+        for future in started:
+            # raises BrokenProcessPool when a worker could not set up its problems
+            future.result()
+        self.worker_pids = sorted(ready.get() for i in range(self.workers))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._coloring_tmp is not None:
+            shutil.rmtree(self._coloring_tmp, ignore_errors=True)
+            self._coloring_tmp = None
+
+    def _cached(self, key):
+        # (result, "memory" or "store") of a converged earlier solve, or None
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.counts["memory_hits"] += 1
+            return(self._cache[key], "memory")
+        if self.store is not None:
+            try:
+                solution = self.store.load(key)
+            except (OSError, ValueError):
+                return(None)
+            self.counts["store_hits"] += 1
+            result = summarize(solution, status="converged")
+            self._remember(key, result)
+            return(result, "store")
+        return(None)
+
+    def _remember(self, key, result):
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    def _served(self, start):
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+
+    def _finish(self, key, start, future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._latencies.append(time.perf_counter() - start)
+            if future.exception() is not None:
+                self.counts["errors"] += 1
+                return
+            result = future.result()
+            if "solve_time" in result:
+                self._solve_times.append(result["solve_time"])
+            if result["status"] == "error":
+                self.counts["errors"] += 1
+            elif result["status"] == "converged":
+                self._remember(key, result)
+
+    def submit(self, request):
+        # Returns (key, future of the result dict, how it is served: "memory", "store",
+        # "deduplicated" or "solve")
+        start = time.perf_counter()
+        config = request_config(request)
+        key = config_key(config)
+        with self._lock:
+            self.counts["requests"] += 1
+            cached = self._cached(key)
+            if cached is not None:
+                self._latencies.append(time.perf_counter() - start)
+                future = Future()
+                future.set_result(cached[0])
+                return(key, future, cached[1])
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.counts["deduplicated"] += 1
+                served = "deduplicated"
+            else:
+                self.counts["solves"] += 1
+                future = self._executor.submit(self.solve_function, config)
+                self._in_flight[key] = future
+                served = "solve"
+        # outside the lock, since a callback runs right away when the solve is already done
+        if served == "deduplicated":
+            future.add_done_callback(lambda future: self._served(start))
+        else:
+            future.add_done_callback(lambda future: self._finish(key, start, future))
+        return(key, future, served)
+
+    def solve(self, request, timeout=None):
+        # Blocking submit; the result dict gets the key and how it was served. A worker process
+        # that died is reported as an error result; TimeoutError leaves the solve running.
+        key, future, served = self.submit(request)
+        try:
+            result = dict(future.result(timeout=timeout))
+        except TimeoutError:
+            raise
+        except Exception as err:
+            result = {"status": "error", "error": repr(err), "solution": None}
+        result.update(key=key, served=served)
+        return(result)
+
+    def metrics(self):
+        from guidance import latency_percentiles
+
+        with self._lock:
+            running = sum(future.running() for future in self._in_flight.values())
+            metrics = {"workers": self.workers,
+                       "worker_pids": self.worker_pids,
+                       "uptime": time.time() - self.started,
+                       "in_flight": len(self._in_flight),
+                       "running": running,
+                       "queue_depth": len(self._in_flight) - running,
+                       "cache_entries": len(self._cache)}
+            metrics.update(self.counts)
+            if self._latencies:
+                metrics["latency"] = latency_percentiles(self._latencies)
+            if self._solve_times:
+                metrics["solve_time"] = latency_percentiles(self._solve_times)
+        return(metrics)
+
+class SolveRequestHandler(BaseHTTPRequestHandler):
+
+    # POST /solve with a JSON object of DEFAULTS fields; GET /metrics and GET /health. Responses
+    # are JSON; invalid requests get 400, solves that raised 500 and solves that outlast the
+    # server timeout 504.
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return(self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _reply(self, code, body):
+        data = json.dumps(_jsonable(body), allow_nan=True).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._reply(200, self.server.service.metrics())
+        elif self.path == "/health":
+            self._reply(200, {"status": "ok", "workers": self.server.service.workers})
+        else:
+            self._reply(404, {"error": "unknown path " + self.path})
+
+    def do_POST(self):
+        if self.path != "/solve":
+            self._reply(404, {"error": "unknown path " + self.path})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if not isinstance(request, dict):
+                raise ValueError("the request must be a JSON object")
+            request_config(request)
+        except ValueError as err:
+            self._reply(400, {"error": str(err)})
+            return
+
+        try:
+            result = self.server.service.solve(request, timeout=self.server.timeout_s)
+        except TimeoutError:
+            self._reply(504, {"error": "no result within %g s; the solve continues and later requests get it" % self.server.timeout_s})
+            return
+        self._reply(500 if result["status"] == "error" else 200, result)
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+
+    daemon_threads = True
+
+def make_server(service, port=8765, socket_path=None, timeout=600., verbose=False):
+    # Localhost HTTP server (port 0 picks a free port) or, with socket_path, one on a Unix socket
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, SolveRequestHandler)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), SolveRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    server.timeout_s = timeout
+    server.verbose = verbose
+    return(server)
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=None):
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def call(path, request=None, port=8765, socket_path=None, timeout=None):
+    # Client side: POSTs request (GET when None) to a running service; returns (status, JSON body)
+    if socket_path is not None:
+        connection = UnixHTTPConnection(socket_path, timeout=timeout)
+    else:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        if request is None:
+            connection.request("GET", path)
+        else:
+            connection.request("POST", path, body=json.dumps(request), headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return(response.status, json.loads(response.read().decode("utf-8")))
+    finally:
+        connection.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve reentry solves from a pool of pre-warmed worker processes over localhost HTTP or a Unix socket.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", default=None, help="listen on this Unix socket instead of localhost")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--coloring-dir", default=None, help="total coloring cache shared by the workers")
+    parser.add_argument("--store-dir", default=None, help="solution store that persists results and seeds warm starts")
+    parser.add_argument("--cache-entries", type=int, default=1000, help="converged results kept in memory")
+    parser.add_argument("--prewarm", nargs="*", type=int, default=[DEFAULTS["num_segments"]], metavar="SEGMENTS",
+                        help="meshes every worker sets up before the first request")
+    parser.add_argument("--transcription", choices=TRANSCRIPTIONS, default=DEFAULTS["transcription"], help="transcription of the prewarmed problems")
+    parser.add_argument("--timeout", type=float, default=600., help="longest a request waits for its solve (s)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    prewarm = [request_config({"num_segments": num_segments, "transcription": args.transcription}) for num_segments in args.prewarm]
+    service = SolveService(workers=args.workers, optimizer=args.optimizer, coloring_dir=args.coloring_dir, store_dir=args.store_dir,
+                           cache_entries=args.cache_entries, prewarm=prewarm)
+    server = make_server(service, args.port, args.socket, args.timeout, args.verbose)
+    print("Serving reentry solves with %d workers on %s" % (service.workers, args.socket if args.socket else "http://127.0.0.1:%d" % server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from warm_start import STATES, CONTROLS, DISTANCE_SCALES, SolutionStore, apply_solution, boundary_from_config, extract_solution
+from sweep import DEFAULTS, expand_grid, run_sweep, solution_config
+
+# Entry conditions and heating limit the surrogate interpolates over, in the units of
+# sweep.solution_config (gamma_0 in rad)
+FEATURES = ["heating_limit", "h_0", "gamma_0", "v_0"]
+
+# Normalized time grid the stored trajectories are resampled onto
+NUM_POINTS = 50
+
+TRAJECTORY = list(STATES) + list(CONTROLS)
+
+def cubic_kernel(r):
+    return(r*r*r)
+
+class CrossrangeSurrogate(object):
+
+    # Interpolates converged solutions over (heating_limit, h_0, gamma_0, v_0): a cubic radial
+    # basis function with a linear polynomial tail per output, fitted once, so a query is one
+    # distance evaluation and one small matrix-vector product. The outputs are the final time and
+    # crossrange and every state and control on NUM_POINTS normalized times. The uncertainty of a
+    # query is the inverse distance weighted leave-one-out error of the nearby database entries
+    # (Rippa's closed form, no refits), and queries outside the database bounds are flagged.
+
+    def __init__(self, features, final_time, final_theta, trajectories, smoothing=0.):
+        # features (N, len(FEATURES)); final_time, final_theta (N,); trajectories maps the names
+        # of TRAJECTORY to (N, NUM_POINTS) arrays
+        self.features = np.asarray(features, dtype=float)
+        self.final_time = np.asarray(final_time, dtype=float)
+        self.final_theta = np.asarray(final_theta, dtype=float)
+        self.trajectories = dict((name, np.asarray(trajectories[name], dtype=float)) for name in TRAJECTORY)
+        self.smoothing = smoothing
+        num_entries = self.features.shape[0]
+
+        # features that vary in the database, scaled as in the warm start distance
+        self.scales = np.array([DISTANCE_SCALES[name] for name in FEATURES])
+        spread = np.ptp(self.features, axis=0)
+        self.active = spread > 0
+        self.lower = self.features.min(axis=0)
+        self.upper = self.features.max(axis=0)
+        x = self.features[:, self.active]/self.scales[self.active]
+        self._x = x
+
+        num_poly = x.shape[1] + 1
+        if num_entries < num_poly + 1:
+            raise ValueError("the surrogate needs at least %d converged solutions, got %d" % (num_poly + 1, num_entries))
+
+        # outputs as columns: final time, final theta, then every trajectory
+        self.columns = {"final_time": 0, "final_theta": 1}
+        blocks = [self.final_time[:, None], self.final_theta[:, None]]
+        offset = 2
+        for name in TRAJECTORY:
+            self.columns[name] = slice(offset, offset + self.trajectories[name].shape[1])
+            offset += self.trajectories[name].shape[1]
+            blocks.append(self.trajectories[name])
+        y = np.hstack(blocks)
+
+        # augmented system [[Phi + smoothing*I, P], [P^T, 0]]
+        r = np.sqrt(((x[:, None, :] - x[None, :, :])**2).sum(axis=2))
+        A = np.zeros((num_entries + num_poly, num_entries + num_poly))
+        A[:num_entries, :num_entries] = cubic_kernel(r) + smoothing*np.eye(num_entries)
+        P = np.hstack([np.ones((num_entries, 1)), x])
+        A[:num_entries, num_entries:] = P
+        A[num_entries:, :num_entries] = P.T
+
+        A_inv = np.linalg.inv(A)
+        rhs = np.vstack([y, np.zeros((num_poly, y.shape[1]))])
+        coefficients = A_inv.dot(rhs)
+        self._weights = coefficients[:num_entries]
+        self._poly = coefficients[num_entries:]
+
+        # leave-one-out errors of every output at every entry
+        self.loo_errors = coefficients[:num_entries]/np.diag(A_inv)[:num_entries, None]
+
+    @classmethod
+    def from_store(cls, directory, num_points=NUM_POINTS, **options):
+        # Every solution of a SolutionStore, e.g. the warm start directory of a sweep
+        store = SolutionStore(directory)
+        tau = np.linspace(0, 1, num_points)
+        features = []
+        final_time = []
+        final_theta = []
+        trajectories = dict((name, []) for name in TRAJECTORY)
+        # one entry per point, the finest mesh when a point was solved more than once
+        chosen = {}
+        for key, config in store.entries().items():
+            point = tuple(config[name] for name in FEATURES)
+            if point not in chosen or config.get("num_segments", 0) > chosen[point][1].get("num_segments", 0):
+                chosen[point] = (key, config)
+
+        for point, (key, config) in sorted(chosen.items()):
+            try:
+                solution = store.load(key)
+            except OSError:
+                continue
+            t = solution["time"]
+            s = (t - t[0])/(t[-1] - t[0])
+            features.append(point)
+            final_time.append(t[-1] - t[0])
+            final_theta.append(solution["theta"][-1])
+            for name in TRAJECTORY:
+                trajectories[name].append(np.interp(tau, s, solution[name]))
+
+        return(cls(features, final_time, final_theta, trajectories, **options))
+
+    def save(self, filename):
+        arrays = {"features": self.features, "final_time": self.final_time, "final_theta": self.final_theta, "smoothing": self.smoothing}
+        arrays.update(self.trajectories)
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return(cls(data["features"], data["final_time"], data["final_theta"], dict((name, data[name]) for name in TRAJECTORY),
+                       smoothing=float(data["smoothing"])))
+
+    def _evaluate(self, point, columns):
+        x = point[self.active]/self.scales[self.active]
+        d = np.sqrt(((self._x - x)**2).sum(axis=1))
+        value = cubic_kernel(d).dot(self._weights[:, columns]) + self._poly[0, columns] + x.dot(self._poly[1:, columns])
+
+        # inverse distance weights of the leave-one-out errors; an exact hit takes its own
+        nearest = np.argmin(d)
+        if d[nearest] == 0.:
+            uncertainty = np.abs(self.loo_errors[nearest, columns])
+        else:
+            w = 1/(d*d)
+            uncertainty = w.dot(np.abs(self.loo_errors[:, columns]))/w.sum()
+        return(value, uncertainty)
+
+    def crossrange(self, heating_limit=DEFAULTS["heating_limit"], h_0=DEFAULTS["h_0"], gamma_0=DEFAULTS["gamma_0"], v_0=DEFAULTS["v_0"]):
+        # Final latitude (rad) and its uncertainty only, for the fastest queries; gamma_0 in deg
+        point = np.array([heating_limit, h_0, gamma_0*np.pi/180, v_0])
+        value, uncertainty = self._evaluate(point, self.columns["final_theta"])
+        return(float(value), float(uncertainty))
+
+    def query(self, heating_limit=DEFAULTS["heating_limit"], h_0=DEFAULTS["h_0"], gamma_0=DEFAULTS["gamma_0"], v_0=DEFAULTS["v_0"]):
+        # Interpolated optimum for an entry state and heating limit (gamma_0 in deg, as in sweep):
+        # final time and crossrange with their uncertainties and the whole trajectory, including
+        # the alpha/beta schedule, in the format of warm_start.extract_solution
+        point = np.array([heating_limit, h_0, gamma_0*np.pi/180, v_0])
+        value, uncertainty = self._evaluate(point, slice(None))
+        final_time = value[0]
+        solution = {"time": np.linspace(0, 1, self.trajectories["h"].shape[1])*final_time}
+        for name in TRAJECTORY:
+            solution[name] = value[self.columns[name]]
+
+        return({"final_theta": value[1],
+                "final_theta_uncertainty": uncertainty[1],
+                "final_time": final_time,
+                "final_time_uncertainty": uncertainty[0],
+                "extrapolated": bool(np.any((point < self.lower) | (point > self.upper))),
+                "solution": solution})
+
+def confirm(result, heating_limit=DEFAULTS["heating_limit"], h_0=DEFAULTS["h_0"], gamma_0=DEFAULTS["gamma_0"], v_0=DEFAULTS["v_0"],
+            optimizer="SNOPT", num_segments=DEFAULTS["num_segments"], order=DEFAULTS["order"], transcription=DEFAULTS["transcription"],
+            store_dir=None):
+    # Solves the query exactly, warm started from the interpolated trajectory with its end points
+    # moved onto the boundary conditions; store_dir adds the converged solution to a database
+    from reentry_dymos import build_problem, driver_failed
+
+    case = dict(heating_limit=heating_limit, h_0=h_0, gamma_0=gamma_0, v_0=v_0, num_segments=num_segments, order=order, transcription=transcription)
+    config = solution_config(case)
+    prob, phase0 = build_problem(heating_limit=heating_limit, transcription=transcription, num_segments=num_segments, order=order,
+                                 optimizer=optimizer, check=False)
+    if optimizer == "SNOPT":
+        prob.driver.opt_settings["iSumm"] = 0
+    apply_solution(prob, phase0, result["solution"], boundary=boundary_from_config(config))
+
+    start = time.perf_counter()
+    failed = driver_failed(prob.run_driver())
+    final_theta = float(prob.get_val("traj.phase0.timeseries.states:theta")[-1])
+    if store_dir is not None and not failed:
+        SolutionStore(store_dir, max_entries=sys.maxsize).save(config, extract_solution(prob))
+
+    return({"failed": failed,
+            "final_theta": final_theta,
+            "error": final_theta - result["final_theta"],
+            "function_evaluations": prob.driver.iter_count,
+            "wall_time": time.perf_counter() - start})
+
+def build_database(directory, max_workers=None, optimizer="SNOPT", coloring_dir=None, **axes):
+    # Converged solutions over the grid of axes (see sweep.expand_grid) in a solution store, then
+    # the fitted surrogate saved next to them as surrogate.npz
+    cases = expand_grid(**axes)
+    rows = run_sweep(cases, os.path.join(directory, "database.csv"), max_workers=max_workers, optimizer=optimizer, warm_start_dir=directory,
+                     coloring_dir=coloring_dir, max_entries=sys.maxsize)
+    surrogate = CrossrangeSurrogate.from_store(directory)
+    surrogate.save(os.path.join(directory, "surrogate.npz"))
+    return(surrogate, rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query a surrogate of the optimal crossrange over entry conditions and heating limits.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    build = subparsers.add_parser("build", help="solve a grid of cases into a database directory and fit the surrogate")
+    build.add_argument("directory")
+    build.add_argument("--heating-limit", nargs="+", type=float, default=[60., 70., 80.])
+    build.add_argument("--h0", nargs="+", type=float, default=[DEFAULTS["h_0"]])
+    build.add_argument("--gamma0", nargs="+", type=float, default=[DEFAULTS["gamma_0"]])
+    build.add_argument("--v0", nargs="+", type=float, default=[DEFAULTS["v_0"]])
+    build.add_argument("--segments", type=int, default=DEFAULTS["num_segments"])
+    build.add_argument("--optimizer", default="SNOPT")
+    build.add_argument("--workers", type=int, default=None)
+    build.add_argument("--coloring-dir", default=None)
+
+    query = subparsers.add_parser("query", help="interpolate the optimum for one entry state and heating limit")
+    query.add_argument("directory")
+    query.add_argument("--heating-limit", type=float, default=DEFAULTS["heating_limit"])
+    query.add_argument("--h0", type=float, default=DEFAULTS["h_0"])
+    query.add_argument("--gamma0", type=float, default=DEFAULTS["gamma_0"])
+    query.add_argument("--v0", type=float, default=DEFAULTS["v_0"])
+    query.add_argument("--confirm", action="store_true", help="also solve the query, warm started from the interpolated trajectory")
+    query.add_argument("--repeat", type=int, default=0, help="also time this many crossrange-only queries")
+    query.add_argument("--optimizer", default="SNOPT")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        surrogate, rows = build_database(args.directory, max_workers=args.workers, optimizer=args.optimizer, coloring_dir=args.coloring_dir,
+                                         heating_limit=args.heating_limit, h_0=args.h0, gamma_0=args.gamma0, v_0=args.v0, num_segments=[args.segments])
+        print("%d of %d cases converged; surrogate of %d solutions in %s" % (sum(row["status"] == "converged" for row in rows), len(rows),
+                                                                             surrogate.features.shape[0], args.directory))
+        worst = np.abs(surrogate.loo_errors[:, surrogate.columns["final_theta"]]).max()*180/np.pi
+        print("Largest leave-one-out crossrange error: %.4f deg" % worst)
+        return(0)
+
+    if args.command == "query":
+        surrogate = CrossrangeSurrogate.load(os.path.join(args.directory, "surrogate.npz"))
+        conditions = dict(heating_limit=args.heating_limit, h_0=args.h0, gamma_0=args.gamma0, v_0=args.v0)
+        start = time.perf_counter()
+        result = surrogate.query(**conditions)
+        elapsed = time.perf_counter() - start
+        print("Crossrange %.4f +/- %.4f deg, final time %.1f +/- %.1f s%s (%.1f us)" % (result["final_theta"]*180/np.pi, result["final_theta_uncertainty"]*180/np.pi,
+                                                                                        result["final_time"], result["final_time_uncertainty"],
+                                                                                        ", extrapolated" if result["extrapolated"] else "", elapsed*1e6))
+        if args.repeat > 0:
+            start = time.perf_counter()
+            for i in range(args.repeat):
+                surrogate.crossrange(**conditions)
+            print("crossrange() in %.1f us per query over %d queries" % ((time.perf_counter() - start)/args.repeat*1e6, args.repeat))
+        if args.confirm:
+            step = confirm(result, optimizer=args.optimizer, store_dir=args.directory, **conditions)
+            print("Solve %s: crossrange %.4f deg (surrogate error %.4f deg) in %d function evaluations, %.1f s"
+                  % ("failed" if step["failed"] else "converged", step["final_theta"]*180/np.pi, step["error"]*180/np.pi, step["function_evaluations"], step["wall_time"]))
+        return(0)
+
+    parser.print_help()
+    return(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
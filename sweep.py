@@ -0,0 +1,183 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+PARAMETERS = ["heating_limit", "h_0", "gamma_0", "v_0", "num_segments", "order", "transcription"]
+RESULTS = ["status", "final_time", "final_theta", "function_evaluations", "wall_time", "warm_started", "error"]
+
+DEFAULTS = {"heating_limit": 70.,
+            "h_0": 260000.,
+            "gamma_0": -1.,
+            "v_0": 25600.,
+            "num_segments": 50,
+            "order": 3,
+            "transcription": "radau"}
+
+def expand_grid(**axes):
+    # Cartesian product of the given parameter values, with DEFAULTS filling the rest
+    names = [name for name in PARAMETERS if name in axes]
+    cases = []
+    for values in itertools.product(*[axes[name] for name in names]):
+        case = dict(DEFAULTS)
+        case.update(zip(names, values))
+        cases.append(case)
+    return(cases)
+
+def solution_config(case):
+    # Configuration used to key warm-start solutions; angles in radians as in the phase
+    return({"heating_limit": float(case["heating_limit"]),
+            "h_0": float(case["h_0"]), "h_f": 80000.,
+            "gamma_0": case["gamma_0"]*np.pi/180, "gamma_f": -5*np.pi/180,
+            "v_0": float(case["v_0"]), "v_f": 2500.,
+            "transcription": case["transcription"],
+            "num_segments": int(case["num_segments"]),
+            "order": int(case["order"])})
+
+def run_case(case, optimizer="SNOPT", warm_start_dir=None, coloring_dir=None, max_entries=200):
+    # Build, solve and summarize one case; failures are reported in the row instead of raised so
+    # that a single bad case cannot take down the sweep. gamma_0 is given in degrees.
+    row = dict(case)
+    row["warm_started"] = False
+    start = time.perf_counter()
+    try:
+        from reentry_dymos import build_problem, driver_failed, set_initial_guess
+        from warm_start import SolutionStore, apply_solution, boundary_from_config, extract_solution
+
+        prob, phase0 = build_problem(heating_limit=case["heating_limit"], transcription=case["transcription"],
+                                     num_segments=int(case["num_segments"]), order=int(case["order"]),
+                                     optimizer=optimizer, check=False, coloring_dir=coloring_dir)
+        if optimizer == "SNOPT":
+            prob.driver.opt_settings["iSumm"] = 0
+        config = solution_config(case)
+        store = SolutionStore(warm_start_dir, max_entries) if warm_start_dir else None
+        stored = store.nearest(config) if store is not None else None
+        if stored is not None:
+            apply_solution(prob, phase0, stored[1], boundary=boundary_from_config(config))
+            row["warm_started"] = True
+        else:
+            set_initial_guess(prob, phase0, h_0=config["h_0"], gamma_0=config["gamma_0"], v_0=config["v_0"])
+
+        failed = driver_failed(prob.run_driver())
+        if store is not None and not failed:
+            store.save(config, extract_solution(prob))
+
+        row["status"] = "failed" if failed else "converged"
+        row["final_time"] = float(prob.get_val("traj.phase0.timeseries.time")[-1])
+        row["final_theta"] = float(prob.get_val("traj.phase0.timeseries.states:theta")[-1])
+        row["function_evaluations"] = prob.driver.iter_count
+        row["error"] = ""
+    except Exception:
+        row["status"] = "error"
+        row["final_time"] = row["final_theta"] = np.nan
+        row["function_evaluations"] = 0
+        row["error"] = traceback.format_exc().strip().splitlines()[-1]
+    row["wall_time"] = time.perf_counter() - start
+
+    return(row)
+
+# Per-task flags set by the pool workers when a task starts (see run_tasks)
+_STARTED = None
+
+def _init_worker(started):
+    global _STARTED
+    _STARTED = started
+
+def _run_task(index, function, args):
+    _STARTED[index] = 1
+    return(function(*args))
+
+def run_tasks(function, tasks, max_workers=None):
+    # Runs function(*args) for every args in tasks on a process pool and yields
+    # (index, result, error) as they finish, error being None unless the task could not return.
+    # A worker process that dies (e.g. a crash inside the optimizer) breaks the whole pool: the
+    # tasks that had not started are resubmitted on a fresh pool and the ones that had are rerun
+    # one per pool, so that only the task that crashes on its own is reported as failed.
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    batches = [(list(range(len(tasks))), max_workers)]
+    while batches:
+        indices, workers = batches.pop(0)
+        started = multiprocessing.RawArray("b", len(tasks))
+        broken = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(indices)), initializer=_init_worker, initargs=(started,)) as executor:
+            futures = dict((executor.submit(_run_task, index, function, tasks[index]), index) for index in indices)
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except BrokenProcessPool as err:
+                    broken.append((futures[future], err))
+                    continue
+                except Exception as err:
+                    yield(futures[future], None, err)
+                    continue
+                yield(futures[future], result, None)
+
+        suspects = [(index, err) for index, err in broken if started[index]]
+        if not suspects:
+            # the pool broke before any of them started, and would again
+            for index, err in broken:
+                yield(index, None, err)
+            continue
+        if len(suspects) == 1:
+            yield(suspects[0][0], None, suspects[0][1])
+        else:
+            batches.extend(([index], 1) for index, err in suspects)
+        if len(broken) > len(suspects):
+            batches.append(([index for index, err in broken if not started[index]], workers))
+
+def run_sweep(cases, filename, max_workers=None, optimizer="SNOPT", warm_start_dir=None, coloring_dir=None, max_entries=200):
+    # Runs the cases on a process pool (one Problem per case, built inside the worker) and appends
+    # each row to the CSV file as soon as its case finishes
+    rows = []
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PARAMETERS + RESULTS)
+        writer.writeheader()
+        f.flush()
+
+        tasks = [(case, optimizer, warm_start_dir, coloring_dir, max_entries) for case in cases]
+        for index, row, err in run_tasks(run_case, tasks, max_workers):
+            if err is not None:
+                # the worker process itself died, e.g. a crash inside the optimizer
+                row = dict(cases[index], status="error", final_time=np.nan, final_theta=np.nan,
+                           function_evaluations=0, wall_time=np.nan, warm_started=False, error=repr(err))
+            writer.writerow(row)
+            f.flush()
+            rows.append(row)
+
+    return(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the reentry optimization over a grid of parameters on a process pool.")
+    parser.add_argument("--heating-limit", nargs="+", type=float, default=[DEFAULTS["heating_limit"]], help="q path constraint upper bound (Btu/ft**2/s)")
+    parser.add_argument("--h0", nargs="+", type=float, default=[DEFAULTS["h_0"]], help="entry altitude (ft)")
+    parser.add_argument("--gamma0", nargs="+", type=float, default=[DEFAULTS["gamma_0"]], help="entry flight path angle (deg)")
+    parser.add_argument("--v0", nargs="+", type=float, default=[DEFAULTS["v_0"]], help="entry velocity (ft/s)")
+    parser.add_argument("--segments", nargs="+", type=int, default=[DEFAULTS["num_segments"]])
+    parser.add_argument("--order", nargs="+", type=int, default=[DEFAULTS["order"]])
+    parser.add_argument("--transcription", nargs="+", choices=["radau", "gauss-lobatto"], default=[DEFAULTS["transcription"]])
+    parser.add_argument("--optimizer", default="SNOPT")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="sweep_results.csv")
+    parser.add_argument("--warm-start-dir", default=None, help="solution store used to seed and collect initial guesses")
+    parser.add_argument("--coloring-dir", default=None, help="total coloring cache shared by the workers")
+    args = parser.parse_args(argv)
+
+    cases = expand_grid(heating_limit=args.heating_limit, h_0=args.h0, gamma_0=args.gamma0, v_0=args.v0,
+                        num_segments=args.segments, order=args.order, transcription=args.transcription)
+    print("Running %d cases" % len(cases))
+    rows = run_sweep(cases, args.out, max_workers=args.workers, optimizer=args.optimizer, warm_start_dir=args.warm_start_dir,
+                     coloring_dir=args.coloring_dir)
+    print("%d converged, %d failed, %d errors; results in %s" % (sum(row["status"] == "converged" for row in rows),
+                                                                  sum(row["status"] == "failed" for row in rows),
+                                                                  sum(row["status"] == "error" for row in rows), args.out))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import importlib.util
+import unittest
+import numpy as np
+from openmdao.api import Problem, ExecComp, ScipyOptimizeDriver
+from autoscaling import set_bound, total_jacobian, condition_number, guess_range
+
+HAVE_DYMOS = importlib.util.find_spec("dymos") is not None
+
+# Condition numbers (hand-tuned, automatic) of the table in README.md, at order 3
+README_CONDITIONS = {("radau", 20): (1.6e4, 8.5e2),
+                     ("radau", 50): (1.7e6, 1.1e5),
+                     ("gauss-lobatto", 20): (1.7e5, 1.2e3),
+                     ("gauss-lobatto", 50): (7.3e4, 7.3e2)}
+
+class TestAutoscaling(unittest.TestCase):
+
+    def test_jacobian_scaling(self):
+        prob = Problem()
+        prob.model.add_subsystem("comp", ExecComp(["c = 1000*x - y", "d = x + y", "f = x**2"], x=np.ones(3), y=np.ones(3), c=np.ones(3), d=np.ones(3), f=np.ones(3)),
+                                 promotes=["*"])
+        prob.model.add_design_var("x", ref0=1., ref=11.)
+        prob.model.add_design_var("y", ref=2.)
+        prob.model.add_constraint("c", equals=0., ref=100.)
+        prob.model.add_constraint("d", upper=5.)
+        prob.model.add_objective("f", index=0)
+        prob.driver = ScipyOptimizeDriver()
+        prob.setup()
+        prob.run_model()
+
+        totals = total_jacobian(prob)
+        unscaled = total_jacobian(prob, driver_scaling=False)
+        name = dict((key.rsplit(".", 1)[-1], key) for key in list(totals) + list(totals[list(totals)[0]]))
+        np.testing.assert_allclose(unscaled[name["c"]][name["x"]], 1000*np.eye(3))
+        np.testing.assert_allclose(unscaled[name["c"]][name["y"]], -np.eye(3))
+        np.testing.assert_allclose(totals[name["c"]][name["x"]], 1000*10/100*np.eye(3))
+        np.testing.assert_allclose(totals[name["c"]][name["y"]], -2/100*np.eye(3))
+
+        # only the equality constraint enters the condition number: rows of [100 I, -0.02 I]
+        self.assertAlmostEqual(condition_number(prob), 1., places=12)
+
+    def test_set_bound(self):
+        # a bound changed on a set-up driver is the one the next run_driver enforces, scaled or not
+        for ref in (None, 10.):
+            prob = Problem()
+            prob.model.add_subsystem("comp", ExecComp(["f = (x - 3)**2", "c = x"]), promotes=["*"])
+            prob.model.add_design_var("x", lower=-10, upper=10, ref=ref)
+            prob.model.add_constraint("c", upper=2., ref=ref)
+            prob.model.add_objective("f")
+            prob.driver = ScipyOptimizeDriver(optimizer="SLSQP", tol=1e-9, disp=False)
+            prob.setup()
+            prob.run_driver()
+            np.testing.assert_allclose(prob.get_val("x"), 2., atol=1e-6)
+
+            # constraints are keyed by absolute name on older versions
+            name = [name for name in prob.driver._cons if name.endswith("c")][0]
+            set_bound(prob.driver, name, "upper", 1.)
+            set_bound(prob.driver, "x", "lower", -5.)
+            prob.run_driver()
+            np.testing.assert_allclose(prob.get_val("x"), 1., atol=1e-6)
+
+            autoscaler = getattr(prob.driver, "_autoscaler", None)
+            if hasattr(autoscaler, "get_bounds_scaling"):
+                # the scaled bounds the autoscaler caches for pyOptSparseDriver
+                scale = 1./ref if ref else 1.
+                np.testing.assert_allclose(autoscaler.get_bounds_scaling("constraint")[name].upper, scale)
+                np.testing.assert_allclose(autoscaler.get_bounds_scaling("design_var")["x"].lower, -5*scale)
+
+    def test_guess_range(self):
+        self.assertEqual(guess_range(np.array([2500., 25600., 10000.])), (2500., 25600.))
+        self.assertEqual(guess_range(np.full(5, -.3)), (0., .3))
+        self.assertEqual(guess_range(np.zeros(5)), (0., 1.))
+
+@unittest.skipUnless(HAVE_DYMOS, "dymos is not installed")
+class TestAutoscalePhase(unittest.TestCase):
+
+    def test_autoscaling_improves_conditioning(self):
+        from autoscaling import autoscale
+
+        for transcription in ("radau", "gauss-lobatto"):
+            p, phase0, scaling, conditions = autoscale(transcription=transcription, num_segments=10, driver=ScipyOptimizeDriver())
+            self.assertLess(conditions["after"], conditions["before"]/10)
+
+            # the guess spans the scaled range of the states
+            self.assertEqual((scaling["states"]["h"]["ref0"], scaling["states"]["h"]["ref"]), (80000, 260000))
+            self.assertEqual(scaling["time"]["duration_ref"], 2000)
+            self.assertLess(scaling["objective"]["ref"], 0)
+            h = p.get_val("traj.phase0.states:h", units="ft")
+            np.testing.assert_allclose([h.min(), h.max()], [80000, 260000])
+
+    def test_readme_condition_numbers(self):
+        from autoscaling import autoscale
+
+        for (transcription, num_segments), expected in README_CONDITIONS.items():
+            conditions = autoscale(transcription=transcription, num_segments=num_segments, driver=ScipyOptimizeDriver())[3]
+            np.testing.assert_allclose([conditions["before"], conditions["after"]], expected, rtol=.05, err_msg="%s %d" % (transcription, num_segments))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import inspect
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from openmdao.api import Problem, ExecComp
+import benchmark_matrix
+from benchmark_matrix import available_optimizers, make_driver, count_gradients, expand_matrix, reaches_reference, fastest, run_matrix, REFERENCE
+
+def crashing_case(case, *args):
+    # Stands in for a crash inside the optimizer, which takes the worker process down with it
+    if case["transcription"] == "gauss-lobatto" and case["num_segments"] == 20:
+        os._exit(1)
+    return(dict(case, status="converged", reference=True, final_time=2000., final_theta=.5, function_evaluations=1, gradient_evaluations=1,
+                ode_evaluations=1, ode_jacobian_evaluations=1, wall_time=0., cpu_time=0., error=""))
+
+class TestBenchmarkMatrix(unittest.TestCase):
+
+    def test_scipy_fallback_counts_evaluations(self):
+        optimizers = available_optimizers()
+        self.assertIn("SLSQP", optimizers)
+
+        prob = Problem()
+        prob.model.add_subsystem("paraboloid", ExecComp("f = (x - 3)**2 + x*y + (y + 4)**2 - 3"), promotes=["*"])
+        prob.model.add_design_var("x", lower=-50, upper=50)
+        prob.model.add_design_var("y", lower=-50, upper=50)
+        prob.model.add_objective("f")
+        prob.driver = make_driver("SLSQP", "scipy", maxiter=100, tol=1e-9)
+        prob.setup()
+        count_gradients(prob.driver)
+
+        # the fail flag of ScipyOptimizeDriver, whatever run_driver returns on the installed OpenMDAO
+        prob.run_driver()
+        self.assertFalse(prob.driver.fail)
+        np.testing.assert_allclose(prob.get_val("x"), 20/3, rtol=1e-5)
+        np.testing.assert_allclose(prob.get_val("y"), -22/3, rtol=1e-5)
+        self.assertGreater(prob.driver.num_gradients, 1)
+        self.assertGreaterEqual(prob.driver.iter_count, prob.driver.num_gradients)
+
+        # the evaluations of the dynamic coloring are not counted, and a second run from the same
+        # start counts the same
+        num_gradients = []
+        for colored in (False, True):
+            prob = Problem()
+            prob.model.add_subsystem("f", ExecComp("f = sum((x - 3)**2)", x=np.zeros(10)), promotes=["*"])
+            prob.model.add_subsystem("c", ExecComp("c = x*y", x=np.zeros(10), y=np.zeros(10), c=np.zeros(10), has_diag_partials=True), promotes=["*"])
+            prob.model.add_design_var("x", lower=-50, upper=50)
+            prob.model.add_design_var("y", lower=-50, upper=50)
+            prob.model.add_objective("f")
+            prob.model.add_constraint("c", lower=1.)
+            prob.driver = make_driver("SLSQP", "scipy", maxiter=100, tol=1e-9)
+            if colored:
+                # scaled, where OpenMDAO has the option, so the coloring goes through driver._compute_totals
+                if "use_scaling" in inspect.signature(prob.driver.declare_coloring).parameters:
+                    prob.driver.declare_coloring(use_scaling=True)
+                else:
+                    prob.driver.declare_coloring()
+            prob.setup()
+            count_gradients(prob.driver)
+            for run in range(2):
+                prob.set_val("x", np.zeros(10))
+                prob.set_val("y", np.zeros(10))
+                prob.driver.num_gradients = 0
+                prob.run_driver()
+                num_gradients.append(prob.driver.num_gradients)
+        self.assertEqual(num_gradients, 4*num_gradients[:1])
+
+    def test_matrix_and_selection(self):
+        cases = expand_matrix({"SLSQP": "scipy", "IPOPT": "pyoptsparse"}, ["radau", "gauss-lobatto"], [20, 50], [3])
+        self.assertEqual(len(cases), 8)
+        self.assertEqual(cases[0], {"optimizer": "IPOPT", "backend": "pyoptsparse", "transcription": "radau", "num_segments": 20, "order": 3})
+
+        self.assertTrue(reaches_reference(2181.90371131, .53440626))
+        self.assertTrue(reaches_reference(2181.88191719, .53440955))
+        self.assertFalse(reaches_reference(REFERENCE["final_time"], .52))
+
+        rows = [{"reference": True, "wall_time": 30.}, {"reference": False, "wall_time": 10.}, {"reference": True, "wall_time": 20.}]
+        self.assertIs(fastest(rows), rows[2])
+        self.assertIsNone(fastest(rows[1:2]))
+
+    def test_matrix_survives_a_crashed_case(self):
+        cases = expand_matrix({"SLSQP": "scipy"}, ["radau", "gauss-lobatto"], [10, 20, 30], [3])
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.object(benchmark_matrix, "run_case", crashing_case):
+                rows = run_matrix(cases, os.path.join(directory, "matrix.csv"), out_stream=None)
+            with open(os.path.join(directory, "matrix.csv")) as f:
+                self.assertEqual(len(f.readlines()), 7)
+        statuses = dict(((row["transcription"], row["num_segments"]), row["status"]) for row in rows)
+        self.assertEqual(statuses.pop(("gauss-lobatto", 20)), "error")
+        self.assertEqual(set(statuses.values()), {"converged"})
+        self.assertEqual(len(statuses), 5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from benchmark_ode import find_regressions, thread_speedups, save_baseline, load_baseline, main
+
+def stats(compute, partials):
+    return({"compute_ns_per_node": compute, "partials_ns_per_node": partials})
+
+class TestBenchmarkODE(unittest.TestCase):
+
+    def test_find_regressions(self):
+        baseline = {"results": {"ShuttleODE": {"10": stats(100., 200.), "100": stats(50., 80.)}}}
+        results = {"ShuttleODE": {"10": stats(130., 210.), "100": stats(60., 80.), "1000": stats(500., 500.)},
+                   "ShuttleODEFused": {"10": stats(900., 900.)}}
+        # 130 is over 25% slower, 210 and 60 are within it, and the cases missing from the baseline are skipped
+        self.assertEqual(find_regressions(results, baseline), [("ShuttleODE", 10, "compute_ns_per_node", 100., 130.)])
+        self.assertEqual(find_regressions(results, baseline, threshold=.1), [("ShuttleODE", 10, "compute_ns_per_node", 100., 130.),
+                                                                            ("ShuttleODE", 100, "compute_ns_per_node", 50., 60.)])
+
+    def test_thread_speedups(self):
+        results_by_threads = {1: {"ShuttleODE": {"100": stats(100., 200.)}},
+                              4: {"ShuttleODE[threads=4]": {"100": stats(25., 100.)}},
+                              2: {"ShuttleODE[threads=2]": {"100": stats(50., 200.)}}}
+        self.assertEqual(thread_speedups(results_by_threads), [{"system": "ShuttleODE", "nodes": 100, 2: (2., 1.), 4: (4., 2.)}])
+
+    def test_baseline_round_trip(self):
+        results = {"Atmosphere": {"10": stats(12.5, 30.)}}
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "baseline.json")
+            save_baseline(results, filename)
+            baseline = load_baseline(filename)
+        self.assertEqual(baseline["results"], results)
+        self.assertEqual(find_regressions(results, baseline), [])
+        self.assertIn("cpu_count", baseline)
+
+    def test_compare_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()) as out:
+            filename = os.path.join(directory, "baseline.json")
+            self.assertEqual(main(["--systems", "Atmosphere", "--nodes", "2", "--save", filename]), 0)
+            baseline = load_baseline(filename)
+            self.assertEqual(list(baseline["results"]["Atmosphere"]), ["2"])
+
+            # a baseline a thousand times faster than any machine flags both timings
+            for case in baseline["results"]["Atmosphere"].values():
+                for key in case:
+                    case[key] /= 1000.
+            save_baseline(baseline["results"], filename)
+            self.assertEqual(main(["--systems", "Atmosphere", "--nodes", "2", "--compare", filename]), 1)
+        self.assertEqual(out.getvalue().count("REGRESSION Atmosphere nodes=2"), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import inspect
+import os
+import tempfile
+import unittest
+import numpy as np
+from openmdao.api import Problem, ExecComp, ScipyOptimizeDriver
+from checkpoint import Checkpointer, read_checkpoint, restore
+
+def paraboloid(size=1):
+    prob = Problem()
+    prob.model.add_subsystem("paraboloid", ExecComp("f = sum((x - 3)**2 + x*y + (y + 4)**2 - 3)", x=np.zeros(size), y=np.zeros(size)), promotes=["*"])
+    prob.model.add_design_var("x", lower=-50, upper=50)
+    prob.model.add_design_var("y", lower=-50, upper=50)
+    prob.model.add_objective("f")
+    prob.driver = ScipyOptimizeDriver(optimizer="SLSQP", tol=1e-9, disp=False)
+    return(prob)
+
+def sparse(colored, size=10):
+    # Diagonal constraints that make the dynamic total coloring worth keeping
+    prob = Problem()
+    prob.model.add_subsystem("f", ExecComp("f = sum((x - 3)**2)", x=np.zeros(size)), promotes=["*"])
+    prob.model.add_subsystem("c", ExecComp("c = x*y", x=np.zeros(size), y=np.zeros(size), c=np.zeros(size), has_diag_partials=True), promotes=["*"])
+    prob.model.add_subsystem("g", ExecComp("g = y**2 + x", x=np.zeros(size), y=np.zeros(size), g=np.zeros(size), has_diag_partials=True), promotes=["*"])
+    prob.model.add_design_var("x", lower=-50, upper=50)
+    prob.model.add_design_var("y", lower=-50, upper=50)
+    prob.model.add_objective("f")
+    prob.model.add_constraint("c", lower=1.)
+    prob.model.add_constraint("g", upper=30.)
+    prob.driver = ScipyOptimizeDriver(optimizer="SLSQP", tol=1e-9, disp=False)
+    if colored:
+        # scaled, where OpenMDAO has the option, so the coloring goes through driver._compute_totals
+        if "use_scaling" in inspect.signature(prob.driver.declare_coloring).parameters:
+            prob.driver.declare_coloring(use_scaling=True)
+        else:
+            prob.driver.declare_coloring()
+    return(prob)
+
+class TestCheckpoint(unittest.TestCase):
+
+    def test_checkpoint_and_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "run.ckpt.npz")
+            prob = paraboloid()
+            checkpointer = Checkpointer(filename, every=2, variables=["x", "y"], metadata={"case": "paraboloid"})
+            prob.driver.add_recorder(checkpointer)
+            prob.setup()
+            prob.run_driver()
+
+            self.assertGreater(checkpointer.num_checkpoints, 0)
+            self.assertEqual(checkpointer.num_checkpoints, checkpointer.num_majors//2)
+            self.assertEqual(os.listdir(directory), ["run.ckpt.npz"])
+            values, metadata = read_checkpoint(filename)
+            self.assertEqual(sorted(values), ["x", "y"])
+            self.assertEqual(metadata["case"], "paraboloid")
+            self.assertEqual(metadata["major_iterations"], 2*checkpointer.num_checkpoints)
+            self.assertEqual(metadata["optimizer"], "SLSQP")
+
+            # a fresh problem continues from the checkpointed iterate
+            resumed = paraboloid()
+            resumed.setup()
+            self.assertEqual(restore(resumed, filename)["case"], "paraboloid")
+            np.testing.assert_array_equal(resumed.get_val("x"), values["x"])
+            resumed.run_driver()
+            np.testing.assert_allclose(resumed.get_val("x"), 20/3, rtol=1e-5)
+            np.testing.assert_allclose(resumed.get_val("y"), -22/3, rtol=1e-5)
+            self.assertLess(resumed.driver.iter_count, prob.driver.iter_count)
+
+            other = paraboloid(size=2)
+            other.setup()
+            with self.assertRaises(ValueError):
+                restore(other, filename)
+
+    def test_coloring_is_not_counted(self):
+        # the total derivatives the dynamic coloring evaluates before the optimizer starts are
+        # neither major iterations nor checkpoints
+        with tempfile.TemporaryDirectory() as directory:
+            majors = []
+            for colored in (False, True):
+                prob = sparse(colored)
+                checkpointer = Checkpointer(os.path.join(directory, "run.ckpt.npz"), every=1, variables=["x", "y"])
+                prob.driver.add_recorder(checkpointer)
+                prob.setup()
+                prob.run_driver()
+                majors.append((checkpointer.num_majors, checkpointer.num_checkpoints))
+            self.assertEqual(majors[1], majors[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+HAVE_DYMOS = importlib.util.find_spec("dymos") is not None
+
+@unittest.skipUnless(HAVE_DYMOS, "dymos is not installed")
+class TestColoringCache(unittest.TestCase):
+
+    def test_coloring_reused_for_same_structure(self):
+        from openmdao.api import ScipyOptimizeDriver
+        from reentry_dymos import build_problem
+        from coloring_cache import coloring_key
+        from shuttle_ode import ShuttleODE
+
+        config = {"transcription": "radau", "num_segments": 10, "order": 3}
+        self.assertEqual(coloring_key(config, ShuttleODE), coloring_key(dict(config), ShuttleODE))
+        self.assertNotEqual(coloring_key(config, ShuttleODE), coloring_key(dict(config, num_segments=11), ShuttleODE))
+
+        with tempfile.TemporaryDirectory() as directory:
+            colorings = []
+            for num_segments, heating_limit in ((10, 70), (10, 60), (10, None), (11, 70)):
+                p, phase0 = build_problem(heating_limit=heating_limit, num_segments=num_segments, check=False, coloring_dir=directory,
+                                          driver=ScipyOptimizeDriver())
+                p.final_setup()
+                colorings.append(sorted(os.listdir(directory)))
+
+            # the heating limit value does not change the structure, removing the constraint does
+            self.assertEqual(len(colorings[0]), 1)
+            self.assertEqual(colorings[1], colorings[0])
+            self.assertEqual(len(colorings[2]), 2)
+            self.assertEqual(len(colorings[3]), 3)
+
+if __name__ == "__main__":
+    unittest.main()
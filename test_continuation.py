@@ -0,0 +1,61 @@
+import unittest
+from unittest import mock
+import continuation
+
+class FakeProblem(object):
+
+    def __init__(self):
+        self.runs = 0
+
+    def run_model(self):
+        self.runs += 1
+
+class TestContinuation(unittest.TestCase):
+
+    def run_continuation(self, max_step, **options):
+        # Stand-in solves: unconstrained peak q of 100, and any step larger than max_step fails;
+        # returns the problem, the history, the number of builds and the bounds set back
+        limits = []
+        builds = []
+        restored = []
+
+        def build_step_problem(heating_limit=70., optimizer="SNOPT", **options):
+            builds.append(heating_limit)
+            return(FakeProblem(), None)
+
+        def solve_step(prob, phase0, heating_limit, solution=None):
+            previous = limits[-1] if limits else None
+            failed = previous is not None and heating_limit is not None and previous - heating_limit > max_step
+            if not failed:
+                limits.append(100. if heating_limit is None else heating_limit)
+            return({"heating_limit": heating_limit, "failed": failed, "function_evaluations": 1, "wall_time": 0.,
+                    "final_theta": 0., "peak_q": 100. if heating_limit is None else heating_limit})
+
+        with mock.patch.object(continuation, "build_step_problem", build_step_problem), mock.patch.object(continuation, "solve_step", solve_step), \
+             mock.patch.object(continuation, "set_heating_limit", lambda prob, heating_limit: restored.append(heating_limit)), \
+             mock.patch.object(continuation, "apply_solution", lambda prob, phase0, solution: None), \
+             mock.patch.object(continuation, "extract_solution", lambda prob: {}):
+            prob, phase0, history = continuation.continuation(out_stream=None, **options)
+        return(prob, history, builds, restored)
+
+    def test_step_adaptation(self):
+        prob, history, builds, restored = self.run_continuation(12., heating_limit=60., num_steps=2)
+
+        # 80 fails and is retried at half the step; every accepted step lets the next one grow by 1.5
+        self.assertEqual([(step["heating_limit"], step["failed"]) for step in history],
+                         [(None, False), (80., True), (90., False), (75., True), (82.5, False), (71.25, False), (60., False)])
+        # one problem for the whole schedule, left at the last step
+        self.assertEqual(builds, [60.])
+        self.assertEqual((restored, prob.runs), ([], 0))
+
+    def test_gives_up_at_the_last_converged_step(self):
+        prob, history, builds, restored = self.run_continuation(3., heating_limit=60., num_steps=4, min_step=2.)
+
+        self.assertEqual([(step["heating_limit"], step["failed"]) for step in history],
+                         [(None, False), (90., True), (95., True), (97.5, False), (93.75, True)])
+        self.assertEqual(builds, [60.])
+        # the failed trial is undone: the bound and the solution of the 97.5 step are set back
+        self.assertEqual((restored, prob.runs), ([97.5], 1))
+
+if __name__ == "__main__":
+    unittest.main()
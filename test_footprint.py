@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from footprint import boundary_directions, split_arcs, generate_footprint, footprint_polygon, polygon_area, write_footprint, format_summary
+
+class EllipseProblem(object):
+
+    # Stands in for DirectionalProblem: the support points of an ellipse, fewer evaluations when
+    # warm started, a failure at one direction and a crash of the worker process at another
+
+    def __init__(self, fail=None, crash=None, **options):
+        self.fail = fail
+        self.crash = crash
+        self.pid = os.getpid()
+
+    def solve(self, direction, solution=None):
+        if direction == self.crash:
+            os._exit(1)
+        a = direction*np.pi/180
+        norm = np.hypot(20*np.cos(a), 10*np.sin(a))
+        row = {"status": "failed" if direction == self.fail else "converged", "phi_f": 40 + 400*np.cos(a)/norm, "theta_f": 100*np.sin(a)/norm,
+               "final_time": 2000., "function_evaluations": 50 if solution is None else 10}
+        return(row, None if row["status"] == "failed" else {"direction": direction, "pid": self.pid})
+
+class TestFootprint(unittest.TestCase):
+
+    def test_directions_and_arcs(self):
+        directions = boundary_directions(8)
+        np.testing.assert_allclose(directions, [90, 135, 180, 225, 270, 315, 0, 45])
+        arcs = split_arcs(directions, 3)
+        self.assertEqual(arcs, [[90, 135, 180], [225, 270, 315], [0, 45]])
+        self.assertEqual(len(split_arcs(directions, 20)), 8)
+
+    def test_marches_from_converged_neighbors(self):
+        rows, solutions = generate_footprint(8, num_arcs=2, max_workers=2, problem_class=EllipseProblem, fail=270.)
+        self.assertEqual([row["direction"] for row in rows], [0, 45, 90, 135, 180, 225, 270, 315])
+        warm_start = dict((row["direction"], row["warm_start"]) for row in rows)
+        self.assertEqual([warm_start[direction] for direction in (90, 135, 180, 225)], ["", 90., 135., 180.])
+        # the failed point is skipped over: 315 starts from the default guess like 270 did, 0 from 315
+        self.assertEqual([warm_start[direction] for direction in (270, 315, 0, 45)], ["", "", 315., 0.])
+        self.assertEqual(sorted(solutions), [0, 45, 90, 135, 180, 225, 315])
+        # one problem per arc
+        self.assertEqual(len(set(solution["pid"] for direction, solution in solutions.items() if direction in (90, 135, 180, 225))), 1)
+
+        polygon = footprint_polygon(rows)
+        self.assertEqual(polygon.shape, (7, 2))
+        self.assertAlmostEqual(polygon[2, 0], 40.)
+        self.assertAlmostEqual(polygon[2, 1], 10.)
+        self.assertIn("7 of 8 points converged", format_summary(rows))
+
+        cold_rows = generate_footprint(8, max_workers=2, seed={"direction": 90.}, cold=True, problem_class=EllipseProblem)[0]
+        self.assertTrue(all(row["warm_start"] == "" and row["function_evaluations"] == 50 for row in cold_rows))
+        self.assertEqual(len(set(row["arc"] for row in cold_rows)), 8)
+
+        tmp = tempfile.mkdtemp()
+        try:
+            write_footprint(rows, os.path.join(tmp, "footprint.csv"))
+            with open(os.path.join(tmp, "footprint.csv")) as f:
+                self.assertEqual(len(f.readlines()), 9)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_crashed_arc_fails_only_its_points(self):
+        rows = generate_footprint(8, num_arcs=2, max_workers=1, problem_class=EllipseProblem, crash=270.)[0]
+        self.assertEqual([row["direction"] for row in rows], [0, 45, 90, 135, 180, 225, 270, 315])
+        self.assertEqual(sorted(row["direction"] for row in rows if row["status"] == "error"), [0, 45, 270, 315])
+        self.assertEqual(sorted(row["direction"] for row in rows if row["status"] == "converged"), [90, 135, 180, 225])
+
+        cold_rows = generate_footprint(8, max_workers=2, cold=True, problem_class=EllipseProblem, crash=270.)[0]
+        self.assertEqual([row["direction"] for row in cold_rows if row["status"] == "error"], [270])
+
+    def test_polygon_area(self):
+        directions = boundary_directions(360)
+        rows = [{"direction": d, "status": "converged", "phi_f": 3*np.cos(d*np.pi/180), "theta_f": 3*np.sin(d*np.pi/180)} for d in directions[::-1]]
+        rows.append({"direction": 1.5, "status": "failed", "phi_f": np.nan, "theta_f": np.nan})
+        polygon = footprint_polygon(rows)
+        self.assertEqual(len(polygon), 360)
+        self.assertAlmostEqual(polygon_area(polygon), 9*np.pi, delta=.01)
+
+if __name__ == "__main__":
+    unittest.main()
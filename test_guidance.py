@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from openmdao.api import Problem, Group, ExecComp, ScipyOptimizeDriver
+from guidance import select_mesh, truncate_plan, linear_plan, latency_percentiles, equality_violation, PlanTracker, TERMINAL
+from warm_start import STATES, blend_boundary
+from test_validator import consistent_solution
+
+class TestGuidance(unittest.TestCase):
+
+    def test_mesh_shrinks_with_horizon(self):
+        schedule = [(1000., 20), (400., 10), (0., 5)]
+        self.assertEqual([select_mesh(schedule, horizon) for horizon in (1800., 1000., 700., 50.)], [20, 20, 10, 5])
+
+    def test_shifted_plan_starts_at_state(self):
+        solution = consistent_solution(51)
+        t = 333.
+        shifted = truncate_plan(solution, t)
+        self.assertEqual(shifted["time"][0], t)
+        self.assertEqual(shifted["time"][-1], solution["time"][-1])
+        self.assertTrue(np.all(np.diff(shifted["time"]) > 0))
+
+        state = dict((name, shifted[name][0]*1.01) for name in STATES)
+        boundary = dict((name, (state[name], TERMINAL.get(name, shifted[name][-1]))) for name in STATES)
+        blended = blend_boundary(shifted, boundary)
+        for name in STATES:
+            self.assertAlmostEqual(blended[name][0], state[name])
+            self.assertAlmostEqual(blended[name][-1], boundary[name][1])
+
+        plan = linear_plan(state, t, 900.)
+        self.assertEqual(plan["time"].tolist(), [t, t + 900.])
+        self.assertEqual(plan["v"][-1], TERMINAL["v"])
+        self.assertEqual(plan["theta"][-1], state["theta"])
+
+    def test_latency_percentiles(self):
+        stats = latency_percentiles(np.arange(1, 101)*1e-3)
+        self.assertAlmostEqual(stats["p50"], .0505)
+        self.assertAlmostEqual(stats["max"], .1)
+
+    def test_tracker_keeps_best_feasible_iterate(self):
+        # minimize x**2 + y**2 on x + y = 1: the tracker keeps the lowest objective among iterates
+        # that satisfy the equality constraint and flags the driver once the deadline has passed
+        p = Problem(model=Group())
+        p.model.add_subsystem("f", ExecComp(["obj = x**2 + y**2", "con = x + y - 1"]), promotes=["*"])
+        p.model.add_design_var("x", lower=-10, upper=10)
+        p.model.add_design_var("y", lower=-10, upper=10)
+        p.model.add_objective("obj")
+        p.model.add_constraint("con", equals=0.)
+        p.driver = ScipyOptimizeDriver(optimizer="SLSQP", disp=False)
+
+        tracker = PlanTracker(lambda driver: equality_violation(driver) <= 1e-8, lambda: {"x": float(p.get_val("x")[0])})
+        p.driver.add_recorder(tracker)
+        p.setup()
+        p.set_val("x", 3.)
+        p.set_val("y", -2.)
+
+        tracker.reset(deadline=0.)
+        p.run_driver()
+        self.assertTrue(tracker.timed_out)
+        self.assertTrue(p.driver._user_termination_flag)
+        self.assertGreater(tracker.num_evaluations, 1)
+        self.assertAlmostEqual(tracker.best["x"], .5, places=6)
+        self.assertAlmostEqual(tracker.best_objective, .5, places=6)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+from hessian import ODE_INPUTS, ODE_OUTPUTS, ode_derivatives, lagrangian_hessian, CollocationNLP
+from test_ode_components import ode_problem
+from shuttle_ode import ShuttleODE
+
+class TestHessian(unittest.TestCase):
+
+    def test_ode_hessians_match_differenced_gradients(self):
+        nn = 5
+        p = ode_problem(ShuttleODE, nn)
+        values, gradients, hessians = ode_derivatives(p.model.ode)
+        for name in ODE_OUTPUTS:
+            np.testing.assert_array_equal(values[name], p.get_val(name))
+            np.testing.assert_allclose(hessians[name], hessians[name].transpose(0, 2, 1), rtol=1e-12, atol=0.)
+
+        for j, name in enumerate(ODE_INPUTS):
+            x = p.get_val(name).copy()
+            step = 1e-6*np.maximum(np.abs(x), 1.)
+            shifted = []
+            for sign in (1, -1):
+                p.set_val(name, x + sign*step)
+                p.run_model()
+                shifted.append(ode_derivatives(p.model.ode)[1])
+            p.set_val(name, x)
+            p.run_model()
+            for of in ODE_OUTPUTS:
+                differenced = (shifted[0][of] - shifted[1][of])/(2*step[:, np.newaxis])
+                np.testing.assert_allclose(hessians[of][:, :, j], differenced, rtol=1e-5, atol=1e-6*np.abs(differenced).max() + 1e-300,
+                                           err_msg="%s %s" % (of, name))
+
+    def test_lagrangian_hessian_is_block_diagonal(self):
+        nn = 4
+        nx = len(ODE_INPUTS)
+        rng = np.random.default_rng(0)
+        hessians = dict((name, rng.standard_normal((nn, nx, nx))) for name in ("q", "vdot"))
+        weights = {"q": rng.standard_normal(nn), "vdot": rng.standard_normal(nn)}
+        H = lagrangian_hessian(hessians, weights).toarray()
+        for i in range(nn):
+            block = weights["q"][i]*hessians["q"][i] + weights["vdot"][i]*hessians["vdot"][i]
+            np.testing.assert_allclose(H[i*nx:(i + 1)*nx, i*nx:(i + 1)*nx], block)
+            H[i*nx:(i + 1)*nx, i*nx:(i + 1)*nx] = 0.
+        self.assertEqual(np.abs(H).max(), 0.)
+
+    def test_collocation_derivatives(self):
+        nlp = CollocationNLP(num_nodes=4)
+        rng = np.random.default_rng(1)
+        z = nlp.guess()*(1 + .01*rng.standard_normal(nlp.size))
+        multipliers = rng.standard_normal(nlp.constraints(z).size)
+        J = nlp.constraint_jacobian(z).toarray()
+        H = nlp.constraint_hessian(z, multipliers).toarray()
+        for i in range(nlp.size):
+            step = np.zeros(nlp.size)
+            step[i] = 1e-6*max(abs(z[i]), 1e-3)
+            np.testing.assert_allclose(J[:, i], (nlp.constraints(z + step) - nlp.constraints(z - step))/(2*step[i]), rtol=1e-5, atol=1e-6*np.abs(J).max())
+            differenced = (nlp.constraint_jacobian(z + step).T.dot(multipliers) - nlp.constraint_jacobian(z - step).T.dot(multipliers))/(2*step[i])
+            np.testing.assert_allclose(H[:, i], differenced, rtol=1e-5, atol=1e-6*np.abs(H).max())
+
+    def test_exact_hessian_converges_faster(self):
+        results = dict((hessian, CollocationNLP(num_nodes=11).solve(hessian, maxiter=2000)) for hessian in ("exact", "bfgs"))
+        self.assertEqual(results["exact"].status, 1)
+        self.assertLess(results["exact"].constr_violation, 1e-5)
+        self.assertLess(results["exact"].nit, results["bfgs"].nit)
+        self.assertAlmostEqual(results["exact"].x[-1], results["bfgs"].x[-1], delta=1e-2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import importlib.util
+import unittest
+import numpy as np
+from scipy.integrate import solve_ivp
+from openmdao.utils.assert_utils import assert_near_equal
+from reentry_physics import density, aero_coefficients, aero_forces, state_rates
+from mesh_refinement import refine_mesh, segment_errors, refine, fixed_mesh
+
+HAVE_DYMOS = importlib.util.find_spec("dymos") is not None
+HAVE_PYOPTSPARSE = importlib.util.find_spec("pyoptsparse") is not None
+
+class TestMeshRefinement(unittest.TestCase):
+
+    def test_refine_mesh(self):
+        segment_ends = np.linspace(-1, 1, 5)
+        errors = np.array([1e-6, 5e-3, 1e-1, np.inf])
+        ends, orders = refine_mesh(segment_ends, [3, 3, 5, 3], errors, tol=1e-4, max_order=7)
+
+        # kept, raised by two orders, split in two, split in two
+        np.testing.assert_allclose(ends, [-1, -.5, 0, .25, .5, .75, 1])
+        self.assertEqual(orders, [3, 5, 5, 5, 3, 3])
+
+    @unittest.skipUnless(HAVE_DYMOS, "dymos is not installed")
+    def test_segment_errors_of_consistent_trajectory(self):
+        from openmdao.api import ScipyOptimizeDriver
+        from reentry_dymos import build_problem, set_initial_guess
+
+        prob, phase0 = build_problem(num_segments=6, order=[3, 3, 4, 4, 5, 5], driver=ScipyOptimizeDriver(), check=False)
+        set_initial_guess(prob, phase0, duration=600)
+        prob.set_val("traj.phase0.controls:alpha", 30*np.pi/180, units="rad")
+        prob.set_val("traj.phase0.controls:beta", -60*np.pi/180, units="rad")
+        prob.run_model()
+
+        # overwrite the states with an accurate integration at constant controls
+        time_s = np.unique(prob.get_val("traj.phase0.timeseries.time", units="s").ravel())
+        x_0 = [260000, -1*np.pi/180, 0, 90*np.pi/180, 0, 25600]
+
+        def rhs(t_i, y):
+            lift, drag = aero_forces(density(y[0]), y[5], *aero_coefficients(30.))
+            return(state_rates(y[0], y[1], y[3], y[4], y[5], lift, drag, -60*np.pi/180))
+
+        sol = solve_ivp(rhs, (0, 600), x_0, method="DOP853", dense_output=True, rtol=1e-12, atol=1e-12)
+        for i, name in enumerate(["h", "gamma", "phi", "psi", "theta", "v"]):
+            prob.set_val("traj.phase0.states:" + name, phase0.interpolate(xs=time_s, ys=sol.sol(time_s)[i], nodes="state_input", kind="cubic"))
+        prob.run_model()
+
+        errors = segment_errors(prob, phase0)
+        self.assertEqual(len(errors), 6)
+        self.assertLess(errors.max(), 1e-8)
+
+    @unittest.skipUnless(HAVE_DYMOS and HAVE_PYOPTSPARSE, "dymos and pyoptsparse are not installed")
+    def test_refinement_reaches_reference_crossrange(self):
+        prob, phase0, history = refine(tol=1e-4, num_segments=10, order=3, out_stream=None)
+
+        self.assertLessEqual(history[-1]["max_error"], 1e-4)
+        self.assertIs(history[-1]["failed"], False)
+        assert_near_equal(prob.get_val("traj.phase0.timeseries.states:theta")[-1], .53440626, tolerance=1e-3)
+
+        # the uniform mesh of reentry_dymos.py reaches the same crossrange with a larger NLP
+        fixed = fixed_mesh(50)
+        self.assertIs(fixed["failed"], False)
+        assert_near_equal(fixed["final_theta"], history[-1]["final_theta"], tolerance=1e-3)
+        self.assertLess(history[-1]["nlp_size"], fixed["nlp_size"])
+        print("refinement %.2f s in %d solves, uniform 50 segment mesh %.2f s" % (sum(row["wall_time"] for row in history), len(history),
+                                                                                  fixed["wall_time"]))
+
+if __name__ == "__main__":
+    unittest.main()
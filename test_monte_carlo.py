@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from scipy.integrate import solve_ivp
+from openmdao.api import Problem, Group
+from shuttle_ode import ShuttleODE
+from reentry_physics import density, aero_coefficients, aero_forces, heating_rate, state_rates
+from monte_carlo import Schedule, simulate_batch, sample_dispersions, run_monte_carlo, STATE_NAMES, PARAMETERS
+
+def nominal_solution():
+    time_s = np.linspace(0, 1000, 51)
+    return({"time": time_s,
+            "alpha": np.full(51, 30*np.pi/180),
+            "beta": np.linspace(-60, 0, 51)*np.pi/180,
+            "h": np.full(51, 260000.),
+            "gamma": np.full(51, -1*np.pi/180),
+            "phi": np.zeros(51),
+            "psi": np.full(51, 90*np.pi/180),
+            "theta": np.zeros(51),
+            "v": np.full(51, 25600.)})
+
+class TestReentryPhysics(unittest.TestCase):
+
+    def test_matches_shuttle_ode(self):
+        nn = 9
+        p = Problem(model=Group())
+        p.model.add_subsystem("ode", ShuttleODE(num_nodes=nn), promotes=["*"])
+        p.setup(check=False)
+        inputs = {"h": np.linspace(260000, 80000, nn),
+                  "alpha": np.linspace(40, 15, nn),
+                  "beta": np.linspace(-75, 0, nn)*np.pi/180,
+                  "gamma": np.linspace(-1, -5, nn)*np.pi/180,
+                  "psi": np.linspace(90, 10, nn)*np.pi/180,
+                  "theta": np.linspace(0, 25, nn)*np.pi/180,
+                  "v": np.linspace(25600, 2500, nn)}
+        for name, value in inputs.items():
+            p.set_val(name, value)
+        p.run_model()
+
+        rho = density(inputs["h"])
+        lift, drag = aero_forces(rho, inputs["v"], *aero_coefficients(inputs["alpha"]))
+        rates = state_rates(inputs["h"], inputs["gamma"], inputs["psi"], inputs["theta"], inputs["v"], lift, drag, inputs["beta"])
+
+        np.testing.assert_allclose(heating_rate(rho, inputs["v"], inputs["alpha"]), p.get_val("q"), rtol=1e-12)
+        for name, rate in zip(["hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"], rates):
+            np.testing.assert_allclose(rate, p.get_val(name), rtol=1e-12, atol=1e-14)
+
+class TestMonteCarlo(unittest.TestCase):
+
+    def test_undispersed_batch_matches_solve_ivp(self):
+        solution = nominal_solution()
+        schedule = Schedule(solution)
+        samples = sample_dispersions(3, np.random.default_rng(0), dispersions={})
+        summary = simulate_batch(schedule, samples, dt=.5)
+
+        def rhs(t, y):
+            alpha, beta = schedule.controls(t)
+            rho = density(y[0])
+            lift, drag = aero_forces(rho, y[5], *aero_coefficients(alpha))
+            return(state_rates(y[0], y[1], y[3], y[4], y[5], lift, drag, beta))
+
+        reference = solve_ivp(rhs, (0, 1000), schedule.initial_state, method="DOP853", rtol=1e-10, atol=1e-10)
+        for i, name in enumerate(STATE_NAMES):
+            np.testing.assert_allclose(summary["final_" + name], reference.y[i, -1], rtol=1e-6, atol=1e-8)
+
+    def test_chunking_and_statistics(self):
+        solution = nominal_solution()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "mc.csv")
+            statistics = run_monte_carlo(solution, 250, filename, chunk_size=100, max_workers=1, seed=3, dt=5.)
+            rows = np.genfromtxt(filename, delimiter=",", names=True)
+            pooled = run_monte_carlo(solution, 250, chunk_size=100, max_workers=2, seed=3, dt=5.)
+
+        self.assertEqual(statistics.count, 250)
+        np.testing.assert_array_equal(np.sort(rows["sample"]), np.arange(250))
+        for name in ["peak_q", "final_theta", "final_v"] + PARAMETERS:
+            np.testing.assert_allclose(statistics.mean[name], rows[name].mean(), rtol=1e-9)
+            np.testing.assert_allclose(statistics.std(name), rows[name].std(ddof=1), rtol=1e-6)
+            np.testing.assert_allclose(pooled.mean[name], statistics.mean[name], rtol=1e-12)
+            self.assertEqual(statistics.max[name], rows[name].max())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,464 @@
+import ast
+import os
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+import numpy as np
+from openmdao.api import Problem, Group
+from openmdao.utils.assert_utils import assert_check_partials
+from atmosphere_comp import Atmosphere
+from atmosphere_table_comp import AtmosphereTable, us76_density
+from aerodynamics_comp import Aerodynamics
+from aerodynamics_table_comp import AerodynamicsTable, AeroTable
+from heating_comp import AerodynamicHeating
+from flight_dynamics_comp import FlightDynamics
+from shuttle_ode import ShuttleODE
+from shuttle_ode_fused_comp import ShuttleODEFused
+from reentry_physics import PARAMETERS
+from results_io import save_results, load_results
+from profiling import ComponentProfiler
+import physics_kernels
+import node_chunks
+
+def ode_problem(ode_class, nn, force_alloc_complex=False):
+    p = Problem(model=Group())
+    p.model.add_subsystem("ode", ode_class(num_nodes=nn), promotes=["*"])
+    p.setup(check=False, force_alloc_complex=force_alloc_complex)
+    set_ode_inputs(p, nn)
+    p.run_model()
+    return(p)
+
+def set_ode_inputs(prob, nn):
+    prob.set_val("h", np.linspace(260000, 80000, nn), units="ft")
+    prob.set_val("alpha", np.linspace(40, 15, nn), units="deg")
+    prob.set_val("beta", np.linspace(-75, 0, nn)*np.pi/180, units="rad")
+    prob.set_val("gamma", np.linspace(-1, -5, nn)*np.pi/180, units="rad")
+    prob.set_val("psi", np.linspace(90, 10, nn)*np.pi/180, units="rad")
+    prob.set_val("theta", np.linspace(0, 25, nn)*np.pi/180, units="rad")
+    prob.set_val("v", np.linspace(25600, 2500, nn), units="ft/s")
+
+class ZeroArrays(dict):
+
+    def __init__(self, nn):
+        super(ZeroArrays, self).__init__()
+        self.nn = nn
+
+    def __missing__(self, key):
+        self[key] = np.zeros(self.nn)
+        return(self[key])
+
+class TestShuttleODEFused(unittest.TestCase):
+
+    def test_outputs_match_group(self):
+        nn = 20
+        grouped = ode_problem(ShuttleODE, nn)
+        fused = ode_problem(ShuttleODEFused, nn)
+
+        for name in ("rho", "lift", "drag", "q", "hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"):
+            np.testing.assert_array_equal(fused.get_val(name), grouped.get_val(name))
+
+    def test_partials(self):
+        nn = 7
+        p = ode_problem(ShuttleODEFused, nn, force_alloc_complex=True)
+
+        cpd = p.check_partials(method="cs", compact_print=True, out_stream=None)
+        assert_check_partials(cpd, atol=1e-8, rtol=1e-8)
+
+    def test_totals_match_group(self):
+        nn = 7
+        of = ["q", "hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"]
+        wrt = ["h", "alpha", "beta", "gamma", "psi", "theta", "v"]
+        totals = []
+        for ode_class in (ShuttleODE, ShuttleODEFused):
+            p = ode_problem(ode_class, nn)
+            totals.append(p.compute_totals(of=of, wrt=wrt, return_format="array"))
+
+        np.testing.assert_allclose(totals[1], totals[0], rtol=1e-12, atol=1e-14)
+
+class TestParameters(unittest.TestCase):
+
+    def test_non_default_parameters(self):
+        # 5% off every default; the group, the fused component and the numba kernels all follow the
+        # vectorized reference equations, and the totals with respect to the parameters agree
+        import reentry_physics
+
+        nn = 9
+        values = dict((name, 1.05*value) for name, (value, units) in PARAMETERS.items())
+        engines = [(ShuttleODE, {}), (ShuttleODEFused, {})]
+        if physics_kernels.HAVE_NUMBA:
+            engines.append((ShuttleODE, {"engine": "numba"}))
+
+        of = ["q", "gammadot", "psidot", "vdot"]
+        totals = []
+        for ode_class, options in engines:
+            p = Problem(model=Group())
+            p.model.add_subsystem("ode", ode_class(num_nodes=nn, **options), promotes=["*"])
+            p.setup(check=False)
+            set_ode_inputs(p, nn)
+            for name, value in values.items():
+                p.set_val(name, value*np.ones(nn), units=PARAMETERS[name][1])
+            p.run_model()
+
+            h = p.get_val("h")
+            v = p.get_val("v")
+            alpha = p.get_val("alpha", units="deg")
+            rho = reentry_physics.density(h, values["rho_0"], values["h_r"])
+            c_L, c_D = reentry_physics.aero_coefficients(alpha, (values["a_0"], values["a_1"]), (values["b_0"], values["b_1"], values["b_2"]))
+            lift, drag = reentry_physics.aero_forces(rho, v, c_L, c_D, values["S"])
+            rates = reentry_physics.state_rates(h, p.get_val("gamma"), p.get_val("psi"), p.get_val("theta"), v, lift, drag, p.get_val("beta"), values["w"])
+            q = reentry_physics.heating_rate(rho, v, alpha, (values["c_0"], values["c_1"], values["c_2"], values["c_3"]))
+
+            np.testing.assert_allclose(p.get_val("q"), q, rtol=1e-13)
+            for name, rate in zip(("hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"), rates):
+                np.testing.assert_allclose(p.get_val(name), rate, rtol=1e-12, atol=1e-16)
+            totals.append(p.compute_totals(of=of, wrt=list(PARAMETERS), return_format="array"))
+
+        for J in totals[1:]:
+            np.testing.assert_allclose(J, totals[0], rtol=1e-12, atol=1e-14)
+
+class TestInputCache(unittest.TestCase):
+
+    def test_outputs_match_uncached_expressions(self):
+        nn = 20
+        p = ode_problem(ShuttleODE, nn)
+        h = p.get_val("h")
+        v = p.get_val("v")
+        alpha = p.get_val("alpha", units="deg")
+        gamma = p.get_val("gamma")
+        r = 20902900 + h
+
+        rho = .002378*np.exp(-h/23800)
+        drag = .5*(.07854 + -.61592e-2*alpha + .621408e-3*alpha**2)*2690*rho*v**2
+        q = 17700*rho**.5*(.0001*v)**3.07*(1.0672181 + -.19213774e-1*alpha + .21286289e-3*alpha**2 + -.10117249e-5*alpha**3)
+        vdot = -drag/(203000/32.174) - .14076539e17/r**2*np.sin(gamma)
+
+        np.testing.assert_array_equal(p.get_val("rho"), rho)
+        np.testing.assert_array_equal(p.get_val("drag"), drag)
+        np.testing.assert_array_equal(p.get_val("q"), q)
+        np.testing.assert_array_equal(p.get_val("vdot"), vdot)
+
+    def test_partials_after_input_change(self):
+        # compute_partials at a point compute has not seen must not reuse stale intermediates
+        nn = 7
+        for comp_class in (Atmosphere, Aerodynamics, AerodynamicHeating, FlightDynamics, ShuttleODEFused):
+            p = Problem(model=Group())
+            comp = p.model.add_subsystem("comp", comp_class(num_nodes=nn))
+            p.setup(check=False)
+
+            names = ["h", "alpha", "beta", "gamma", "psi", "theta", "v", "rho", "lift", "drag"]
+            point_a = dict((name, np.linspace(1., 2., nn)) for name in names)
+            point_b = dict((name, np.linspace(1.5, 2.5, nn)) for name in names)
+            for name, (value, units) in PARAMETERS.items():
+                point_a[name] = value*np.linspace(1., 1.1, nn)
+                point_b[name] = value*np.linspace(1.05, .95, nn)
+            outputs = ZeroArrays(nn)
+
+            comp.compute(point_a, outputs)
+            stale = ZeroArrays(nn)
+            comp.compute_partials(point_b, stale)
+
+            comp._cache.invalidate()
+            fresh = ZeroArrays(nn)
+            comp.compute_partials(point_b, fresh)
+
+            for key in fresh:
+                np.testing.assert_array_equal(stale[key], fresh[key])
+
+    def test_partials_all_components(self):
+        nn = 5
+        p = ode_problem(ShuttleODE, nn, force_alloc_complex=True)
+        cpd = p.check_partials(method="cs", compact_print=True, out_stream=None)
+        assert_check_partials(cpd, atol=1e-8, rtol=1e-8)
+
+class TestSecondPartials(unittest.TestCase):
+
+    def test_match_differenced_partials(self):
+        # every second partial against central differences of compute_partials; pairs a component
+        # does not report must difference to zero
+        nn = 6
+        point = {"h": np.linspace(260000, 80000, nn), "alpha": np.linspace(40, 15, nn), "beta": np.linspace(-75, -5, nn)*np.pi/180,
+                 "gamma": np.linspace(-1, -5, nn)*np.pi/180, "psi": np.linspace(80, 10, nn)*np.pi/180, "theta": np.linspace(5, 25, nn)*np.pi/180,
+                 "v": np.linspace(25600, 2500, nn), "rho": np.linspace(1e-6, 1e-3, nn), "lift": np.linspace(1e5, 2e5, nn), "drag": np.linspace(1e5, 3e5, nn)}
+        for name, (value, units) in PARAMETERS.items():
+            point[name] = value*np.ones(nn)
+        wrts = {Atmosphere: ["h"],
+                Aerodynamics: ["alpha", "v", "rho"],
+                AerodynamicHeating: ["rho", "v", "alpha"],
+                FlightDynamics: ["beta", "gamma", "h", "psi", "theta", "v", "lift", "drag"]}
+
+        for comp_class, names in wrts.items():
+            p = Problem(model=Group())
+            comp = p.model.add_subsystem("comp", comp_class(num_nodes=nn))
+            p.setup(check=False)
+
+            H = {}
+            comp.compute_second_partials(dict(point), H)
+            for a in names:
+                J = []
+                for sign in (1, -1):
+                    shifted = dict(point)
+                    shifted[a] = point[a]*(1 + sign*1e-6)
+                    J.append(ZeroArrays(nn))
+                    comp.compute_partials(shifted, J[-1])
+                for (of, b) in J[0]:
+                    if b not in names:
+                        continue
+                    differenced = (J[0][of, b] - J[1][of, b])/(2e-6*point[a])
+                    analytic = H.get((of, a, b), H.get((of, b, a), np.zeros(nn)))
+                    np.testing.assert_allclose(analytic, differenced, rtol=1e-5, atol=1e-6*np.abs(differenced).max() + 1e-300,
+                                               err_msg="%s %s %s %s" % (comp_class.__name__, of, a, b))
+
+class TestAtmosphereTable(unittest.TestCase):
+
+    def table_problem(self, h, force_alloc_complex=False):
+        p = Problem(model=Group())
+        p.model.add_subsystem("atmosphere", AtmosphereTable(num_nodes=len(h)), promotes=["*"])
+        p.setup(check=False, force_alloc_complex=force_alloc_complex)
+        p.set_val("h", h, units="ft")
+        p.run_model()
+        return(p)
+
+    def test_matches_standard_atmosphere(self):
+        # midpoints between knots are where the spline error is largest, peaking next to the
+        # lapse rate breaks between layers
+        h = np.arange(250., 300000., 500.)
+        p = self.table_problem(h)
+        np.testing.assert_allclose(p.get_val("rho"), us76_density(h), rtol=5e-4)
+
+    def test_partials(self):
+        h = np.array([-100., 0., 36089., 65617.3, 154199., 232940., 260000., 299999., 310000.])
+        p = self.table_problem(h, force_alloc_complex=True)
+        cpd = p.check_partials(method="cs", compact_print=True, out_stream=None)
+        assert_check_partials(cpd, atol=1e-12, rtol=1e-8)
+
+    def test_derivative_continuous_at_knots(self):
+        knots = np.arange(500., 300000., 500.)
+        p = self.table_problem(np.concatenate([knots - 1e-6, knots + 1e-6]))
+        J = p.compute_totals(of=["rho"], wrt=["h"], return_format="array")
+        drho_dh = np.diag(J)
+        np.testing.assert_allclose(drho_dh[:len(knots)], drho_dh[len(knots):], rtol=1e-6)
+
+    def test_shuttle_ode_option(self):
+        nn = 5
+        p = Problem(model=Group())
+        p.model.add_subsystem("ode", ShuttleODE(num_nodes=nn, atmosphere="us76"), promotes=["*"])
+        p.setup(check=False)
+        set_ode_inputs(p, nn)
+        p.run_model()
+        np.testing.assert_allclose(p.get_val("rho"), us76_density(p.get_val("h")), rtol=1e-4)
+
+class TestAerodynamicsTable(unittest.TestCase):
+
+    def mach_table(self):
+        alpha = np.linspace(-10, 50, 13)
+        mach = np.array([0., 2., 5., 10., 20., 30.])
+        A, M = np.meshgrid(alpha, mach, indexing="ij")
+        return(AeroTable(alpha, mach, -.2 + .03*A - .002*M + 1e-4*A*M, .08 + 6e-4*A**2 + .01*np.exp(-M/5)))
+
+    def test_matches_polynomial(self):
+        nn = 20
+        table = AeroTable.from_polynomial(np.linspace(-10, 50, 61), np.linspace(0, 30, 7))
+        grouped = ode_problem(ShuttleODE, nn)
+        p = Problem(model=Group())
+        p.model.add_subsystem("ode", ShuttleODE(num_nodes=nn, aero_table=table), promotes=["*"])
+        p.setup(check=False)
+        set_ode_inputs(p, nn)
+        p.set_val("alpha", np.linspace(40, 15, 26)[:nn], units="deg")
+        grouped.set_val("alpha", np.linspace(40, 15, 26)[:nn], units="deg")
+        p.run_model()
+        grouped.run_model()
+
+        # c_L is linear in alpha, c_D is matched at the whole-degree breakpoints
+        np.testing.assert_allclose(p.get_val("lift"), grouped.get_val("lift"), rtol=1e-12)
+        np.testing.assert_allclose(p.get_val("drag"), grouped.get_val("drag"), rtol=1e-12)
+
+    def test_polynomial_coefficients(self):
+        nn = 6
+        a = (-.15, .03)
+        b = (.09, -.005, .0007)
+        alpha = np.linspace(-5, 45, nn)
+        table = AeroTable.from_polynomial(np.linspace(-10, 50, 61), np.linspace(0, 30, 7), a=a, b=b)
+        tabulated = Problem(model=Group())
+        tabulated.model.add_subsystem("aerodynamics", AerodynamicsTable(num_nodes=nn, table=table), promotes=["*"])
+        fits = Problem(model=Group())
+        fits.model.add_subsystem("aerodynamics", Aerodynamics(num_nodes=nn), promotes=["*"])
+        for p in (tabulated, fits):
+            p.setup(check=False)
+            p.set_val("alpha", alpha, units="deg")
+            p.set_val("v", np.linspace(2000., 25000., nn), units="ft/s")
+            p.set_val("rho", np.linspace(1e-7, 1e-4, nn), units="slug/ft**3")
+        for i, name in enumerate(["a_0", "a_1"]):
+            fits.set_val(name, a[i]*np.ones(nn))
+        for i, name in enumerate(["b_0", "b_1", "b_2"]):
+            fits.set_val(name, b[i]*np.ones(nn))
+        tabulated.run_model()
+        fits.run_model()
+
+        # the table is built from the given fits, not the defaults in reentry_physics
+        np.testing.assert_allclose(tabulated.get_val("lift"), fits.get_val("lift"), rtol=1e-12)
+        np.testing.assert_allclose(tabulated.get_val("drag"), fits.get_val("drag"), rtol=1e-12)
+
+    def test_partials(self):
+        nn = 9
+        p = Problem(model=Group())
+        p.model.add_subsystem("aerodynamics", AerodynamicsTable(num_nodes=nn, table=self.mach_table()), promotes=["*"])
+        p.setup(check=False, force_alloc_complex=True)
+        # includes points outside the table on both axes
+        p.set_val("alpha", np.array([-20., -10., 3.3, 17.5, 25., 40.1, 49.9, 50., 60.]), units="deg")
+        p.set_val("v", np.array([500., 1000., 4100., 8000., 12345., 19999., 25600., 30000., 35000.]), units="ft/s")
+        p.set_val("rho", np.linspace(1e-7, 1e-4, nn), units="slug/ft**3")
+        p.run_model()
+        cpd = p.check_partials(method="cs", compact_print=True, out_stream=None)
+        assert_check_partials(cpd, atol=1e-6, rtol=1e-8)
+
+    def test_memory_mapped_table(self):
+        table = self.mach_table()
+        with tempfile.TemporaryDirectory() as directory:
+            table.save(directory)
+            loaded = AeroTable.load(directory)
+            self.assertIsInstance(loaded.c_L, np.memmap)
+            for name in AeroTable.FILES:
+                np.testing.assert_array_equal(getattr(loaded, name), getattr(table, name))
+
+            nn = 5
+            results = []
+            for source in (table, directory):
+                p = Problem(model=Group())
+                p.model.add_subsystem("ode", ShuttleODE(num_nodes=nn, aero_table=source), promotes=["*"])
+                p.setup(check=False)
+                set_ode_inputs(p, nn)
+                p.run_model()
+                results.append(p.get_val("vdot"))
+            np.testing.assert_array_equal(results[0], results[1])
+
+def engine_problem(nn, engine, force_alloc_complex=False):
+    p = Problem(model=Group())
+    p.model.add_subsystem("ode", ShuttleODE(num_nodes=nn, engine=engine), promotes=["*"])
+    p.setup(check=False, force_alloc_complex=force_alloc_complex)
+    set_ode_inputs(p, nn)
+    p.run_model()
+    return(p)
+
+@unittest.skipUnless(physics_kernels.HAVE_NUMBA, "numba is not installed")
+class TestPhysicsKernels(unittest.TestCase):
+
+    def test_matches_numpy_engine(self):
+        nn = 25
+        p_numpy = engine_problem(nn, "numpy")
+        p_numba = engine_problem(nn, "numba")
+
+        for name in ("q", "hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"):
+            np.testing.assert_allclose(p_numba.get_val(name), p_numpy.get_val(name), rtol=1e-13, atol=1e-16)
+
+        of = ["q", "hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"]
+        wrt = ["h", "alpha", "beta", "gamma", "psi", "theta", "v"]
+        np.testing.assert_allclose(p_numba.compute_totals(of=of, wrt=wrt, return_format="array"),
+                                   p_numpy.compute_totals(of=of, wrt=wrt, return_format="array"), rtol=1e-12, atol=1e-14)
+
+    def test_partials_complex_step(self):
+        # complex inputs take the numpy path, so this checks the kernel partials against it
+        p = engine_problem(7, "numba", force_alloc_complex=True)
+        cpd = p.check_partials(method="cs", compact_print=True, out_stream=None)
+        assert_check_partials(cpd, atol=1e-8, rtol=1e-8)
+
+class TestEngineFallback(unittest.TestCase):
+
+    def test_numpy_used_without_numba(self):
+        with mock.patch.object(physics_kernels, "HAVE_NUMBA", False), warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            p = engine_problem(5, "numba")
+        self.assertIsNone(p.model.ode.eom._kernel)
+        self.assertTrue(any("numba is not installed" in str(w.message) for w in caught))
+        np.testing.assert_allclose(p.get_val("vdot"), engine_problem(5, "numpy").get_val("vdot"), rtol=0)
+
+def threaded_problem(ode_class, nn, num_threads, force_alloc_complex=False, **options):
+    p = Problem(model=Group())
+    p.model.add_subsystem("ode", ode_class(num_nodes=nn, num_threads=num_threads, **options), promotes=["*"])
+    p.setup(check=False, force_alloc_complex=force_alloc_complex)
+    set_ode_inputs(p, nn)
+    p.run_model()
+    return(p)
+
+class TestNodeChunks(unittest.TestCase):
+
+    def test_slices(self):
+        self.assertEqual(node_chunks.node_slices(10, 4, min_chunk=100), [slice(0, 10)])
+        slices = node_chunks.node_slices(10, 3, min_chunk=2)
+        self.assertEqual(len(slices), 3)
+        self.assertEqual(np.concatenate([np.arange(10)[s] for s in slices]).tolist(), list(range(10)))
+        self.assertFalse(node_chunks.NodeChunks(1000, 8).parallel)
+
+    def test_threaded_ode_matches_serial(self):
+        nn = 23
+        of = ["q", "hdot", "gammadot", "phidot", "psidot", "thetadot", "vdot"]
+        wrt = ["h", "alpha", "beta", "gamma", "psi", "theta", "v"]
+        table = AeroTable.from_polynomial(np.linspace(-10, 50, 61), np.linspace(0, 30, 7))
+        cases = [(ShuttleODE, {}), (ShuttleODE, {"atmosphere": "us76", "aero_table": table}), (ShuttleODEFused, {})]
+        if physics_kernels.HAVE_NUMBA:
+            cases.append((ShuttleODE, {"engine": "numba"}))
+
+        with mock.patch.object(node_chunks, "MIN_CHUNK_NODES", 4):
+            for ode_class, options in cases:
+                serial = threaded_problem(ode_class, nn, 1, **options)
+                threaded = threaded_problem(ode_class, nn, 3, force_alloc_complex=True, **options)
+                self.assertTrue(threaded.model.ode._chunks.parallel if ode_class is ShuttleODEFused else threaded.model.ode.eom._chunks.parallel)
+
+                for name in of:
+                    np.testing.assert_allclose(threaded.get_val(name), serial.get_val(name), rtol=1e-15, atol=1e-300)
+                np.testing.assert_allclose(threaded.compute_totals(of=of, wrt=wrt, return_format="array"),
+                                           serial.compute_totals(of=of, wrt=wrt, return_format="array"), rtol=1e-15, atol=1e-300)
+
+                cpd = threaded.check_partials(method="cs", compact_print=True, out_stream=None)
+                assert_check_partials(cpd, atol=1e-8, rtol=1e-8)
+
+class TestComponentProfiler(unittest.TestCase):
+
+    def test_counts_and_restores_methods(self):
+        nn = 6
+        compute = Atmosphere.compute
+        with ComponentProfiler() as profiler:
+            p = ode_problem(ShuttleODE, nn)
+            p.compute_totals(of=["q", "vdot"], wrt=["h", "alpha"])
+
+        self.assertIs(Atmosphere.compute, compute)
+        rows = dict(((row["pathname"], row["method"]), row) for row in profiler.rows())
+        for pathname in ("ode.atmosphere", "ode.aerodynamics", "ode.heating", "ode.eom"):
+            self.assertEqual(rows[pathname, "compute"]["calls"], 1)
+            self.assertEqual(rows[pathname, "compute_partials"]["calls"], 1)
+            self.assertEqual(rows[pathname, "compute"]["num_nodes"], nn)
+        self.assertLessEqual(profiler.component_time(), profiler.wall_time)
+
+        # nothing is recorded outside of the block
+        p.run_model()
+        self.assertEqual(rows["ode.atmosphere", "compute"]["calls"], 1)
+        self.assertEqual(profiler.stats["ode.atmosphere", "compute"]["calls"], 1)
+
+class TestHeadless(unittest.TestCase):
+
+    def test_solver_modules_do_not_import_matplotlib(self):
+        # only module level imports count; report.py imports it inside plot_results
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for filename in ("atmosphere_comp.py", "atmosphere_table_comp.py", "aerodynamics_comp.py", "aerodynamics_table_comp.py", "heating_comp.py",
+                         "flight_dynamics_comp.py", "shuttle_ode.py", "shuttle_ode_fused_comp.py", "reentry_dymos.py", "results_io.py", "report.py"):
+            with open(os.path.join(directory, filename)) as f:
+                tree = ast.parse(f.read())
+            for node in tree.body:
+                names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module] if isinstance(node, ast.ImportFrom) else []
+                for name in names:
+                    self.assertFalse(name.startswith("matplotlib"), filename)
+
+    def test_results_round_trip(self):
+        results = {"time": np.linspace(0, 2000, 11), "h": np.linspace(260000, 80000, 11), "sim_h": np.linspace(260000, 80000, 101)}
+        with tempfile.TemporaryDirectory() as directory:
+            for path, mapped in ((os.path.join(directory, "results.npz"), False), (os.path.join(directory, "results"), True)):
+                save_results(results, path)
+                loaded = load_results(path)
+                self.assertEqual(sorted(loaded), sorted(results))
+                self.assertEqual(isinstance(loaded["h"], np.memmap), mapped)
+                for name in results:
+                    np.testing.assert_array_equal(loaded[name], results[name])
+                del loaded
+
+if __name__ == "__main__":
+    unittest.main()
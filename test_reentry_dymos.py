@@ -1,9 +1,9 @@
 import unittest
-import matplotlib.pyplot as plt
-from openmdao.api import Problem, Group, pyOptSparseDriver
-from openmdao.utils.assert_utils import assert_rel_error
+from openmdao.api import Problem, Group, ExecComp, ScipyOptimizeDriver, pyOptSparseDriver
+from openmdao.utils.assert_utils import assert_near_equal
 from dymos import Trajectory, GaussLobatto, Phase, Radau
 from shuttle_ode import ShuttleODE
+from reentry_dymos import driver_failed
 import numpy as np
 
 class TestReentry(unittest.TestCase):
@@ -49,8 +49,8 @@ class TestReentry(unittest.TestCase):
 
         print(p.get_val("traj.phase0.timeseries.time")[-1])
         print(p.get_val("traj.phase0.timeseries.states:theta")[-1])
-        assert_rel_error(self, p.get_val("traj.phase0.timeseries.time")[-1], 2181.90371131, tolerance=1e-3)
-        assert_rel_error(self, p.get_val("traj.phase0.timeseries.states:theta")[-1], .53440626, tolerance=1e-3)
+        assert_near_equal(p.get_val("traj.phase0.timeseries.time")[-1], 2181.90371131, tolerance=1e-3)
+        assert_near_equal(p.get_val("traj.phase0.timeseries.states:theta")[-1], .53440626, tolerance=1e-3)
 
     def test_reentry_gauss_lobatto_dymos(self):
 
@@ -93,8 +93,22 @@ class TestReentry(unittest.TestCase):
 
         print(p.get_val("traj.phase0.timeseries.time")[-1])
         print(p.get_val("traj.phase0.timeseries.states:theta")[-1])
-        assert_rel_error(self, p.get_val("traj.phase0.timeseries.time")[-1], 2181.88191719, tolerance=1e-3)
-        assert_rel_error(self, p.get_val("traj.phase0.timeseries.states:theta")[-1], .53440955, tolerance=1e-3)
-
-if __name__ == "___main__":
+        assert_near_equal(p.get_val("traj.phase0.timeseries.time")[-1], 2181.88191719, tolerance=1e-3)
+        assert_near_equal(p.get_val("traj.phase0.timeseries.states:theta")[-1], .53440955, tolerance=1e-3)
+
+class TestDriverFailed(unittest.TestCase):
+
+    def test_driver_failed(self):
+        # a plain bool whatever run_driver returns on the installed OpenMDAO
+        for maxiter, failed in ((100, False), (1, True)):
+            prob = Problem()
+            prob.model.add_subsystem("paraboloid", ExecComp("f = (x - 3)**2 + x*y + (y + 4)**2 - 3"), promotes=["*"])
+            prob.model.add_design_var("x", lower=-50, upper=50)
+            prob.model.add_design_var("y", lower=-50, upper=50)
+            prob.model.add_objective("f")
+            prob.driver = ScipyOptimizeDriver(optimizer="SLSQP", maxiter=maxiter, tol=1e-9, disp=False)
+            prob.setup()
+            self.assertIs(driver_failed(prob.run_driver()), failed)
+
+if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
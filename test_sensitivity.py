@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+from openmdao.api import Problem, ExecComp, IndepVarComp, ScipyOptimizeDriver
+from sensitivity import kkt_multipliers, sensitivities
+
+class TestSensitivity(unittest.TestCase):
+
+    def test_matches_analytic_optimum(self):
+        # min (x - p1)^2 + y^2 + (z - 5)^2  s.t.  x + y = p2,  y >= p3,  x <= 100,  z <= 1
+        # With y >= p3 active the optimum is x = p2 - p3, y = p3, z = 1, so
+        # f* = (p2 - p3 - p1)^2 + p3^2 + 16
+        p1, p2, p3 = 0., 3., 2.
+        prob = Problem()
+        params = prob.model.add_subsystem("params", IndepVarComp(), promotes=["*"])
+        params.add_output("p1", p1)
+        params.add_output("p2", p2)
+        params.add_output("p3", p3)
+        prob.model.add_subsystem("comp", ExecComp(["f = (x - p1)**2 + y**2 + (z - 5)**2", "c = x + y - p2", "g = y - p3", "h = x"]), promotes=["*"])
+        prob.model.add_design_var("x", ref=2.)
+        prob.model.add_design_var("y")
+        prob.model.add_design_var("z", upper=1., ref=4.)
+        prob.model.add_constraint("c", equals=0., ref=10.)
+        prob.model.add_constraint("g", lower=0., ref=.5)
+        prob.model.add_constraint("h", upper=100.)
+        prob.model.add_objective("f", ref=4.)
+        prob.driver = ScipyOptimizeDriver(optimizer="SLSQP", tol=1e-12, disp=False)
+        prob.setup()
+        prob.run_driver()
+        np.testing.assert_allclose([prob.get_val("x")[0], prob.get_val("y")[0], prob.get_val("z")[0]], [1., 2., 1.], atol=1e-8)
+
+        multipliers, residual = kkt_multipliers(prob)
+        self.assertLess(residual, 1e-8)
+        by_name = dict((name.rsplit(".", 1)[-1], value) for name, value in multipliers.items())
+        self.assertEqual(by_name["h"][0], 0.)
+        self.assertNotEqual(by_name["g"][0], 0.)
+
+        derivatives, residual = sensitivities(prob, {"p1": "p1", "p2": "p2", "p3": "p3"})
+        x = p2 - p3
+        np.testing.assert_allclose(derivatives["p1"], -2*(x - p1), rtol=1e-7)
+        np.testing.assert_allclose(derivatives["p2"], 2*(x - p1), rtol=1e-7)
+        np.testing.assert_allclose(derivatives["p3"], -2*(x - p1) + 2*p3, rtol=1e-7)
+
+if __name__ == "__main__":
+    unittest.main()
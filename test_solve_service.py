@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from solve_service import request_config, structure_key, summarize, SolveService, make_server, call
+from warm_start import config_key, SolutionStore
+
+def fake_solve(config):
+    # Stands in for solve_config in the workers: slow enough for requests to overlap, with a
+    # solution that identifies the configuration and the solve
+    time.sleep(.3)
+    solution = {"time": np.array([0., 1000.]), "theta": np.array([0., config["h_0"]*1e-6])}
+    status = "failed" if config["order"] == 5 else "converged"
+    return(summarize(solution, status=status, pid=os.getpid(), token=time.perf_counter(), solve_time=.3))
+
+class TestSolveService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.service = SolveService(workers=2, coloring_dir=self.tmp, store_dir=os.path.join(self.tmp, "store"), prewarm=[],
+                                    solve_function=fake_solve)
+
+    def tearDown(self):
+        self.service.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_request_config(self):
+        config = request_config({"gamma_0": -1, "num_segments": 20.})
+        self.assertEqual(config_key(config), config_key(request_config({})))
+        self.assertAlmostEqual(config["gamma_f"], -5*np.pi/180)
+        self.assertEqual(structure_key(request_config({"heating_limit": 50.})), structure_key(config))
+        self.assertNotEqual(structure_key(request_config({"heating_limit": None})), structure_key(config))
+        with self.assertRaises(ValueError):
+            request_config({"h0": 250000.})
+        with self.assertRaises(ValueError):
+            request_config({"transcription": "shooting"})
+        for request in ({"h_0": None}, {"num_segments": [20]}, {"order": "3"}, {"gamma_0": True}, {"v_f": float("nan")}):
+            with self.assertRaises(ValueError):
+                request_config(request)
+
+    def test_deduplicates_and_caches(self):
+        self.assertEqual(len(self.service.worker_pids), 2)
+        request = {"h_0": 250000.}
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(self.service.solve, [request]*3))
+        self.assertEqual(len(set(result["token"] for result in results)), 1)
+        self.assertEqual(sorted(result["served"] for result in results), ["deduplicated", "deduplicated", "solve"])
+
+        repeat = self.service.solve({"h_0": 250000, "gamma_0": -1.})
+        self.assertEqual(repeat["served"], "memory")
+        self.assertEqual(repeat["token"], results[0]["token"])
+
+        # failed solves are not cached
+        self.assertEqual(self.service.solve({"order": 5})["served"], "solve")
+        self.assertEqual(self.service.solve({"order": 5})["served"], "solve")
+
+        metrics = self.service.metrics()
+        self.assertEqual(metrics["requests"], 6)
+        self.assertEqual(metrics["solves"], 3)
+        self.assertEqual(metrics["deduplicated"], 2)
+        self.assertEqual(metrics["memory_hits"], 1)
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertGreaterEqual(metrics["latency"]["max"], .3)
+
+    def test_latency_of_every_request(self):
+        # memory, store and deduplicated requests are in the end-to-end latencies as well as solves
+        SolutionStore(self.service.store.directory).save(request_config({"v_0": 25000.}), {"time": np.array([0., 2000.]), "theta": np.array([0., .5])})
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            served = [result["served"] for result in pool.map(self.service.solve, [{"h_0": 250000.}]*2)]
+        served.append(self.service.solve({"h_0": 250000.})["served"])
+        served.append(self.service.solve({"v_0": 25000.})["served"])
+        self.assertEqual(sorted(served), ["deduplicated", "memory", "solve", "store"])
+        # the latencies of solves are recorded by callbacks, which have all run once the pool is shut down
+        self.service.close()
+        self.assertEqual(len(self.service._latencies), 4)
+        self.assertEqual(len(self.service._solve_times), 1)
+
+    def test_serves_stored_solutions(self):
+        config = request_config({"v_0": 25000.})
+        SolutionStore(self.service.store.directory).save(config, {"time": np.array([0., 2000.]), "theta": np.array([0., .5])})
+        result = self.service.solve({"v_0": 25000.})
+        self.assertEqual(result["served"], "store")
+        self.assertEqual(result["final_theta"], .5)
+        self.assertEqual(self.service.metrics()["solves"], 0)
+
+    def test_http_and_unix_socket(self):
+        socket_path = os.path.join(self.tmp, "solve.sock")
+        servers = [(make_server(self.service, socket_path=socket_path), {"socket_path": socket_path})]
+        server = make_server(self.service, port=0)
+        servers.append((server, {"port": server.server_address[1]}))
+        for server, address in servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                status, body = call("/solve", {"h_0": 240000.}, **address)
+                self.assertEqual(status, 200)
+                self.assertAlmostEqual(body["final_theta"], .24)
+                self.assertEqual(body["solution"]["time"], [0., 1000.])
+
+                status, body = call("/solve", {"transcription": "shooting"}, **address)
+                self.assertEqual(status, 400)
+                status, body = call("/solve", {"h_0": None}, **address)
+                self.assertEqual(status, 400)
+                self.assertIn("h_0", body["error"])
+
+                status, body = call("/metrics", **address)
+                self.assertEqual(status, 200)
+                self.assertIn("queue_depth", body)
+            finally:
+                server.shutdown()
+                server.server_close()
+        self.assertEqual(self.service.metrics()["solves"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
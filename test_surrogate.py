@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from sweep import expand_grid, solution_config
+from surrogate import CrossrangeSurrogate, FEATURES, NUM_POINTS
+from warm_start import STATES, CONTROLS, SolutionStore
+
+def synthetic_solution(case, num_nodes=61):
+    # Smooth stand-in for a converged solution whose crossrange and duration depend on the case
+    duration = 2000. - 10*case["heating_limit"] + .001*(case["h_0"] - 260000.)
+    time_s = np.linspace(0, duration, num_nodes)
+    s = time_s/duration
+    theta_f = (30. + .2*case["heating_limit"] + 2*case["gamma_0"])*np.pi/180
+    solution = {"time": time_s,
+                "h": case["h_0"] + (80000. - case["h_0"])*s,
+                "gamma": (case["gamma_0"] + (-5 - case["gamma_0"])*s)*np.pi/180,
+                "phi": .5*s**2,
+                "psi": np.pi/2 - s,
+                "theta": theta_f*np.sin(np.pi/2*s),
+                "v": case["v_0"] + (2500. - case["v_0"])*s,
+                "alpha": (17.4 + 5*s)*np.pi/180,
+                "beta": (-75. + 75*s)*np.pi/180}
+    return(solution)
+
+class TestSurrogate(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cases = expand_grid(heating_limit=[60., 65., 70., 75., 80.], h_0=[250000., 260000., 270000.], gamma_0=[-1.5, -1., -.5])
+        store = SolutionStore(self.directory, max_entries=1000)
+        for case in self.cases:
+            store.save(solution_config(case), synthetic_solution(case))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_interpolates_stored_solutions(self):
+        surrogate = CrossrangeSurrogate.from_store(self.directory)
+        self.assertEqual(surrogate.features.shape, (len(self.cases), len(FEATURES)))
+        # v_0 does not vary, so it is not an interpolation variable
+        np.testing.assert_array_equal(surrogate.active, [True, True, True, False])
+
+        case = self.cases[17]
+        expected = synthetic_solution(case)
+        result = surrogate.query(case["heating_limit"], case["h_0"], case["gamma_0"], case["v_0"])
+        self.assertAlmostEqual(result["final_theta"], expected["theta"][-1], delta=1e-10)
+        self.assertAlmostEqual(result["final_time"], expected["time"][-1], delta=1e-6)
+        self.assertFalse(result["extrapolated"])
+        self.assertEqual(result["solution"]["time"].shape, (NUM_POINTS,))
+        np.testing.assert_allclose(result["solution"]["h"], np.interp(result["solution"]["time"], expected["time"], expected["h"]), rtol=1e-9)
+
+        # the synthetic crossrange is linear in the features, which the polynomial tail reproduces
+        case = dict(case, heating_limit=67.5, gamma_0=-.8)
+        value, uncertainty = surrogate.crossrange(case["heating_limit"], case["h_0"], case["gamma_0"], case["v_0"])
+        self.assertAlmostEqual(value, synthetic_solution(case)["theta"][-1], delta=1e-9)
+        self.assertLess(uncertainty, 1e-9)
+        self.assertTrue(surrogate.query(90., case["h_0"], case["gamma_0"], case["v_0"])["extrapolated"])
+
+    def test_uncertainty_and_round_trip(self):
+        surrogate = CrossrangeSurrogate.from_store(self.directory)
+
+        # leave-one-out errors from the closed form match refits without each entry
+        trajectories = surrogate.trajectories
+        for i in (0, 22, 44):
+            keep = np.arange(len(self.cases)) != i
+            refit = CrossrangeSurrogate(surrogate.features[keep], surrogate.final_time[keep], surrogate.final_theta[keep],
+                                        dict((name, trajectories[name][keep]) for name in trajectories))
+            point = surrogate.features[i]
+            result = refit.query(point[0], point[1], point[2]*180/np.pi, point[3])
+            self.assertAlmostEqual(surrogate.loo_errors[i, 0], surrogate.final_time[i] - result["final_time"], delta=1e-6*surrogate.final_time[i])
+
+        self.assertGreater(surrogate.query(62.5, 255000., -1.2)["final_time_uncertainty"], 0.)
+
+        filename = os.path.join(self.directory, "surrogate.npz")
+        surrogate.save(filename)
+        loaded = CrossrangeSurrogate.load(filename)
+        first = surrogate.query(72., 262000., -.7)
+        second = loaded.query(72., 262000., -.7)
+        self.assertEqual(first["final_theta"], second["final_theta"])
+        for name in list(STATES) + list(CONTROLS):
+            np.testing.assert_array_equal(first["solution"][name], second["solution"][name])
+
+        # the fast path gives the same answer (its latency is timed by surrogate.py query --repeat)
+        self.assertEqual(loaded.crossrange(72., 262000., -.7), (first["final_theta"], first["final_theta_uncertainty"]))
+
+if __name__ == "__main__":
+    unittest.main()
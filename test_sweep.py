@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import sweep
+from sweep import expand_grid, run_tasks, run_sweep
+
+def square(x):
+    if x == 3:
+        raise ValueError("bad input")
+    return(x*x)
+
+def crash_on(x):
+    # Stands in for a crash inside the optimizer, which takes the worker process down with it
+    if x == 2:
+        os._exit(1)
+    return(x*x)
+
+def crashing_case(case, *args):
+    if case["h_0"] == 250000.:
+        os._exit(1)
+    return(dict(case, status="converged", final_time=2000., final_theta=.5, function_evaluations=1, wall_time=0., warm_started=False, error=""))
+
+class TestSweep(unittest.TestCase):
+
+    def test_run_tasks(self):
+        results = dict((index, (result, err)) for index, result, err in run_tasks(square, [(x,) for x in range(5)], max_workers=2))
+        self.assertEqual(dict((index, result) for index, (result, err) in results.items() if err is None), {0: 0, 1: 1, 2: 4, 4: 16})
+        self.assertIsInstance(results[3][1], ValueError)
+
+    def test_crashed_worker_fails_only_its_task(self):
+        for workers in (1, 3):
+            results = list(run_tasks(crash_on, [(x,) for x in range(6)], max_workers=workers))
+            self.assertEqual(sorted(index for index, result, err in results), list(range(6)))
+            self.assertEqual([index for index, result, err in results if err is not None], [2])
+            self.assertEqual(dict((index, result) for index, result, err in results if err is None), {0: 0, 1: 1, 3: 9, 4: 16, 5: 25})
+
+    def test_sweep_survives_a_crashed_case(self):
+        cases = expand_grid(h_0=[230000., 240000., 250000., 260000., 270000.])
+        tmp = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(sweep, "run_case", crashing_case):
+                rows = run_sweep(cases, os.path.join(tmp, "sweep.csv"), max_workers=1)
+        finally:
+            shutil.rmtree(tmp)
+        statuses = dict((row["h_0"], row["status"]) for row in rows)
+        self.assertEqual(statuses, {230000.: "converged", 240000.: "converged", 250000.: "error", 260000.: "converged", 270000.: "converged"})
+        self.assertTrue(np.isnan([row for row in rows if row["status"] == "error"][0]["final_theta"]))
+
+if __name__ == "__main__":
+    unittest.main()
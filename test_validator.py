@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from scipy.integrate import solve_ivp
+from reentry_physics import density, aero_coefficients, aero_forces, state_rates
+from validator import validate, simulation_results, format_report, DEFAULT_TOLERANCES
+from warm_start import STATES
+
+def consistent_solution(num_nodes=201, duration=1000.):
+    # A trajectory that satisfies the equations of motion, sampled like a collocation timeseries
+    time_s = np.linspace(0, duration, num_nodes)
+    alpha = np.interp(time_s, [0, duration], [40, 20])
+    beta = np.interp(time_s, [0, duration], [-60, -10])*np.pi/180
+
+    def rhs(t, y):
+        alpha_t = np.interp(t, [0, duration], [40, 20])
+        beta_t = np.interp(t, [0, duration], [-60, -10])*np.pi/180
+        lift, drag = aero_forces(density(y[0]), y[5], *aero_coefficients(alpha_t))
+        return(state_rates(y[0], y[1], y[3], y[4], y[5], lift, drag, beta_t))
+
+    y_0 = [260000., -1*np.pi/180, 0., 90*np.pi/180, 0., 25600.]
+    sol = solve_ivp(rhs, (0, duration), y_0, method="DOP853", t_eval=time_s, rtol=1e-11, atol=1e-11)
+    solution = {"time": time_s, "alpha": alpha*np.pi/180, "beta": beta}
+    for i, name in enumerate(STATES):
+        solution[name] = sol.y[i]
+    return(solution)
+
+class TestValidator(unittest.TestCase):
+
+    def test_consistent_solution_passes(self):
+        solution = consistent_solution()
+        report = validate(solution)
+
+        self.assertTrue(report["passed"], format_report(report))
+        self.assertLess(report["errors"]["h"], 1.)
+        self.assertLess(report["errors"]["theta"], 1e-6)
+        self.assertAlmostEqual(report["peak_q"], report["peak_q_solution"], delta=1e-3*report["peak_q"])
+
+        results = simulation_results(report)
+        self.assertEqual(results["sim_h"].shape, results["sim_time"].shape)
+        np.testing.assert_allclose(results["sim_psi"][0], 90.)
+
+    def test_inconsistent_solution_and_heating_limit_fail(self):
+        solution = consistent_solution()
+        solution["theta"] = solution["theta"] + np.linspace(0, 2*DEFAULT_TOLERANCES["theta"], solution["time"].size)
+        report = validate(solution, heating_limit=.5*validate(consistent_solution())["peak_q"])
+
+        self.assertFalse(report["passed"])
+        self.assertEqual(len(report["failures"]), 2)
+        self.assertIn("FAIL", format_report(report))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from warm_start import STATES, CONTROLS, config_key, apply_solution, blend_boundary, SolutionStore
+
+def solution(theta_f, num_nodes=5):
+    time_s = np.linspace(0., 2000., num_nodes)
+    s = time_s/time_s[-1]
+    values = {"time": time_s, "h": 260000. - 180000.*s, "gamma": -np.pi/180*(1 + 4*s), "phi": 1.3*s, "psi": np.pi/2*(1 - s),
+              "theta": theta_f*s, "v": 25600. - 23100.*s, "alpha": .3*np.ones(num_nodes), "beta": -s}
+    return(values)
+
+def config(heating_limit=70., h_0=260000.):
+    return({"heating_limit": heating_limit, "h_0": h_0, "h_f": 80000., "gamma_0": -np.pi/180, "gamma_f": -5*np.pi/180,
+            "v_0": 25600., "v_f": 2500., "transcription": "radau", "num_segments": 20, "order": 3})
+
+class FakePhase(object):
+
+    # The interpolate of a dymos phase with three nodes of each kind at t = 0, 500 and 2000
+
+    def interpolate(self, xs=None, ys=None, nodes=None, kind="linear"):
+        return(np.interp([0., 500., 2000.], xs, ys).reshape(-1, 1))
+
+class FakeProblem(object):
+
+    def __init__(self):
+        self.values = {}
+
+    def set_val(self, name, value, units=None):
+        self.values[name] = (np.asarray(value), units)
+
+class TestSolutionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmp, "store")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        store = SolutionStore(self.directory)
+        key = store.save(config(), solution(.5))
+        self.assertEqual(key, config_key(config()))
+        self.assertEqual(store.entries(), {key: config()})
+        loaded = store.load(key)
+        self.assertEqual(sorted(loaded), sorted(solution(.5)))
+        for name, values in solution(.5).items():
+            np.testing.assert_array_equal(loaded[name], values)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith(".tmp")], [])
+
+    def test_concurrent_creation(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            stores = list(pool.map(lambda i: SolutionStore(self.directory), range(32)))
+        self.assertTrue(all(store.directory == self.directory for store in stores))
+
+    def test_evicts_least_recently_used(self):
+        store = SolutionStore(self.directory, max_entries=2)
+        keys = [store.save(config(heating_limit=limit), solution(.5)) for limit in (50., 60.)]
+        for age, key in zip((300, 200), keys):
+            os.utime(os.path.join(self.directory, key + ".json"), (1e9 - age, 1e9 - age))
+        store.load(keys[0])
+        key = store.save(config(heating_limit=70.), solution(.5))
+        self.assertEqual(sorted(store.entries()), sorted([keys[0], key]))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, keys[1] + ".npz")))
+
+    def test_nearest(self):
+        store = SolutionStore(self.directory)
+        self.assertIsNone(store.nearest(config()))
+        for limit, h_0, theta_f in ((40., 240000., .4), (60., 260000., .5), (80., 280000., .6)):
+            store.save(config(limit, h_0), solution(theta_f))
+        key, nearest = store.nearest(config(heating_limit=67.))
+        self.assertEqual(key, config_key(config(60., 260000.)))
+        self.assertEqual(nearest["theta"][-1], .5)
+        # a value missing on either side is left out of the distance
+        self.assertEqual(store.nearest(config(heating_limit=None, h_0=244000.))[1]["theta"][-1], .4)
+        self.assertEqual(store.nearest(dict(config(heating_limit=75.), h_0=None))[1]["theta"][-1], .6)
+
+class TestApplySolution(unittest.TestCase):
+
+    def test_blend_boundary(self):
+        blended = blend_boundary(solution(.5), {"h": (250000., 90000.)})
+        self.assertAlmostEqual(blended["h"][0], 250000.)
+        self.assertAlmostEqual(blended["h"][-1], 90000.)
+        np.testing.assert_allclose(blended["h"][2], solution(.5)["h"][2] + (250000. - 260000.)/2 + (90000. - 80000.)/2)
+        np.testing.assert_array_equal(blended["theta"], solution(.5)["theta"])
+
+    def test_apply_solution(self):
+        prob = FakeProblem()
+        apply_solution(prob, FakePhase(), solution(.5), boundary={"v": (25000., 2500.)})
+        self.assertEqual(prob.values["traj.phase0.t_initial"][0], 0.)
+        self.assertEqual(prob.values["traj.phase0.t_duration"][0], 2000.)
+        for name, units in list(STATES.items()) + list(CONTROLS.items()):
+            kind = "states:" if name in STATES else "controls:"
+            value, set_units = prob.values["traj.phase0." + kind + name]
+            self.assertEqual(set_units, units)
+            self.assertEqual(value.shape, (3, 1))
+        np.testing.assert_allclose(prob.values["traj.phase0.states:theta"][0].ravel(), [0., .125, .5])
+        np.testing.assert_allclose(prob.values["traj.phase0.states:v"][0].ravel(), [25000., 25000. - 22500./4, 2500.])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import time
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.interpolate import PchipInterpolator
+from reentry_physics import density, aero_coefficients, aero_forces, heating_rate, state_rates
+from warm_start import STATES
+
+# Largest accepted difference between the explicit integration and the collocation solution
+DEFAULT_TOLERANCES = {"h": 1000., "gamma": .5*np.pi/180, "phi": .001, "psi": .005, "theta": .001, "v": 100.}
+
+def _rhs(schedule):
+    alpha_deg, beta = schedule
+
+    def rhs(t, y):
+        alpha = alpha_deg(t)
+        lift, drag = aero_forces(density(y[0]), y[5], *aero_coefficients(alpha))
+        return(state_rates(y[0], y[1], y[3], y[4], y[5], lift, drag, beta(t)))
+
+    return(rhs)
+
+def validate(solution, heating_limit=None, tolerances=None, q_margin=.01, rtol=1e-9, atol=1e-9, num_points=2000):
+    # Integrates the ShuttleODE equations from the initial state of a collocation solution (as
+    # returned by warm_start.extract_solution) with DOP853, following its alpha/beta histories
+    # through monotone cubic interpolation. The report holds the largest state differences at
+    # the solution times, the peak heating rate of both trajectories on a fine grid and the
+    # verdict against tolerances and heating_limit*(1 + q_margin).
+    if tolerances is None:
+        tolerances = DEFAULT_TOLERANCES
+    start = time.perf_counter()
+
+    t = solution["time"]
+    schedule = (PchipInterpolator(t, solution["alpha"]*180/np.pi), PchipInterpolator(t, solution["beta"]))
+    y_0 = [solution[name][0] for name in STATES]
+    sol = solve_ivp(_rhs(schedule), (t[0], t[-1]), y_0, method="DOP853", dense_output=True, rtol=rtol, atol=atol)
+
+    report = {"success": bool(sol.success), "message": sol.message, "num_rhs_evals": sol.nfev, "errors": {}, "failures": []}
+    if not sol.success:
+        report["passed"] = False
+        report["failures"].append("integration failed: %s" % sol.message)
+        report["wall_time"] = time.perf_counter() - start
+        return(report)
+
+    y = sol.sol(t)
+    for i, name in enumerate(STATES):
+        report["errors"][name] = float(np.abs(y[i] - solution[name]).max())
+        if name in tolerances and report["errors"][name] > tolerances[name]:
+            report["failures"].append("max |d%s| %.6g > %.6g" % (name, report["errors"][name], tolerances[name]))
+
+    t_fine = np.union1d(t, np.linspace(t[0], t[-1], num_points))
+    y_fine = sol.sol(t_fine)
+    alpha_fine = schedule[0](t_fine)
+    q_sim = heating_rate(density(y_fine[0]), y_fine[5], alpha_fine)
+    q_sol = heating_rate(density(solution["h"]), solution["v"], solution["alpha"]*180/np.pi)
+    report["peak_q"] = float(q_sim.max())
+    report["peak_q_solution"] = float(q_sol.max())
+    if heating_limit is not None and report["peak_q"] > heating_limit*(1 + q_margin):
+        report["failures"].append("peak q %.4g > %.4g" % (report["peak_q"], heating_limit*(1 + q_margin)))
+
+    report["passed"] = not report["failures"]
+    report["simulation"] = {"time": t_fine, "states": y_fine, "alpha": alpha_fine, "beta": schedule[1](t_fine), "q": q_sim}
+    report["wall_time"] = time.perf_counter() - start
+    return(report)
+
+def simulation_results(report, prefix="sim_"):
+    # The dense trajectory in the names and units of results_io.TIMESERIES, for report.py
+    simulation = report["simulation"]
+    results = {prefix + "time": simulation["time"], prefix + "q": simulation["q"], prefix + "alpha": simulation["alpha"],
+               prefix + "beta": simulation["beta"]*180/np.pi}
+    for i, name in enumerate(STATES):
+        results[prefix + name] = simulation["states"][i]*(180/np.pi if STATES[name] == "rad" else 1.)
+    return(results)
+
+def format_report(report):
+    lines = ["Validation %s in %.1f ms (%d ODE evaluations)" % ("PASSED" if report["passed"] else "FAILED", report["wall_time"]*1e3,
+                                                                report["num_rhs_evals"])]
+    for name, error in report["errors"].items():
+        lines.append("  max |d%-5s| = %.6g %s" % (name, error, STATES[name]))
+    if "peak_q" in report:
+        lines.append("  peak q = %.4f (solution %.4f) Btu/ft**2/s" % (report["peak_q"], report["peak_q_solution"]))
+    for failure in report["failures"]:
+        lines.append("  FAIL: " + failure)
+    return("\n".join(lines))
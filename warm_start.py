@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+STATES = {"h": "ft", "gamma": "rad", "phi": "rad", "psi": "rad", "theta": "rad", "v": "ft/s"}
+CONTROLS = {"alpha": "rad", "beta": "rad"}
+
+# Typical magnitudes used to make the boundary conditions and heating limit comparable when
+# looking for the nearest stored solution
+DISTANCE_SCALES = {"heating_limit": 10., "h_0": 10000., "h_f": 10000., "gamma_0": 1*np.pi/180, "gamma_f": 1*np.pi/180, "v_0": 1000., "v_f": 1000.}
+
+def config_key(config):
+    text = json.dumps(config, sort_keys=True, default=float)
+    return(hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+def extract_solution(prob, phase_path="traj.phase0"):
+    # Timeseries of the converged phase with duplicated segment-boundary nodes removed
+    time_s = prob.get_val(phase_path + ".timeseries.time", units="s").ravel()
+    time_s, idxs = np.unique(time_s, return_index=True)
+
+    solution = {"time": time_s}
+    for name, units in STATES.items():
+        solution[name] = prob.get_val(phase_path + ".timeseries.states:" + name, units=units).ravel()[idxs]
+    for name, units in CONTROLS.items():
+        solution[name] = prob.get_val(phase_path + ".timeseries.controls:" + name, units=units).ravel()[idxs]
+    return(solution)
+
+def apply_solution(prob, phase0, solution, boundary=None, phase_path="traj.phase0", kind="linear"):
+    # Re-interpolates a stored solution onto the grid of a set-up phase. boundary maps a state
+    # name to new (initial, final) values; the stored profile is blended linearly so its end
+    # points move onto them, which keeps fixed boundary conditions exact.
+    if boundary is not None:
+        solution = blend_boundary(solution, boundary)
+    t = solution["time"]
+
+    prob.set_val(phase_path + ".t_initial", t[0], units="s")
+    prob.set_val(phase_path + ".t_duration", t[-1] - t[0], units="s")
+
+    for name, units in STATES.items():
+        prob.set_val(phase_path + ".states:" + name, phase0.interpolate(xs=t, ys=solution[name], nodes="state_input", kind=kind), units=units)
+
+    for name, units in CONTROLS.items():
+        prob.set_val(phase_path + ".controls:" + name, phase0.interpolate(xs=t, ys=solution[name], nodes="control_input", kind=kind), units=units)
+
+def blend_boundary(solution, boundary):
+    # Copy of solution whose states named in boundary are blended linearly onto new
+    # (initial, final) values
+    t = solution["time"]
+    s = (t - t[0])/(t[-1] - t[0])
+    blended = dict(solution)
+    for name, (y_0, y_f) in boundary.items():
+        ys = solution[name]
+        blended[name] = ys + (y_0 - ys[0])*(1 - s) + (y_f - ys[-1])*s
+    return(blended)
+
+def boundary_from_config(config):
+    return({"h": (config["h_0"], config["h_f"]),
+            "gamma": (config["gamma_0"], config["gamma_f"]),
+            "v": (config["v_0"], config["v_f"])})
+
+class SolutionStore(object):
+
+    # On-disk store of converged timeseries keyed by problem configuration. Each entry is a
+    # <key>.npz file with the arrays and a <key>.json sidecar with the configuration; both are
+    # written atomically so that several sweep workers can share one directory. The sidecar
+    # modification time records the last use and drives LRU eviction beyond max_entries.
+
+    def __init__(self, directory, max_entries=200):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, ext):
+        return(os.path.join(self.directory, key + ext))
+
+    def _write_atomic(self, path, write):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def entries(self):
+        entries = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            key = filename[:-5]
+            try:
+                with open(self._path(key, ".json")) as f:
+                    entries[key] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return(entries)
+
+    def save(self, config, solution):
+        key = config_key(config)
+        self._write_atomic(self._path(key, ".npz"), lambda f: np.savez(f, **solution))
+        self._write_atomic(self._path(key, ".json"), lambda f: f.write(json.dumps(config, sort_keys=True, default=float).encode("utf-8")))
+        self.evict()
+        return(key)
+
+    def load(self, key):
+        with np.load(self._path(key, ".npz")) as data:
+            solution = dict((name, data[name]) for name in data.files)
+        os.utime(self._path(key, ".json"), None)
+        return(solution)
+
+    def nearest(self, config):
+        # Returns (key, solution) for the closest stored configuration, or None when the store is empty
+        best_key = None
+        best_distance = np.inf
+        for key, stored in self.entries().items():
+            distance = 0.
+            for name, scale in DISTANCE_SCALES.items():
+                if config.get(name) is not None and stored.get(name) is not None:
+                    distance += ((config[name] - stored[name])/scale)**2
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+
+        if best_key is None:
+            return(None)
+        try:
+            return(best_key, self.load(best_key))
+        except OSError:
+            return(None)
+
+    def evict(self):
+        keys = list(self.entries())
+        if len(keys) <= self.max_entries:
+            return
+
+        def last_used(key):
+            try:
+                return(os.path.getmtime(self._path(key, ".json")))
+            except OSError:
+                return(0.)
+
+        for key in sorted(keys, key=last_used)[:len(keys) - self.max_entries]:
+            for ext in (".json", ".npz"):
+                try:
+                    os.remove(self._path(key, ext))
+                except OSError:
+                    pass